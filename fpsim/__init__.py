@@ -4,13 +4,43 @@ from .utils import *
 from .defaults import *
 from .parameters import *
 from .people import *
+from .rng import *
+from .events import *
 from .methods import *
+from .stats import *
+from .cache import *
+from .counts import *
+from .trajectories import *
 from .sim import *
+from .batch import *
+from .cohort import *
 from .interventions import *
 from .analyzers import *
-from .experiment import *
-from .calibration import *
-from .scenarios import *
 from .education import *
 
+# Modules that are slow to import (e.g. Optuna for calibration) and not needed to run a
+# sim are only loaded on first access, e.g. fp.Calibration or fp.scenarios (PEP 562)
+_lazy_modules = {
+    'experiment':  ['Experiment', 'Fit', 'compute_gof', 'diff_summaries'],
+    'calibration': ['Calibration'],
+    'scenarios':   ['make_scen', 'Scenario', 'Scenarios'],
+}
+_lazy_attrs = {attr:modname for modname, attrs in _lazy_modules.items() for attr in attrs}
 
+
+def __getattr__(name):
+    ''' Import lazy modules, and the names they define, on first access '''
+    import importlib
+    if name in _lazy_modules:
+        return importlib.import_module(f'.{name}', __name__)
+    elif name in _lazy_attrs:
+        module = importlib.import_module(f'.{_lazy_attrs[name]}', __name__)
+        value = getattr(module, name)
+        globals()[name] = value # Only look it up once
+        return value
+    errormsg = f"module '{__name__}' has no attribute '{name}'"
+    raise AttributeError(errormsg)
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_lazy_attrs.keys()) + list(_lazy_modules.keys()))
@@ -0,0 +1,21 @@
+'''
+Command-line entry point, e.g.
+
+    python -m fpsim warmup
+
+to compile all of FPsim's Numba functions and populate the on-disk cache, so that
+later processes (e.g. the workers of a MultiSim) load them instead of compiling.
+'''
+
+import sys
+import fpsim as fp
+
+commands = ['warmup']
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if args == ['warmup']:
+        fp.warmup(verbose=True)
+    else:
+        errormsg = f'Usage: python -m fpsim <command>, where command is one of: {", ".join(commands)}'
+        raise SystemExit(errormsg)
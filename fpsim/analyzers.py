@@ -8,6 +8,7 @@ import sciris as sc
 import matplotlib.pyplot as pl
 from . import defaults as fpd
 from . import utils as fpu
+from . import trajectories as fptr
 import fpsim as fp
 from .settings import options as fpo
 import matplotlib.pyplot as plt
@@ -15,7 +16,7 @@ import matplotlib.ticker as ticker
 
 
 #%% Generic analyzer classes
-__all__ = ['Analyzer', 'snapshot', 'cpr_by_age', 'method_mix_by_age', 'age_pyramids', 'lifeof_recorder', 'track_as']
+__all__ = ['Analyzer', 'snapshot', 'cpr_by_age', 'method_mix_by_age', 'age_pyramids', 'lifeof_recorder', 'history_recorder', 'track_as']
 # Specific analyzers
 __all__ += ['education_recorder']
 # Analyzers for debugging
@@ -115,9 +116,16 @@ class snapshot(Analyzer):
     Analyzer that takes a "snapshot" of the sim.people array at specified points
     in time, and saves them to itself.
 
+    By default each snapshot is a deep copy of the whole People object. If keys are
+    given, only those states are copied -- plus uid, to identify the agents -- and only
+    for the agents selected by rows, so each snapshot costs memory and time in proportion
+    to the data selected rather than to the whole population.
+
     Args:
         timesteps (list): list of timesteps on which to take the snapshot
         args   (list): additional timestep(s)
+        keys   (list): if supplied, the states to copy, instead of the whole People object
+        rows   (func): if supplied with keys, a function of the People returning a boolean array of the agents to copy
         die    (bool): whether or not to raise an exception if a date is not found (default true)
         kwargs (dict): passed to Analyzer()
 
@@ -128,14 +136,23 @@ class snapshot(Analyzer):
         sim.run()
         snapshot = sim.pars['analyzers'][0]
         people = snapshot.snapshots[0]
+
+        # Method and parity of women aged 15-49 only
+        women = lambda ppl: ppl.is_female & ppl.alive & (ppl.age >= 15) & (ppl.age < 50)
+        snap = fp.snapshot(timesteps=[120, 240], keys=['method', 'parity'], rows=women)
     '''
 
-    def __init__(self, timesteps, *args, die=True, **kwargs):
+    def __init__(self, timesteps, *args, keys=None, rows=None, die=True, **kwargs):
         super().__init__(**kwargs) # Initialize the Analyzer object
         timesteps = sc.promotetolist(timesteps) # Combine multiple days
         timesteps.extend(args) # Include additional arguments, if present
+        if rows is not None and keys is None:
+            errormsg = 'Selecting rows requires keys: whole-People snapshots include every agent'
+            raise ValueError(errormsg)
         self.die       = die  # Whether or not to raise an exception
         self.timesteps = timesteps # String representations
+        self.keys      = sc.tolist(keys) if keys is not None else None
+        self.rows      = rows
         self.snapshots = sc.odict() # Store the actual snapshots
         return
 
@@ -147,10 +164,22 @@ class snapshot(Analyzer):
         """
         for t in self.timesteps:
             if np.isclose(sim.ti, t):
-                self.snapshots[str(sim.ti)] = sc.dcp(sim.people) # Take snapshot!
+                if self.keys is None:
+                    self.snapshots[str(sim.ti)] = sc.dcp(sim.people) # Take snapshot!
+                else:
+                    self.snapshots[str(sim.ti)] = self.take(sim.people)
         return
 
 
+    def take(self, people):
+        ''' Copy the selected states of the selected agents, as an objdict of arrays '''
+        inds = sc.findinds(self.rows(people)) if self.rows is not None else np.arange(len(people))
+        snap = sc.objdict()
+        for key in ['uid'] + [k for k in self.keys if k != 'uid']:
+            snap[key] = people[key][inds] # Indexing copies only the selected rows
+        return snap
+
+
 class cpr_by_age(Analyzer):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)   # Initialize the Analyzer object
@@ -164,16 +193,14 @@ class cpr_by_age(Analyzer):
         self.total = np.zeros(sim.npts)
 
     def apply(self, sim):
-        ppl = sim.people
         for key, (age_low, age_high) in fpd.method_age_map.items():
-            match_low_high = fpu.match_ages(ppl.age, age_low, age_high)
-            denom_conds = match_low_high * (ppl.sex == 0) * ppl.alive
-            num_conds = denom_conds * (ppl.method != 0)
-            self.results[key][sim.ti] = sc.safedivide(np.count_nonzero(num_conds), np.count_nonzero(denom_conds))
-
-        total_denom_conds = (ppl.sex == 0) * ppl.alive
-        total_num_conds = total_denom_conds * (ppl.method != 0)
-        self.total[sim.ti] = sc.safedivide(np.count_nonzero(total_num_conds), np.count_nonzero(total_denom_conds))
+            denom = sim.get_counts(alive=1, sex=0, age=(age_low, age_high))
+            num = sim.get_counts(alive=1, sex=0, age=(age_low, age_high), method=slice(1, None))
+            self.results[key][sim.ti] = sc.safedivide(num, denom)
+
+        total_denom = sim.get_counts(alive=1, sex=0)
+        total_num = sim.get_counts(alive=1, sex=0, method=slice(1, None))
+        self.total[sim.ti] = sc.safedivide(total_num, total_denom)
         return
 
 
@@ -191,13 +218,10 @@ class method_mix_by_age(Analyzer):
     def finalize(self, sim):
         n_methods = len(sim.contraception_module.methods)
         self.results = {k: np.zeros(n_methods) for k in fpd.method_age_map.keys()}
-        ppl = sim.people
         for key, (age_low, age_high) in fpd.method_age_map.items():
-            match_low_high = fpu.match_ages(ppl.age, age_low, age_high)
-            denom_conds = match_low_high * (ppl.sex == 0) * ppl.alive
+            counts = sim.get_counts(alive=1, sex=0, age=(age_low, age_high), keep='method')
             for mn in range(n_methods):
-                num_conds = denom_conds * (ppl.method == mn)
-                self.results[key][mn] = sc.safedivide(np.count_nonzero(num_conds), np.count_nonzero(denom_conds))
+                self.results[key][mn] = sc.safedivide(counts[mn], counts.sum())
         return
 
 class education_recorder(Analyzer):
@@ -205,48 +229,53 @@ class education_recorder(Analyzer):
         Analyzer records all education attributes of females + pregnancy + living status
         for all timesteps. Made for debugging purposes.
 
+        The recording is stored in chunks as the sim runs, on disk if a path is given (see
+        fp.TrajectoryStore), and self.trajectories[state] reads it back on demand, indexed
+        by (timepoint, female).
+
         Args:
-            args   (list): additional timestep(s)
+            path   (str): folder to store the recording in (default: keep it in memory)
+            chunk  (int): number of timesteps to buffer in memory between writes
             kwargs (dict): passed to Analyzer()
         '''
 
-        def __init__(self, **kwargs):
+        def __init__(self, path=None, chunk=12, **kwargs):
             super().__init__(**kwargs)   # Initialize the Analyzer object
-            self.snapshots = sc.odict()  # Store the actual snapshots
             self.keys = ['edu_objective', 'edu_attainment', 'edu_completed',
                          'edu_dropout', 'edu_interrupted',
                          'pregnant', 'alive', 'age']
+            self.path = path
+            self.chunk = chunk
+            self.store = None
             self.max_agents = 0     # maximum number of agents this analyzer tracks
             self.time = []
             self.trajectories = {}  # Store education trajectories
             return
 
+        def initialize(self, sim=None):
+            super().initialize()
+            self.store = fptr.TrajectoryStore(self.keys, path=self.path, chunk=self.chunk) # Created here so each sim of a MultiSim gets its own files
+            return
+
         def apply(self, sim):
             """
-            Apply snapshot at each timestep listed in timesteps and
-            save result at snapshot[str(timestep)]
+            Record the states of all females at this timestep
             """
-            females = sim.people.filter(sim.people.is_female)
-            self.snapshots[str(sim.ti)] = {}
-            for key in self.keys:
-                self.snapshots[str(sim.ti)][key] = sc.dcp(females[key])  # Take snapshot!
-                self.max_agents = max(self.max_agents, len(females))
+            inds = sc.findinds(sim.people.is_female)
+            self.store.append(sim.ti, {key: sim.people[key][inds] for key in self.keys})
             return
 
         def finalize(self, sim=None):
             """
-             Process data in snapshots so we can plot it easily
+             Write the last of the recording to disk, and make it available by state
             """
             if self.finalized:
                 raise RuntimeError('Analyzer already finalized')
             self.finalized = True
-            # Process data so we can plot it easily
-            self.time = np.array([key for key in self.snapshots.keys()], dtype=int)
-            for state in self.keys:
-                self.trajectories[state] = np.full((len(self.time), self.max_agents), np.nan)
-                for ti, t in enumerate(self.time):
-                    stop_idx = len(self.snapshots[t][state])
-                    self.trajectories[state][ti, 0:stop_idx] = self.snapshots[t][state]
+            self.store.flush()
+            self.time = np.array(self.store.time, dtype=int)
+            self.max_agents = self.store.max_agents
+            self.trajectories = {state: self.store[state] for state in self.store.keys}
             return
 
         def plot(self, index=0, fig_args=None, pl_args=None):
@@ -320,21 +349,22 @@ class education_recorder(Analyzer):
 
             from scipy.stats import gaussian_kde
 
-            data_att = self.trajectories["edu_attainment"]
-            data_obj = self.trajectories["edu_objective"]
-            data_age = self.trajectories["age"]
+            n_tpts = len(self.time)
+            if n_tpts <= max_timepoints:
+                tpts_to_plot = np.arange(n_tpts)
+            else:
+                tpts_to_plot = np.linspace(0, n_tpts - 1, max_timepoints, dtype=int)
+
+            # Read only the timepoints to plot
+            data_att = self.trajectories["edu_attainment"][tpts_to_plot, :]
+            data_obj = self.trajectories["edu_objective"][tpts_to_plot, :]
+            data_age = self.trajectories["age"][tpts_to_plot, :]
 
             mask = (data_age < min_age) | (data_age > max_age) | np.isnan(data_age)
 
             data_att = np.ma.array(data_att, mask=mask)
             data_obj = np.ma.array(data_obj, mask=mask)
 
-            n_tpts = data_att.shape[0]
-            if n_tpts <= max_timepoints:
-                tpts_to_plot = np.arange(n_tpts)
-            else:
-                tpts_to_plot = np.linspace(0, n_tpts - 1, max_timepoints, dtype=int)
-
             fig_args = sc.mergedicts(fig_args, {'figsize': (3, 10)})
             pl_args = sc.mergedicts(pl_args, {'y_scaling': 0.9})
 
@@ -356,8 +386,8 @@ class education_recorder(Analyzer):
 
             # Loop through the selected time points and create kernel density estimates
             for idx, ti in enumerate(tpts_to_plot):
-                data_att_ti = np.sort(data_att[ti, :][~data_att[ti, :].mask].data)
-                data_obj_ti = np.sort(data_obj[ti, :][~data_obj[ti, :].mask].data)
+                data_att_ti = np.sort(data_att[idx, :][~data_att[idx, :].mask].data)
+                data_obj_ti = np.sort(data_obj[idx, :][~data_obj[idx, :].mask].data)
 
                 try:
                     kde_att = gaussian_kde(data_att_ti)
@@ -399,17 +429,31 @@ class lifeof_recorder(Analyzer):
     females, plus age and living status for all timesteps.
     Made for debugging purposes.
 
+    The recording is stored in chunks as the sim runs -- on disk if a path is given, so
+    that it is not limited by memory (see fp.TrajectoryStore) -- and
+    self.trajectories[state] reads it back on demand, indexed by (timepoint, female).
+
     Args:
-        args   (list): additional timestep(s)
+        path   (str): folder to store the recording in (default: keep it in memory)
+        chunk  (int): number of timesteps to buffer in memory between writes
         kwargs (dict): passed to Analyzer()
+
+    **Example**::
+
+        sim = fp.Sim(location='senegal', analyzers=fp.lifeof_recorder(path='lifeof')).run()
+        rec = sim.get_analyzer('lifeof_recorder')
+        rec.trajectories['method'][:, 10] # Method of the eleventh female over time
+        rec.plot(index=10)
     '''
 
-    def __init__(self, **kwargs):
+    def __init__(self, path=None, chunk=12, **kwargs):
         super().__init__(**kwargs)  # Initialize the Analyzer object
-        self.snapshots = sc.odict()  # Store the actual snapshots
         self.keys = ['method', 'pregnant', 'lam', 'postpartum', 'sexually_active',
-                     'abortion', 'stillbirth', 'parity', 'method',
+                     'abortion', 'stillbirth', 'parity',
                      'miscarriage', 'age', 'on_contra', 'alive']
+        self.path = path
+        self.chunk = chunk
+        self.store = None
         self.max_agents = 0  # maximum number of agents this analyzer tracks
         self.time = []
         self.trajectories = {}  # Store education trajectories
@@ -419,36 +463,30 @@ class lifeof_recorder(Analyzer):
 
         return
 
+    def initialize(self, sim=None):
+        super().initialize()
+        self.store = fptr.TrajectoryStore(self.keys, path=self.path, chunk=self.chunk) # Created here so each sim of a MultiSim gets its own files
+        return
+
     def apply(self, sim):
         """
-        Apply snapshot at each timestep listed in timesteps and
-        save result at snapshot[str(timestep)]
+        Record the states of all females at this timestep
         """
-        females = sim.people.filter(sim.people.is_female)
-        self.snapshots[str(sim.ti)] = {}
-        for key in self.keys:
-            self.snapshots[str(sim.ti)][key] = sc.dcp(
-                females[key])  # Take snapshot!
-            self.max_agents = max(self.max_agents, len(females))
+        inds = sc.findinds(sim.people.is_female) # Copy only the tracked states of females, rather than filtering all the states
+        self.store.append(sim.ti, {key: sim.people[key][inds] for key in self.keys})
         return
 
     def finalize(self, sim=None):
         """
-         Process data in snapshots so we can plot it easily
+         Write the last of the recording to disk, and make it available by state
         """
         if self.finalized:
             raise RuntimeError('Analyzer already finalized')
         self.finalized = True
-        # Process data so we can plot it easily
-        self.time = np.array([key for key in self.snapshots.keys()],
-                             dtype=int)
-        for state in self.keys:
-            self.trajectories[state] = np.full(
-                (len(self.time), self.max_agents), np.nan)
-            for ti, t in enumerate(self.time):
-                stop_idx = len(self.snapshots[t][state])
-                self.trajectories[state][ti, 0:stop_idx] = \
-                self.snapshots[t][state]
+        self.store.flush()
+        self.time = np.array(self.store.time, dtype=int)
+        self.max_agents = self.store.max_agents
+        self.trajectories = {state: self.store[state] for state in self.store.keys}
         return
 
     def plot(self, index=0, fig_args=None, pl_args=None):
@@ -660,6 +698,141 @@ class lifeof_recorder(Analyzer):
         return temp
 
 
+
+class history_recorder(Analyzer):
+    '''
+    Records the full history of some states of every agent -- by default her method,
+    pregnancy and postpartum status -- as run-length-encoded changes: a row (uid, ti,
+    value) is stored when an agent first appears and whenever her value differs from the
+    previous timestep. Since methods change rarely, this takes far less memory than a
+    copy of each state every timestep (cf. lifeof_recorder), or the circular buffer in
+    people.longitude, which only keeps the last year. Values are recorded at the end of
+    each timestep; agents removed from the arrays (e.g. by retire_age) keep their last value.
+
+    Args:
+        keys (list): the states to record
+        kwargs (dict): passed to Analyzer()
+
+    **Example**::
+
+        sim = fp.Sim(location='senegal', analyzers=fp.history_recorder()).run()
+        hist = sim.get_analyzer('history_recorder')
+        uids, methods = hist.state_at(ti=60, key='method') # The method of every agent 5 years in
+        traj = hist.trajectory(uid=0, key='pregnant') # Her pregnancy status at each timestep
+    '''
+
+    def __init__(self, keys=None, **kwargs):
+        super().__init__(**kwargs)  # Initialize the Analyzer object
+        self.keys = sc.tolist(keys) if keys is not None else ['method', 'pregnant', 'postpartum']
+        self.npts = None
+        self.n = 0  # The number of agents at the last timestep
+        self.uids = np.empty(0, dtype=np.int64)  # Their uids, in the first n rows of a buffer that grows as agents are added
+        self.last = {}  # Their values at the last timestep, in buffers likewise
+        self.chunks = {key: [] for key in self.keys}  # The changes recorded at each timestep
+        self._changes = {}  # All the changes of each state, sorted by uid and then ti
+        return
+
+    def initialize(self, sim):
+        super().initialize()
+        self.npts = sim.npts
+        return
+
+    def apply(self, sim):
+        """
+        Record the agents whose values have changed since the last timestep. Usually agents
+        are only added, so only the changed rows and the new agents are written to the
+        buffers of the last values; if agents were removed, the buffers are rebuilt.
+        """
+        ppl = sim.people
+        uids = ppl.uid
+        n_old = self.n
+        appended = n_old <= len(uids) and np.array_equal(uids[:n_old], self.uids[:n_old])  # Usual case: only new agents added
+        if not appended:  # Agents were removed, so match the rows by uid
+            old_uids = self.uids[:n_old]
+            order = np.argsort(old_uids)
+            pos = order[np.minimum(np.searchsorted(old_uids, uids, sorter=order), n_old - 1)]
+            known = old_uids[pos] == uids
+        for key in self.keys:
+            vals = ppl[key]
+            if appended:
+                last = self.last.get(key, np.empty(0, dtype=vals.dtype))
+                inds = np.nonzero(vals[:n_old] != last[:n_old])[0]
+                last[inds] = vals[inds]
+                self.last[key] = self._extend(last, n_old, vals[n_old:])
+                inds = np.append(inds, np.arange(n_old, len(vals)))
+            else:
+                inds = np.nonzero(~known | (vals != self.last[key][pos]))[0]
+                self.last[key] = vals.copy()
+            self.chunks[key].append((uids[inds], np.full(len(inds), sim.ti, dtype=np.int32), vals[inds]))
+            self._changes.pop(key, None)
+        self.uids = self._extend(self.uids, n_old, uids[n_old:]) if appended else uids.copy()
+        self.n = len(uids)
+        return
+
+    @staticmethod
+    def _extend(buf, n, new):
+        """ Write new rows after the first n rows of a buffer, doubling its size if it is full """
+        end = n + len(new)
+        if end > len(buf):
+            grown = np.empty(max(end, 2*len(buf)), dtype=buf.dtype)
+            grown[:n] = buf[:n]
+            buf = grown
+        buf[n:end] = new
+        return buf
+
+    def changes(self, key):
+        """ All the changes of a state, as arrays of uid, ti and value, sorted by uid and then ti """
+        if key not in self._changes:
+            if not self.chunks[key]:
+                errormsg = 'No history has been recorded yet'
+                raise ValueError(errormsg)
+            uid, ti, val = [np.concatenate(arrs) for arrs in zip(*self.chunks[key])]
+            self.chunks[key] = [(uid, ti, val)]  # Keep one chunk rather than one per timestep
+            order = np.argsort(uid, kind='stable')  # Stable, so each agent's changes stay in time order
+            self._changes[key] = sc.objdict(uid=uid[order], ti=ti[order], val=val[order])
+        return self._changes[key]
+
+    @property
+    def n_changes(self):
+        """ The number of changes stored, for each state """
+        return {key: sum(len(chunk[0]) for chunk in self.chunks[key]) for key in self.keys}
+
+    def state_at(self, ti, key, uids=None, fill=np.nan):
+        """
+        The value of a state for each agent at timestep ti, found by binary search.
+
+        Args:
+            ti (int): the timestep
+            key (str): the state
+            uids (array): the agents; by default, every agent who has been recorded, in order of uid
+            fill (scalar): the value for agents who did not exist yet at ti
+
+        Returns:
+            The uids, and an array of their values
+        """
+        c = self.changes(key)
+        if uids is None:
+            uids = np.unique(c.uid)
+        uids = np.asarray(uids)
+        stride = np.int64(self.npts + 1)
+        keys = c.uid.astype(np.int64)*stride + c.ti  # Sorted, since the changes are sorted by uid and then ti
+        idx = np.searchsorted(keys, uids.astype(np.int64)*stride + min(ti, self.npts), side='right') - 1
+        found = (idx >= 0) & (c.uid[np.maximum(idx, 0)] == uids)
+        out = np.full(len(uids), fill, dtype=np.result_type(c.val.dtype, np.asarray(fill).dtype))
+        out[found] = c.val[idx[found]]
+        return uids, out
+
+    def trajectory(self, uid, key, fill=np.nan):
+        """ The value of a state for one agent at every timestep, with fill before she existed """
+        c = self.changes(key)
+        lo, hi = np.searchsorted(c.uid, [uid, uid + 1])
+        out = np.full(self.npts, fill, dtype=np.result_type(c.val.dtype, np.asarray(fill).dtype))
+        if hi > lo:
+            ti = c.ti[lo:hi]
+            out[ti[0]:] = np.repeat(c.val[lo:hi], np.diff(np.append(ti, self.npts)))
+        return out
+
+
 class age_pyramids(Analyzer):
     '''
     Records age pyramids for each timestep.
@@ -687,6 +860,7 @@ class age_pyramids(Analyzer):
         if self.bins is None:
             self.bins = np.arange(0, sim.pars['max_age']+2)
         nbins = len(self.bins)-1
+        self._yearly = np.array_equal(self.bins, np.arange(nbins+1)) and nbins <= sim.pars['max_age']+1 # Whole-year bins can be read from the shared counts
         self.data = np.full((sim.npts, nbins), np.nan)
         self._raw = sc.dcp(self.data)
         return
@@ -696,8 +870,11 @@ class age_pyramids(Analyzer):
         Records histogram of ages of all alive individuals at a timestep such that
         self.data[timestep] = list of proportions where index signifies age
         """
-        ages = sim.people.age[sc.findinds(sim.people.alive)]
-        self._raw[sim.ti, :] = np.histogram(ages, self.bins)[0]
+        if self._yearly:
+            self._raw[sim.ti, :] = sim.get_counts(alive=1, keep='age')[:len(self.bins)-1]
+        else:
+            ages = sim.people.age[sc.findinds(sim.people.alive)]
+            self._raw[sim.ti, :] = np.histogram(ages, self.bins)[0]
         self.data[sim.ti, :] = self._raw[sim.ti, :]/self._raw[sim.ti, :].sum()
 
     def plot(self):
@@ -744,10 +921,9 @@ class method_mix_over_time(Analyzer):
         return
 
     def apply(self, sim):
-        ppl = sim.people
+        counts = sim.get_counts(alive=1, sex=0, keep='method')
         for m_idx, method in enumerate(self.methods):
-            eligible = ppl.is_female & ppl.alive & (ppl.method == m_idx)
-            self.results[method][sim.ti] = np.count_nonzero(eligible)
+            self.results[method][sim.ti] = counts[m_idx]
         return
 
     def plot(self, style=None):
@@ -792,6 +968,12 @@ class state_tracker(Analyzer):
         self.data_perc = np.full((sim.npts,), np.nan)
         self.data_n_female = np.full((sim.npts,), np.nan)
         self.tvec = np.full((sim.npts,), np.nan)
+
+        # Boolean states within whole-year ages can be read from the shared counts
+        whole_years = self.min_age == int(self.min_age) and self.max_age == int(self.max_age)
+        self._counted = whole_years and sim.people[self.state_name].dtype == bool
+        if self._counted:
+            sim.group_counts.add_key(self.state_name)
         return
 
     def apply(self, sim):
@@ -799,9 +981,14 @@ class state_tracker(Analyzer):
         Records histogram of ages of all alive individuals at a timestep such that
         self.data[timestep] = list of proportions where index signifies age
         """
-        living_women = sim.people.filter((sim.people.alive) & (sim.people.is_female) & (sim.people.age >= self.min_age) & (sim.people.age < self.max_age))
-        self.data_num[sim.ti] = living_women[self.state_name].sum()
-        self.data_n_female[sim.ti] = len(living_women)
+        if self._counted:
+            counts = sim.get_counts(alive=1, sex=0, age=(self.min_age, self.max_age), keep=self.state_name)
+            self.data_num[sim.ti] = counts[1]
+            self.data_n_female[sim.ti] = counts.sum()
+        else:
+            living_women = sim.people.filter((sim.people.alive) & (sim.people.is_female) & (sim.people.age >= self.min_age) & (sim.people.age < self.max_age))
+            self.data_num[sim.ti] = living_women[self.state_name].sum()
+            self.data_n_female[sim.ti] = len(living_women)
         self.data_perc[sim.ti] = (self.data_num[sim.ti] / self.data_n_female[sim.ti])*100.0
         self.tvec[sim.ti] = sim.y
 
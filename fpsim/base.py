@@ -4,7 +4,7 @@ Base classes for loading parameters and for running simulations with FP model
 import numpy as np
 import pandas as pd
 import sciris as sc
-import pylab as pl
+import matplotlib.pyplot as pl
 from . import utils as fpu
 from . import defaults as fpd
 
@@ -205,10 +205,9 @@ class BasePeople(sc.prettyobj):
             p2val = people2[key]
             if isinstance(npval, np.ndarray):
                 newpeople[key] = np.concatenate([npval, p2val], axis=0)
-            elif isinstance(npval, dict):
+            elif isinstance(npval, dict): # Longitudinal buffers
                 for attr in npval.keys():
-                    new_rows = np.full((len(people2), npval[attr].shape[1]), p2val[attr][0])
-                    newpeople[key][attr] = np.concatenate((npval[attr], new_rows), axis=0)
+                    npval[attr].extend(p2val[attr])
             elif isinstance(npval, list):
                 newpeople[key] += p2val
             else:
@@ -370,7 +369,46 @@ class BasePeople(sc.prettyobj):
         return unfiltered
 
 
-    def binomial(self, prob, as_inds=False, as_filter=False):
+    @property
+    def uses_streams(self):
+        ''' Whether draws come from counter-based random streams (see fpsim.rng) '''
+        return self.__dict__.get('streams') is not None
+
+
+    def rand(self, stream=None):
+        '''
+        Uniform draws, one for each person in the current view. If the sim uses random
+        streams and a stream name is given, each person's draw is keyed by their uid;
+        otherwise the global random state is used.
+
+        Args:
+            stream (str): the name of the stream to draw from
+        '''
+        if stream is not None and self.uses_streams:
+            return self.streams.random(stream, self.ti, self.uid)
+        return np.random.random(len(self))
+
+
+    def choose(self, probs, stream, inds=None):
+        '''
+        Choose an outcome with the given probabilities for each person in the current
+        view (or for each of inds), from their draws from a random stream (see rand()).
+
+        Args:
+            probs (array): the probability of each outcome
+            stream (str): the name of the stream to draw from
+            inds (array): the people to choose for, as indices into the view
+
+        Returns:
+            The index of the chosen outcome for each person
+        '''
+        u = self.rand(stream)
+        if inds is not None:
+            u = u[inds]
+        return np.minimum(np.searchsorted(np.cumsum(probs), u), len(probs) - 1)
+
+
+    def binomial(self, prob, as_inds=False, as_filter=False, stream=None):
         '''
         Return indices either by a single probability or by an array of probabilities.
         By default just return the boolean array, but can also return the indices,
@@ -380,8 +418,11 @@ class BasePeople(sc.prettyobj):
             prob (float/array): either a scalar probability, or an array of probabilities of the same length as People
             as_inds (bool): return as list of indices instead of a boolean array
             as_filter (bool): return as filter instead than boolean array
+            stream (str): the random stream to draw from, if the sim uses them (see rand())
         '''
-        if sc.isnumber(prob):
+        if stream is not None and self.uses_streams and (sc.isnumber(prob) or sc.isarray(prob)):
+            arr = self.rand(stream) < prob
+        elif sc.isnumber(prob):
             arr = fpu.n_binomial(prob, len(self))
         elif sc.isarray(prob):
             arr = fpu.binomial_arr(prob)
@@ -0,0 +1,151 @@
+'''
+Run many replicates of a sim as one population.
+
+With a small number of agents, most of the time of a run goes on the Python overhead
+of each step rather than on the array operations, which only see a few thousand agents.
+A BatchSim instead holds all of its replicates in a single People object, with the
+replicate of each agent stored in ``people.rep``, so each step is done once for all of
+them. Every event is counted per replicate (see People.count()), and the results of
+each replicate are stored in a Sim of its own, so they can be analyzed or plotted like
+those of a MultiSim.
+
+Since the replicates share their parameters, the BatchSim's interventions and analyzers
+apply to all of them at once, and see the whole population. Random draws come from
+counter-based streams keyed on each agent's replicate (see fp.ReplicateStreams), so
+each replicate's results do not depend on the others.
+'''
+
+import numpy as np
+import sciris as sc
+from . import sim as fps
+from . import people as fpppl
+from . import rng as fprng
+
+
+__all__ = ['BatchSim']
+
+
+class BatchSim(fps.Sim):
+    '''
+    Run several replicates of a sim together in one population; a faster alternative to a
+    MultiSim of copies of the same sim when each has few agents. The replicates differ only
+    by their random draws. Only the reference step mode (step_mode='python') is supported,
+    and empowerment and tracking children are not supported.
+
+    Whatever sim['rng'] is, the draws of each agent come from random streams keyed on the
+    seed, her replicate and her uid within it (see fp.ReplicateStreams). Replicate r thus
+    gives the same results whatever n_reps is, as long as the seed is the same, but not
+    the same results as a standalone Sim, which draws differently.
+
+    After the run, sim.sims contains one Sim with the results of each replicate, and
+    sim.results the mean over replicates.
+
+    Args:
+        pars (dict): parameters, as for Sim
+        n_reps (int): the number of replicates, each of sim['n_agents'] agents
+        kwargs (dict): passed to Sim
+
+    **Example**::
+
+        bsim = fp.BatchSim(location='senegal', n_agents=1000, n_reps=100).run()
+        msim = bsim.to_multisim()
+        msim.plot()
+    '''
+
+    def __init__(self, pars=None, n_reps=10, **kwargs):
+        super().__init__(pars=pars, **kwargs)
+        self.n_reps = int(n_reps)
+        self.sims = None  # The results of each replicate, created in init_results()
+        if self.pars.get('step_mode', 'python') != 'python':
+            errormsg = f'Batched sims only support step_mode="python", not "{self["step_mode"]}"'
+            raise ValueError(errormsg)
+        if self.empowerment_module is not None or self.track_children:
+            errormsg = 'Batched sims do not support empowerment or tracking children'
+            raise ValueError(errormsg)
+        if self['female_only'] or self['retire_age'] is not None:
+            errormsg = 'Batched sims do not support female_only or retire_age; people counted in aggregate are tracked per sim, not per replicate'
+            raise ValueError(errormsg)
+        return
+
+    def init_results(self):
+        ''' Initialize the results, and a sim to hold the results of each replicate '''
+        super().init_results()
+        self.sims = []
+        for r in range(self.n_reps):
+            sim = object.__new__(fps.Sim)
+            sim.__dict__ = {k:v for k,v in self.__dict__.items() if k not in ['sims', 'n_reps']} # Parameters are shared
+            sim.results = {}
+            sim.init_results()
+            sim.label = f'{self.label} {r}' if self.label else f'Replicate {r}'
+            self.sims.append(sim)
+        return
+
+    def init_streams(self, n):
+        ''' Create random streams keyed on the replicate of each agent '''
+        streams = fprng.ReplicateStreams(seed=self['seed'], n_reps=self.n_reps)
+        streams.add(np.arange(n), np.repeat(np.arange(self.n_reps), self['n_agents']))
+        return streams
+
+    def init_people(self):
+        ''' Create the people of all the replicates '''
+        super().init_people(n=self['n_agents']*self.n_reps)
+        self.people.n_reps = self.n_reps
+        self.people._keys.append('rep')
+        self.people.rep = self.people.streams.rep.copy()
+        return
+
+    def grow_population(self, n_new_people):
+        ''' Add the newborns of each replicate '''
+        reps = np.repeat(np.arange(self.n_reps), n_new_people.astype(int))
+        n = len(reps)
+        uids = self.people.uid.max() + 1 + np.arange(n)
+        self.people.streams.add(uids, reps) # Before creating them, since their draws are keyed on their replicates
+        new_people = fpppl.People(pars=self.pars, n=n, age=0, uids=uids, education_module=self.education_module,
+                                  streams=self.people.streams)
+        new_people.n_reps = self.n_reps
+        new_people._keys.append('rep')
+        new_people.rep = reps
+        new_people.ti = self.ti
+        new_people.decide_contraception(ti=self.ti, year=self.y, contraception_module=self.contraception_module)
+        self.people += new_people
+        return
+
+    def update_results(self, res, ti):
+        ''' Store the results of each replicate in its sim '''
+        for r, sim in enumerate(self.sims):
+            rep_res = sc.dictobj()
+            for key, val in res.items():
+                if isinstance(val, np.ndarray):
+                    val = val[r]
+                elif isinstance(val, dict):
+                    val = {k: v[r] if isinstance(v, np.ndarray) else v for k, v in val.items()}
+                rep_res[key] = val
+            sim.ti = ti
+            sim.update_results(rep_res, ti)
+        return
+
+    def finalize_results(self):
+        ''' Finalize the results of each replicate, and take the mean over replicates '''
+        for sim in self.sims:
+            sim.finalize_results()
+            sim.summary = sc.objdict()
+            sim.summary.births = np.sum(sim.results['births'])
+            sim.summary.deaths = np.sum(sim.results['deaths'])
+            sim.summary.final = sim.results['pop_size'][-1]
+            sim.already_run = True
+
+        self.results = sc.objdict()
+        for key, val in self.sims[0].results.items():
+            if isinstance(val, np.ndarray) and val.dtype != object:
+                self.results[key] = np.mean([sim.results[key] for sim in self.sims], axis=0)
+        return
+
+    def to_multisim(self):
+        ''' Convert the replicates to a MultiSim, e.g. for plotting '''
+        if not self.already_run:
+            errormsg = 'Please run the BatchSim before converting it to a MultiSim'
+            raise RuntimeError(errormsg)
+        msim = fps.MultiSim(sims=self.sims)
+        msim.compute_stats()
+        msim.already_run = True
+        return msim
@@ -0,0 +1,239 @@
+'''
+Cache of sim results on disk.
+
+Each sim is stored under a hash of everything that determines its results: the parameters
+(including the seed, interventions and analyzers), the contraception, education and
+empowerment modules, and the FPsim version. Running a sim with the same inputs again then
+loads the stored sim instead of running it. The least recently used sims are removed once
+the cache is larger than its size limit. Sims with inputs that cannot be hashed reliably,
+such as callables implemented in C, are run without being cached.
+'''
+
+import os
+import types
+import pathlib
+import datetime as dt
+import hashlib
+import functools
+import numpy as np
+import pandas as pd
+import sciris as sc
+from . import version as fpv
+
+
+__all__ = ['ResultCache', 'hash_sim']
+
+
+skip_pars = ['verbose'] # Parameters that do not affect the results
+
+
+def _update_hash(h, obj, seen):
+    ''' Add an object to the hash in a canonical form, e.g. independent of the order of dict keys '''
+    h.update(type(obj).__qualname__.encode())
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes, np.generic)):
+        h.update(repr(obj).encode())
+    elif isinstance(obj, np.ndarray):
+        h.update(f'{obj.dtype}{obj.shape}'.encode())
+        if obj.dtype == object:
+            for item in obj.flat:
+                _update_hash(h, item, seen)
+        else:
+            h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, pd.DataFrame):
+        _update_hash(h, list(obj.columns), seen)
+        _update_hash(h, obj.to_numpy(), seen)
+    elif isinstance(obj, dict):
+        items = sorted(obj.items(), key=lambda kv: repr(kv[0]))
+        for key, val in items:
+            _update_hash(h, key, seen)
+            _update_hash(h, val, seen)
+    elif isinstance(obj, (list, tuple)):
+        h.update(str(len(obj)).encode())
+        for item in obj:
+            _update_hash(h, item, seen)
+    elif isinstance(obj, (set, frozenset)):
+        _update_hash(h, sorted(obj, key=repr), seen)
+    elif isinstance(obj, (type, types.ModuleType)): # Classes and modules, by name
+        h.update(f'{getattr(obj, "__module__", "")}.{obj.__qualname__ if isinstance(obj, type) else obj.__name__}'.encode())
+    elif id(obj) in seen:
+        h.update(b'<seen>') # Objects that refer back to themselves
+    elif isinstance(obj, types.MethodType): # Bound methods, by their object and function
+        seen.add(id(obj))
+        _update_hash(h, obj.__self__, seen)
+        _update_hash(h, obj.__func__, seen)
+    elif isinstance(obj, types.FunctionType): # Functions, including lambdas and closures
+        seen.add(id(obj))
+        _update_function_hash(h, obj, seen)
+    elif isinstance(obj, functools.partial):
+        seen.add(id(obj))
+        _update_hash(h, [obj.func, obj.args, obj.keywords], seen)
+    elif isinstance(obj, types.BuiltinFunctionType) and (obj.__self__ is None or isinstance(obj.__self__, types.ModuleType)):
+        h.update(f'{obj.__module__}.{obj.__qualname__}'.encode()) # E.g. np.sum or len, which have no state
+    elif type(obj).__name__ == 'cython_function_or_method': # E.g. the methods of random number generators
+        h.update(f'{obj.__module__}.{obj.__qualname__}'.encode())
+    elif isinstance(obj, np.random.Generator): # E.g. in interventions, by the state of their bit generator
+        _update_hash(h, obj.bit_generator.state, seen)
+    elif isinstance(obj, np.random.RandomState):
+        _update_hash(h, obj.get_state(legacy=False), seen)
+    elif callable(obj) and not hasattr(obj, '__dict__'):
+        errormsg = f'Cannot hash the callable {obj!r} of type {type(obj)}, since its behavior cannot be inspected'
+        raise TypeError(errormsg)
+    elif hasattr(obj, '__dict__'): # Interventions, analyzers, modules, etc.
+        seen.add(id(obj))
+        _update_hash(h, vars(obj), seen)
+    elif isinstance(obj, (pathlib.PurePath, range, slice, dt.date, dt.time, dt.timedelta)): # Values that are fully described by their string
+        h.update(str(obj).encode())
+    else: # E.g. random number generators, whose state is not visible from Python
+        errormsg = f'Cannot hash the object {obj!r} of type {type(obj)}, since its state cannot be inspected'
+        raise TypeError(errormsg)
+    return
+
+
+def _update_function_hash(h, func, seen):
+    '''
+    Add a function to the hash: its code, including that of any functions defined in it,
+    the values it has captured in its closure, its default arguments, and the values of
+    the globals it refers to.
+    '''
+    h.update(f'{func.__module__}.{func.__qualname__}'.encode())
+    codes = [func.__code__]
+    names = set()
+    for code in codes:
+        h.update(code.co_code)
+        names.update(code.co_names)
+        consts = []
+        for c in code.co_consts:
+            if isinstance(c, types.CodeType):
+                codes.append(c) # Nested functions and lambdas
+            else:
+                consts.append(c)
+        _update_hash(h, consts, seen)
+    cells = [cell.cell_contents for cell in (func.__closure__ or [])]
+    _update_hash(h, [cells, func.__defaults__, func.__kwdefaults__], seen)
+    refs = {name:func.__globals__[name] for name in names if name in func.__globals__} # Names of attributes or builtins are not in the globals
+    _update_hash(h, refs, seen)
+    return
+
+
+def hash_sim(sim, die=True):
+    '''
+    Hash of everything that determines the results of a sim that has not been initialized.
+
+    Functions, e.g. in interventions, are hashed by their code, the values they capture,
+    their default arguments and the globals they use. If some input cannot be hashed
+    reliably, e.g. a callable object implemented in C, a TypeError is raised, or if
+    die=False, None is returned, and the sim should not be cached.
+
+    **Example**::
+
+        fp.hash_sim(fp.Sim(location='senegal')) == fp.hash_sim(fp.Sim(location='senegal')) # True
+    '''
+    pars = {k:v for k,v in sim.pars.items() if k not in skip_pars}
+    spec = dict(version=fpv.__version__, pars=pars, location=sim.location, regional=sim.regional,
+                track_children=sim.track_children, contraception=sim.contraception_module,
+                education=sim.education_module, empowerment=sim.empowerment_module)
+    h = hashlib.sha256()
+    try:
+        _update_hash(h, spec, set())
+    except TypeError:
+        if die:
+            raise
+        return None
+    return h.hexdigest()
+
+
+class ResultCache(sc.prettyobj):
+    '''
+    Store the sims that have been run in a folder, keyed by hash_sim(), so that running
+    the same sim again loads it instead. Pass the cache to Sim.run(), MultiSim.run() or
+    Scenarios.run() to use it. The people of each sim are not stored unless keep_people
+    is True, since they take up most of the space.
+
+    Args:
+        folder (str): where to store the sims
+        max_size (float): the size of the cache in bytes above which the least recently used sims are removed
+        keep_people (bool): whether to store the people along with the results
+
+    **Example**::
+
+        cache = fp.ResultCache('fpsim_cache')
+        sim = fp.Sim(location='senegal', start_year=2020, end_year=2040, seed=1).run(cache=cache) # Loaded if run before
+        msim = fp.MultiSim(sims).run(cache=cache)
+    '''
+
+    def __init__(self, folder='fpsim_cache', max_size=1e9, keep_people=False):
+        self.folder = str(folder)
+        self.max_size = max_size
+        self.keep_people = keep_people
+        os.makedirs(self.folder, exist_ok=True)
+        return
+
+    def path(self, key):
+        ''' The file storing the sim with this key '''
+        return os.path.join(self.folder, f'{key}.sim')
+
+    def files(self):
+        ''' The files of the stored sims, least recently used first '''
+        files = []
+        for f in os.listdir(self.folder):
+            if f.endswith('.sim'):
+                path = os.path.join(self.folder, f)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except FileNotFoundError: # Removed by another process sharing the cache
+                    pass
+        return [path for mtime, path in sorted(files)]
+
+    @property
+    def size(self):
+        ''' The total size of the stored sims, in bytes '''
+        return sum(os.path.getsize(path) for path in self.files() if os.path.exists(path))
+
+    def get(self, key):
+        ''' Load the sim with this key, or return None if it is not in the cache '''
+        path = self.path(key)
+        try:
+            sim = sc.load(path)
+        except FileNotFoundError:
+            return None
+        except Exception: # E.g. a file from an incompatible version
+            os.remove(path)
+            return None
+        os.utime(path) # Mark as recently used
+        return sim
+
+    def put(self, key, sim):
+        ''' Store a sim that has been run, and remove the least recently used sims if the cache is too large '''
+        path = self.path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        people = sim.people
+        if not self.keep_people:
+            sim.people = None
+        try:
+            sc.save(tmp_path, sim)
+        finally:
+            sim.people = people
+        os.replace(tmp_path, path) # So other processes never load a partial file
+        self.evict()
+        return
+
+    def evict(self):
+        ''' Remove the least recently used sims until the cache is no larger than max_size '''
+        paths = self.files()
+        sizes = [os.path.getsize(path) if os.path.exists(path) else 0 for path in paths]
+        total = sum(sizes)
+        for path, size in zip(paths, sizes):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return
+
+    def clear(self):
+        ''' Remove all the stored sims '''
+        for path in self.files():
+            os.remove(path)
+        return
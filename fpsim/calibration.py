@@ -8,7 +8,6 @@ import numpy as np
 import pylab as pl
 import pandas as pd
 import sciris as sc
-import seaborn as sns
 import optuna as op
 from . import experiment as fpe
 
@@ -371,6 +370,7 @@ def pairplotpars(data, inds=None, color_column=None, bounds=None, cmap='parula',
     df['color_column'] = [sc.rgb2hex(rgba[:-1]) for rgba in colors]
 
     # Make the plot
+    import seaborn as sns # Imported here since slow to import
     grid = sns.PairGrid(df)
     grid = grid.map_lower(pl.scatter, **{'facecolors':df['color_column']})
     grid = grid.map_diag(pl.hist, bins=bins, edgecolor=edgecolor, facecolor=facecolor)
@@ -0,0 +1,253 @@
+'''
+Deterministic mean-field model of contraceptive use, for screening scenarios quickly.
+
+The method choices of SimpleChoice and StandardChoice form a Markov chain: at each
+decision, a woman decides whether to use contraception, and if so switches between
+methods with probabilities that depend on her age group and current method; she then
+stays on her method for a duration drawn by set_dur_method(). CohortModel propagates the
+expected fraction of women 15-49 in each state -- age group, whether she has ever used
+contraception, method, and pregnancy or postpartum month -- month by month, rather than
+simulating agents. A 20-year projection takes milliseconds, so many stockout schedules
+can be screened before running full sims of the most interesting ones.
+
+The model uses the tables of the sim's contraception module, but it is an approximation:
+durations of use are replaced by a constant monthly probability of deciding again (the
+inverse of the mean duration), the covariates of StandardChoice (parity, education, etc.)
+and of the probability of conception are averaged over the women in each age group of
+the initial population, and miscarriage, mortality and LAM are not modeled. The age
+structure is kept fixed, with women who turn 50 replaced by never-users aged 15.
+'''
+
+import numpy as np
+import sciris as sc
+from . import utils as fpu
+from . import defaults as fpd
+
+
+__all__ = ['CohortModel']
+
+
+class _Women:
+    ''' The attributes of a group of women used by the contraception module, as fixed arrays '''
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+        self.uses_streams = True # So set_dur_method() samples at the quantiles in self.u
+        return
+
+    def __len__(self):
+        return len(self.age)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    @property
+    def int_age(self):
+        return np.array(self.age, dtype=np.int64) # A new array each time, since StandardChoice modifies it
+
+    def rand(self, stream):
+        return self.u
+
+
+class CohortModel(sc.prettyobj):
+    '''
+    Mean-field model of contraceptive use, built from the parameters, contraception module
+    and initial population of a sim (which is not modified). See the module docstring for
+    the assumptions; compare with full sims before relying on its projections.
+
+    Args:
+        sim (Sim): the sim to approximate
+        n_quantiles (int): the number of quantiles of each duration distribution used to compute the mean duration of use
+
+    **Example**::
+
+        cohort = fp.CohortModel(fp.Sim(location='senegal', start_year=2020, end_year=2040, n_agents=5000))
+        baseline = cohort.run()
+        stockout = cohort.run(stockouts={2025: {3: 0.5}, 2026: {3: 0.5}}) # Half of injectable users stop each month
+        pl.plot(baseline.t, baseline.mcpr - stockout.mcpr)
+    '''
+
+    def __init__(self, sim, n_quantiles=200):
+        sim = fpu.dcp(sim)
+        sim.initialize()
+        ppl = sim.people
+        pars = sim.pars
+        self.cm = sim.contraception_module
+        if not hasattr(self.cm, 'method_choice_pars'):
+            errormsg = f'The cohort model needs a contraception module with method switching tables (e.g. SimpleChoice), not {type(self.cm).__name__}'
+            raise TypeError(errormsg)
+        self.start_year = pars['start_year']
+        self.npts = sim.npts
+        self.tvec = sim.tvec.copy()
+        self.methods = list(self.cm.methods.values())
+        self.modern = np.array([m.modern for m in self.methods])
+        self.n_preg = int(round((pars['preg_dur_low'] + pars['preg_dur_high'])/2)) # Months of pregnancy
+        n_methods = len(self.methods)
+
+        # Age groups, limited to women of reproductive age
+        min_age, max_age = pars['method_age'], pars['age_limit_fecundity']
+        self.age_keys = list(fpd.method_age_map.keys())
+        bounds = np.array([np.clip(fpd.method_age_map[k], min_age, max_age) for k in self.age_keys], dtype=float)
+        self.age_rate = 1/(fpd.mpy*(bounds[:,1] - bounds[:,0])) # Monthly probability of moving to the next group
+        women = ppl.is_female & ppl.alive & (ppl.age >= min_age) & (ppl.age < max_age)
+        groups = [np.nonzero(women & (ppl.age >= lo) & (ppl.age < hi))[-1] for lo, hi in bounds]
+        n_ages = len(groups)
+
+        # Initial state: non-pregnant women by age group, ever use and method, and pregnant women by month
+        self.x0 = np.zeros((n_ages, 2, n_methods))
+        self.q0 = np.zeros((n_ages, 2, self.n_preg + 5))
+        for a, inds in enumerate(groups):
+            ever = ppl.ever_used_contra[inds].astype(int)
+            preg = ppl.pregnant[inds]
+            np.add.at(self.x0[a], (ever[~preg], ppl.method[inds][~preg]), 1)
+            np.add.at(self.q0[a], (ever[preg], np.clip(ppl.gestation[inds][preg], 1, self.n_preg) - 1), 1)
+        total = self.x0.sum() + self.q0.sum()
+        self.x0 /= total
+        self.q0 /= total
+
+        # The women of each age group, for averaging the probabilities of use over their covariates
+        keys = ['age', 'ever_used_contra', 'urban', 'parity', 'wealthquintile', 'edu_attainment']
+        self.women = [{k: np.array(ppl[k][inds]) for k in keys} for inds in groups]
+        self.prob_use = {} # Cache of the probabilities of use in each year
+
+        # Monthly probability of deciding again, by age group and method
+        u = (np.arange(n_quantiles) + 0.5)/n_quantiles
+        self.p_decide = np.zeros((n_ages, n_methods))
+        for a, (lo, hi) in enumerate(bounds):
+            for m in range(n_methods):
+                durs = self.cm.set_dur_method(_Women(age=np.full(n_quantiles, (lo + hi)/2), method=np.full(n_quantiles, m), u=u))
+                self.p_decide[a, m] = 1/np.mean(durs)
+
+        # Switching probabilities, from the same tables as choose_method(), with the mean jitter for zeros
+        self.switch = {}
+        for event in [0, 6]:
+            mcp = self.cm.method_choice_pars[event]
+            switch = np.zeros((n_ages, n_methods, n_methods))
+            for a, key in enumerate(self.age_keys):
+                for m, method in enumerate(self.methods):
+                    if method.name == 'btl' or method.name not in mcp[key]:
+                        switch[a, m, m] = 1 # BTL users keep using it
+                    else:
+                        switch[a, m, mcp.method_idx] = self._normalize(mcp[key][method.name])
+            self.switch[event] = switch
+        mcp = self.cm.method_choice_pars[1]
+        self.switch_pp1 = np.zeros((n_ages, n_methods))
+        for a, key in enumerate(self.age_keys):
+            self.switch_pp1[a, mcp.method_idx] = self._normalize(mcp[key])
+
+        # Monthly probability of a pregnancy that is carried to term, by age group and method, as in check_conception()
+        eff = np.array([m.efficacy for m in self.methods])
+        self.p_preg = np.zeros((n_ages, n_methods))
+        for a, inds in enumerate(groups):
+            if not len(inds):
+                continue
+            age = np.minimum(ppl.age[inds].astype(int), fpd.max_age_preg)
+            parity = ppl.parity[inds]
+            active = pars['sexual_activity'][ppl.age[inds].astype(int)] * (ppl.age[inds] >= ppl.fated_debut[inds]) * ppl.fertile[inds]
+            fecundity = pars['age_fecundity'][age] * ppl.personal_fecundity[inds]
+            exposure = pars['exposure_factor'] * pars['exposure_age'][age] * pars['exposure_parity'][np.minimum(parity, fpd.max_parity)]
+            exposure = exposure * np.where(parity == 0, pars['fecundity_ratio_nullip'][age], 1)
+            for m in range(n_methods):
+                self.p_preg[a, m] = np.mean(active * fpu.annprob2ts((1 - eff[m])*fecundity, pars['timestep']) * exposure)
+        self.p_preg *= 1 - pars['abortion_prob']
+        return
+
+    def _normalize(self, probs, jitter=1e-4):
+        ''' Apply the method weights, as in choose_method() '''
+        probs = np.where(np.array(probs) > 0, probs, jitter) * self.cm.pars['method_weights']
+        return probs/probs.sum()
+
+    def get_prob_use(self, year):
+        ''' Mean probability of use by event (none, pp1, pp6), age group and ever use, in this year '''
+        year = int(year)
+        if year not in self.prob_use:
+            prob_use = np.zeros((3, len(self.women), 2))
+            for e, event in enumerate([None, 'pp1', 'pp6']):
+                for a, women in enumerate(self.women):
+                    if len(women['age']):
+                        for ever in [0, 1]:
+                            group = _Women(**sc.mergedicts(women, {'ever_used_contra': np.full(len(women['age']), bool(ever))}))
+                            prob_use[e, a, ever] = np.mean(self.cm.get_prob_use(group, year=year, event=event))
+            self.prob_use[year] = prob_use
+        return self.prob_use[year]
+
+    def run(self, stockouts=None, switch=False):
+        '''
+        Project contraceptive use over the sim's years.
+
+        Args:
+            stockouts (dict): the monthly probability that users of each method stop because it is out of stock, by year, e.g. {2025: {3: 0.5}}; or an intervention with this schedule as its stockout_probs
+            switch (bool): whether women who stop because of a stockout switch to another method that is in stock (using the switching probabilities of a new decision), rather than stopping contraception
+
+        Returns:
+            An objdict with the year (t), mcpr and cpr at each timestep, as in Sim.results, and the share of users on each method (method_mix, one column per method)
+        '''
+        stockouts = getattr(stockouts, 'stockout_probs', stockouts) or {}
+        n_ages, _, n_methods = self.x0.shape
+        n_preg = self.n_preg
+        x = self.x0.copy() # Non-pregnant women by age group, ever use and method
+        q = self.q0.copy() # Pregnant women by month, then postpartum non-users by month until the 6-month decision
+        res = sc.objdict(t=self.tvec, mcpr=np.zeros(self.npts), cpr=np.zeros(self.npts), method_mix=np.zeros((self.npts, n_methods)))
+
+        for ti in range(self.npts):
+            year = self.start_year + ti//fpd.mpy
+            pu, pu_pp1, pu_pp6 = self.get_prob_use(year)
+
+            # Stockouts
+            if year in stockouts:
+                p_stock = np.zeros(n_methods)
+                for m, p in stockouts[year].items():
+                    p_stock[m] = p
+                stopped = x*p_stock
+                x -= stopped
+                if switch:
+                    probs = self.switch[0]*(p_stock == 0) # Only methods in stock
+                    total = probs.sum(axis=2, keepdims=True)
+                    probs = np.divide(probs, total, out=np.zeros_like(probs), where=total > 0)
+                    switched = np.einsum('aem,amn->aen', stopped, probs)
+                    x += switched
+                    x[:,:,0] += stopped.sum(axis=2) - switched.sum(axis=2)
+                else:
+                    x[:,:,0] += stopped.sum(axis=2)
+
+            # Deliveries and postpartum decisions
+            delivered = q[:,:,n_preg-1].copy()
+            waited = q[:,:,-1].copy()
+            q[:,:,1:] = q[:,:,:-1]
+            q[:,:,0] = 0
+            q[:,:,n_preg] = delivered*(1 - pu_pp1) # Decide again at 6 months
+            x[:,1,:] += (delivered*pu_pp1).sum(axis=1)[:,None]*self.switch_pp1
+            x[:,1,:] += (waited*pu_pp6).sum(axis=1)[:,None]*self.switch[6][:,0,:]
+            x[:,:,0] += waited*(1 - pu_pp6)
+
+            # Decisions at the end of a period of use (or non-use)
+            deciding = x*self.p_decide[:,None,:]
+            x -= deciding
+            users = deciding*pu[:,:,None]
+            x[:,1,:] += np.einsum('aem,amn->an', users, self.switch[0])
+            x[:,:,0] += (deciding - users).sum(axis=2)
+
+            # Conception
+            conceived = x*self.p_preg[:,None,:]
+            x -= conceived
+            q[:,:,0] = conceived.sum(axis=2)
+
+            # Ageing, with women who turn 50 replaced by never-users aged 15
+            aged_out = 0
+            for arr in [x, q]:
+                moving = arr*self.age_rate[:,None,None]
+                arr -= moving
+                arr[1:] += moving[:-1]
+                aged_out += moving[-1].sum()
+            x[0,0,0] += aged_out
+
+            # Results
+            on_method = x.sum(axis=(0,1))
+            none = on_method[0] + q.sum()
+            modern = on_method[self.modern].sum()
+            res.mcpr[ti] = modern/(modern + none)
+            res.cpr[ti] = on_method[1:].sum()/(on_method.sum() + q.sum())
+            res.method_mix[ti] = on_method/max(on_method[1:].sum(), 1e-12)
+            res.method_mix[ti, 0] = 0
+
+        return res
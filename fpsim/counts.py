@@ -0,0 +1,102 @@
+'''
+Counts of agents by group, shared between analyzers.
+
+Many analyzers count agents by the same few states each timestep -- e.g. the living
+women in each age group who use a method -- and each used to rescan the whole
+population to do so. GroupCounts instead tabulates the population once per timestep,
+with a single np.bincount over a composite key of alive, sex, age in years, method,
+pregnant and postpartum (plus any boolean states analyzers register), and analyzers
+take sums over slices of the table with Sim.get_counts().
+'''
+
+import numpy as np
+import sciris as sc
+
+
+__all__ = ['GroupCounts']
+
+
+class GroupCounts(sc.prettyobj):
+    '''
+    Table of the number of agents in each combination of the dims, computed the first
+    time it is requested in each timestep. The age dim has one bin per year of age, up
+    to max_age, and a last bin for anyone older.
+
+    **Example**::
+
+        sim.get_counts(alive=1, sex=0, age=(15, 50)) # Living women aged 15-49
+        sim.get_counts(alive=1, sex=0, keep='method') # Living women on each method
+    '''
+
+    base_dims = ['alive', 'sex', 'age', 'method', 'pregnant', 'postpartum']
+
+    def __init__(self):
+        self.extra = [] # Other boolean states to count by, registered with add_key()
+        self.table = None
+        self.key = None # The timestep and number of agents the table is for
+        return
+
+    @property
+    def dims(self):
+        return self.base_dims + self.extra
+
+    def add_key(self, key):
+        ''' Also count agents by a boolean state, e.g. for an analyzer that tracks it '''
+        if key not in self.dims:
+            self.extra.append(key)
+            self.reset()
+        return
+
+    def reset(self):
+        ''' Discard the table, e.g. because states have changed since it was computed '''
+        self.table = None
+        self.key = None
+        return
+
+    def compute(self, sim):
+        ''' Tabulate the population '''
+        ppl = sim.people
+        n_ages = int(sim['max_age']) + 2
+        n_methods = len(sim.contraception_module.methods) if sim.contraception_module is not None else int(ppl.method.max(initial=0)) + 1
+        sizes = [2, 2, n_ages, n_methods, 2, 2] + [2]*len(self.extra)
+        cols = [ppl.alive, ppl.sex, np.minimum(ppl.age.astype(np.int64), n_ages - 1), ppl.method,
+                ppl.pregnant, ppl.postpartum] + [ppl[key] for key in self.extra]
+        code = np.zeros(len(ppl), dtype=np.int64)
+        for col, size in zip(cols, sizes):
+            code *= size
+            code += col
+        self.table = np.bincount(code, minlength=int(np.prod(sizes))).reshape(sizes)
+        self.key = (sim.ti, len(ppl))
+        return self.table
+
+    def get(self, sim, keep=None, **selections):
+        '''
+        Number of agents in the selected groups, summed over all the dims except those in keep
+
+        Args:
+            sim (Sim): the sim
+            keep (str/list): the dims to keep, in the order of self.dims
+            selections (dict): for each dim, an index, a slice, or for age a (low, high) tuple of whole years, as in fpu.match_ages()
+        '''
+        if self.table is None or self.key != (sim.ti, len(sim.people)):
+            self.compute(sim)
+        keep = sc.tolist(keep)
+        unknown = [d for d in keep + list(selections.keys()) if d not in self.dims]
+        if unknown:
+            errormsg = f'Cannot count by {unknown}; available dims are {self.dims}'
+            raise ValueError(errormsg)
+        inds = []
+        for dim in self.dims:
+            sel = selections.get(dim, slice(None))
+            if isinstance(sel, (bool, np.bool_)):
+                sel = int(sel)
+            if dim == 'age' and isinstance(sel, tuple):
+                if sel[0] != int(sel[0]) or sel[1] != int(sel[1]):
+                    errormsg = f'Age bounds must be whole years, not {sel}'
+                    raise ValueError(errormsg)
+                sel = slice(int(sel[0]), int(sel[1]))
+            inds.append(sel)
+        sub = self.table[tuple(inds)]
+        remaining = [dim for dim, sel in zip(self.dims, inds) if not np.isscalar(sel)]
+        axes = tuple(i for i, dim in enumerate(remaining) if dim not in keep)
+        return sub.sum(axis=axes)
@@ -4,7 +4,6 @@ Define defaults for use throughout FPsim
 
 import numpy as np
 import sciris as sc
-import starsim as ss
 
 
 #%% Global defaults
@@ -56,6 +55,42 @@ class State:
         return arr
 
 
+class ndict(sc.objdict):
+    """
+    A dictionary of named items, keyed by each item's name. This is a lightweight
+    version of ``ss.ndict``, to avoid importing Starsim (which is slow) on import.
+
+    Args:
+        args (list/dict): the items to add
+        type (type): if supplied, the type that all items must have
+
+    **Example**::
+
+        states = fp.ndict([fp.State('age', 0, float), fp.State('sex', 0, bool)])
+    """
+
+    def __init__(self, *args, type=None, **kwargs):
+        super().__init__()
+        self.setattribute('_type', type) # Since otherwise treated as a key
+        for arg in sc.mergelists(*args):
+            self.append(arg)
+        for key, arg in kwargs.items():
+            self.append(arg, key=key)
+        return
+
+    def append(self, arg, key=None):
+        """ Add an item, using its name as the key unless one is supplied """
+        if self._type is not None and not isinstance(arg, self._type):
+            errormsg = f'The following item does not have the expected type {self._type}:\n{arg}'
+            raise TypeError(errormsg)
+        key = key or arg.name
+        if key in self:
+            errormsg = f'Cannot add "{key}" since it is already present; keys are:\n{sc.newlinejoin(self.keys())}'
+            raise ValueError(errormsg)
+        self[key] = arg
+        return
+
+
 # Parse locations
 def get_location(location, printmsg=False):
     default_location = 'senegal'
@@ -120,6 +155,7 @@ person_defaults = [
     State('sexual_debut_age',   -1, float),
     State('fated_debut',        -1, float),
     State('first_birth_age',    -1, float),
+    State('last_birth_age',     np.nan, float),  # Age at the most recent live birth
     State('lactating',          0, bool),
     State('gestation',          0, int),
     State('preg_dur',           0, int),
@@ -190,7 +226,7 @@ person_defaults = [
     # State('short_interval_ages', np.nan, float, ncols=max_parity)  # Ages of agents at short birth interval
 ]
 
-person_defaults = ss.ndict(person_defaults)
+person_defaults = ndict(person_defaults)
 
 # Postpartum keys to months
 postpartum_map = {
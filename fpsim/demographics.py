@@ -7,6 +7,7 @@ age at first partnership.
 import numpy as np  # Needed for a few things not provided by pl
 import sciris as sc
 from . import utils as fpu
+from . import defaults as fpd
 
 
 # %% Initialization methods
@@ -38,7 +39,7 @@ def get_urban_init_vals(ppl, urban_prop=None):
             urban_prop = ppl.pars['urban_prop']
 
     if urban_prop is not None:
-        urban = fpu.n_binomial(urban_prop, n)
+        urban = ppl.binomial(urban_prop, stream='urban')
 
     return urban
 
@@ -55,11 +56,62 @@ def get_partnership_init_vals(ppl):
     f_ages = ppl.age[f_inds]
 
     # Select age at first partnership
-    partnership_age[f_inds] = np.random.choice(partnership_data['age'], size=len(f_inds),
-                                               p=partnership_data['partnership_probs'])
+    if ppl.uses_streams:
+        partnership_age[f_inds] = np.asarray(partnership_data['age'])[ppl.choose(partnership_data['partnership_probs'], 'partnership_age', f_inds)]
+    else:
+        partnership_age[f_inds] = np.random.choice(partnership_data['age'], size=len(f_inds),
+                                                   p=partnership_data['partnership_probs'])
 
     # Check if age at first partnership => than current age to set partnered
     p_inds = sc.findinds((f_ages >= partnership_age[f_inds]))
     partnered[f_inds[p_inds]] = True
 
     return partnered, partnership_age
+
+
+# %% People who are not simulated as agents
+class AgeSexCounts(sc.prettyobj):
+    """
+    Expected numbers of people by sex and month of age who are counted in the population
+    but not simulated as agents, e.g. the men of a female-only sim or agents who have
+    retired (see the female_only and retire_age parameters). They age with the agents, and die at the same rates as in
+    People.decide_death_outcome(), applied to the expected numbers rather than drawn.
+
+    Args:
+        max_age (float): the maximum age; older people stay at this age until they die
+    """
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.counts = np.zeros((2, int(round(max_age*fpd.mpy)) + 1)) # Female (0) and male (1), by month of age
+        return
+
+    @property
+    def n(self):
+        """ Total number of people """
+        return self.counts.sum()
+
+    def add(self, ages, sex, n=1):
+        """ Add people of one sex with the given ages, n people for each age """
+        bins = np.clip(np.floor(np.asarray(ages)*fpd.mpy + 1e-9), 0, self.counts.shape[1] - 1).astype(int)
+        np.add.at(self.counts[sex], bins, n)
+        return
+
+    def step(self, pars):
+        """ Apply mortality for one timestep; return the expected number of deaths """
+        trend = pars['mortality_probs']['gen_trend']
+        age_mort = pars['age_mortality']
+        int_ages = np.minimum(np.arange(self.counts.shape[1])//fpd.mpy, len(age_mort['f_spline']) - 1)
+        probs = np.array([fpu.annprob2ts(age_mort[key][int_ages]*trend, pars['timestep']) for key in ['f_spline', 'm_spline']])
+        probs[:, :fpd.mpy] = 0 # Infant deaths are removed before newborns are added
+        deaths = self.counts*probs
+        self.counts -= deaths
+        return deaths.sum()
+
+    def step_age(self, timestep):
+        """ Age everyone by one timestep (in months) """
+        last = self.counts[:, -timestep:].sum(axis=1)
+        self.counts[:, timestep:] = self.counts[:, :-timestep].copy()
+        self.counts[:, :timestep] = 0
+        self.counts[:, -1] += last
+        return
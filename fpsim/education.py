@@ -40,10 +40,14 @@ class Education:
         probs_rural = education_dict['edu_objective'][1, :]
 
         edu_years = np.arange(len(probs_rural))
-        ppl.edu_objective[f_inds_rural] = np.random.choice(edu_years, size=len(f_inds_rural),
-                                                                    p=probs_rural)  # Probs in rural settings
-        ppl.edu_objective[f_inds_urban] = np.random.choice(edu_years, size=len(f_inds_urban),
-                                                                    p=probs_urban)  # Probs in urban settings
+        if ppl.uses_streams:
+            ppl.edu_objective[f_inds_rural] = edu_years[ppl.choose(probs_rural, 'edu_objective', f_inds_rural)]
+            ppl.edu_objective[f_inds_urban] = edu_years[ppl.choose(probs_urban, 'edu_objective', f_inds_urban)]
+        else:
+            ppl.edu_objective[f_inds_rural] = np.random.choice(edu_years, size=len(f_inds_rural),
+                                                                        p=probs_rural)  # Probs in rural settings
+            ppl.edu_objective[f_inds_urban] = np.random.choice(edu_years, size=len(f_inds_urban),
+                                                                        p=probs_urban)  # Probs in urban settings
 
         # Initialise education attainment - ie, current state of education at the start of the simulation
         f_inds = sc.findinds(ppl.is_female)
@@ -93,7 +97,7 @@ class Education:
         age_cutoffs = dropout_dict['age']  # bin edges
         age_inds = np.searchsorted(age_cutoffs, ppl.age, "right") - 1  # NOTE: faster than np.digitize for large arrays
         # Decide who will drop out
-        ppl.edu_dropout = fpu.binomial_arr(dropout_dict['percent'][age_inds])
+        ppl.edu_dropout = ppl.binomial(dropout_dict['percent'][age_inds], stream='edu_dropout')
 
     def advance_education(self, ppl):
         """
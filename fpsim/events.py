@@ -0,0 +1,129 @@
+'''
+Sparse storage of reproductive events.
+
+By default, each agent carries matrices of her ages at each live birth, stillbirth,
+miscarriage and abortion (birth_ages etc.), with max_parity columns that are mostly
+NaN: every agent, including men and the dead, pays for 20 columns of each. With the
+event_log parameter set, these matrices have no columns, and the events are appended
+instead to an EventLog: one row per event (uid, kind, age, ti), so that memory grows
+with the number of events that actually happened. People.event_ages() gives the
+matrices back in their usual form from either source.
+'''
+
+import numpy as np
+import sciris as sc
+from . import defaults as fpd
+
+
+__all__ = ['EventLog', 'event_kinds']
+
+
+# Kinds of event, with the People state counting them and the matrix of ages they replace
+event_kinds = sc.objdict(
+    birth       = sc.objdict(counter='parity',      matrix='birth_ages'),
+    stillbirth  = sc.objdict(counter='stillbirth',  matrix='stillborn_ages'),
+    miscarriage = sc.objdict(counter='miscarriage', matrix='miscarriage_ages'),
+    abortion    = sc.objdict(counter='abortion',    matrix='abortion_ages'),
+)
+
+kind_names = list(event_kinds.keys())
+matrix_keys = [v.matrix for v in event_kinds.values()] + ['child_inds'] # Matrices not allocated when using the event log
+
+
+class EventLog(sc.prettyobj):
+    '''
+    Append-only table of events, stored column by column. Rows are kept in the order they
+    were added; for lookups by agent, an index in compressed sparse row (CSR) form -- the
+    rows sorted by uid, and the offset of each agent's first row -- is built on demand and
+    reused until more events are added.
+
+    **Example**::
+
+        sim = fp.Sim(location='senegal', event_log=True).run()
+        log = sim.people.events
+        log.get(sim.people.uid[0]) # All the events of one agent
+        sim.people.event_ages('birth_ages') # Ages at each live birth, as with event_log=False
+    '''
+
+    def __init__(self, capacity=1024):
+        self.n = 0
+        self.uid  = np.zeros(capacity, dtype=np.int64)
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        self.age  = np.zeros(capacity, dtype=float)
+        self.ti   = np.zeros(capacity, dtype=np.int32)
+        self._index = None
+        return
+
+    def __len__(self):
+        return self.n
+
+    def append(self, uids, kind, ages, ti):
+        ''' Add one event of a given kind (e.g. 'birth') for each agent '''
+        uids = np.asarray(uids)
+        m = len(uids)
+        if not m:
+            return
+        if self.n + m > len(self.uid): # Grow geometrically so appending is amortized O(1)
+            capacity = max(2*len(self.uid), self.n + m)
+            for key in ['uid', 'kind', 'age', 'ti']:
+                arr = getattr(self, key)
+                new = np.zeros(capacity, dtype=arr.dtype)
+                new[:self.n] = arr[:self.n]
+                setattr(self, key, new)
+        sl = slice(self.n, self.n + m)
+        self.uid[sl] = uids
+        self.kind[sl] = kind_names.index(kind)
+        self.age[sl] = ages
+        self.ti[sl] = ti
+        self.n += m
+        self._index = None
+        return
+
+    def index(self):
+        ''' The CSR index: the uids with events, the offsets of their rows, and the rows sorted by uid '''
+        if self._index is None:
+            order = np.argsort(self.uid[:self.n], kind='stable') # Stable, so each agent's events stay in time order
+            uids, starts = np.unique(self.uid[order], return_index=True)
+            offsets = np.append(starts, self.n)
+            self._index = (uids, offsets, order)
+        return self._index
+
+    def get(self, uid):
+        ''' The events of one agent, as a dataframe '''
+        uids, offsets, order = self.index()
+        j = np.searchsorted(uids, uid)
+        rows = order[offsets[j]:offsets[j+1]] if j < len(uids) and uids[j] == uid else order[:0]
+        return sc.dataframe(kind=[kind_names[k] for k in self.kind[rows]], age=self.age[rows], ti=self.ti[rows])
+
+    def to_df(self):
+        ''' All events, in the order they happened '''
+        n = self.n
+        return sc.dataframe(uid=self.uid[:n], kind=np.array(kind_names)[self.kind[:n]], age=self.age[:n], ti=self.ti[:n])
+
+    def ages(self, uids, kind, ncols=fpd.max_parity):
+        '''
+        Ages at each event of one kind for the given agents, as a matrix with one row per
+        agent and ncols columns, padded with NaN -- the layout of People.birth_ages etc.
+        '''
+        uids = np.asarray(uids)
+        out = np.full((len(uids), ncols), np.nan)
+        index_uids, offsets, order = self.index()
+        if not len(index_uids) or not len(uids):
+            return out
+
+        # Row in the output for each agent in the index, or -1 if not requested
+        counts = np.diff(offsets)
+        j = np.minimum(np.searchsorted(index_uids, uids), len(index_uids) - 1)
+        found = index_uids[j] == uids
+        rows = np.full(len(index_uids), -1)
+        rows[j[found]] = np.nonzero(found)[0]
+
+        # Position of each event among the agent's events of this kind
+        is_kind = self.kind[order] == kind_names.index(kind)
+        cum = np.cumsum(is_kind)
+        before = np.repeat(cum[offsets[:-1]] - is_kind[offsets[:-1]], counts) # Events of this kind before each agent's first row
+        col = cum - 1 - before
+        row = np.repeat(rows, counts)
+        use = is_kind & (row >= 0) & (col < ncols)
+        out[row[use], col[use]] = self.age[order[use]]
+        return out
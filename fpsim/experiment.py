@@ -318,7 +318,7 @@ class Experiment(sc.prettyobj):
         # Extract birth spaces from model
         ppl = self.sim.people
         gt1_birth = ppl.filter(ppl.alive * ~ppl.sex * ppl.parity>1)  # Alive women with >1 birth
-        birth_spaces = np.diff(gt1_birth.birth_ages)  # Birth spacings
+        birth_spaces = np.diff(gt1_birth.event_ages('birth_ages'))  # Birth spacings
         defined_vals = ~np.isnan(birth_spaces) * (birth_spaces>0)  # Find NaNs and twins
         model_spacing = birth_spaces[defined_vals]  # Remove NaNs and twins
         model_spacing_counts, _ = np.histogram(model_spacing, bins=np.append(spacing_bins.values(), 10))  # Bin
@@ -327,7 +327,7 @@ class Experiment(sc.prettyobj):
 
         # Extract age at first birth from model
         any_births = ppl.filter(ppl.alive * ~ppl.sex * ppl.parity>0)
-        model_age_first = any_births.birth_ages[:,0]
+        model_age_first = any_births.event_ages('birth_ages')[:,0]
 
         # Extract birth spaces and age at first birth from data
         for i, j in data_spaces.iterrows():
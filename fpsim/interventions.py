@@ -3,7 +3,7 @@ Specify the core interventions available in FPsim. Other interventions can be
 defined by the user by inheriting from these classes.
 '''
 import numpy as np
-import pylab as pl
+import matplotlib.pyplot as pl
 import sciris as sc
 import inspect
 from . import utils as fpu
@@ -405,7 +405,8 @@ class change_people_state(Intervention):
         if self.years[0] <= sim.y <= self.years[1]:  # Inclusive range
             is_eligible = self.check_eligibility(sim)
             selected_inds = self.select_people(is_eligible)
-            sim.people[self.state_name][selected_inds] = self.new_val
+            selected = sim.people.filter(inds=selected_inds)
+            setattr(selected, self.state_name, self.new_val) # Set via the filter so that the active sets stay in sync
         return
 
 
@@ -0,0 +1,408 @@
+'''
+Compiled kernels for the core reproductive cycle of People.step().
+
+These are used when the sim is run with ``step_mode='compiled'`` or
+``step_mode='parallel'``. Instead of one vectorized pass (with its own filters and
+temporaries) per sub-module, each agent is visited once and all of her transitions
+for the timestep are applied in turn, with the step results accumulated in the same
+loop. The kernels operate directly on the People state arrays, so interventions and
+analyzers see the same People API as in the reference path.
+
+The population is split into fixed-size chunks, each with its own random stream
+keyed on (seed, timestep, chunk). In parallel mode the chunks are spread over
+threads with ``numba.prange``; since neither the chunks nor their streams depend on
+the number of threads, the compiled and parallel modes give identical results for
+any thread count. Per-chunk results are summed afterwards.
+
+The random draws happen in a different order to the reference path, so results
+agree statistically rather than draw-for-draw (see test_people_step.py).
+
+The speedup is modest: timesteps with these kernels have been measured at about
+1.3-1.7x faster than with step_mode='python', not the 5-10x that was aimed for,
+since the rest of each timestep (contraception, results, analyzers) still runs as
+before; extra threads in parallel mode only speed up the kernels themselves.
+'''
+
+import numpy as np
+import numba as nb
+from . import defaults as fpd
+
+
+__all__ = ['stat_keys', 'chunk_size', 'step_pre_contra', 'step_post_contra']
+
+
+# Order of the scalar step results accumulated by the kernels
+stat_keys = ['deaths', 'births', 'stillbirths', 'short_intervals', 'maternal_deaths', 'infant_deaths',
+             'miscarriages', 'pregnancies', 'method_failures', 'abortions', 'pp0to5', 'pp6to11', 'pp12to23']
+
+# Plain integer constants so that they can be used inside the kernels
+DEATHS, BIRTHS, STILLBIRTHS, SHORT_INTERVALS, MATERNAL_DEATHS, INFANT_DEATHS, MISCARRIAGES, \
+    PREGNANCIES, METHOD_FAILURES, ABORTIONS, PP0TO5, PP6TO11, PP12TO23 = range(len(stat_keys))
+
+chunk_size = 8192 # Number of agents per chunk; changing this changes the random streams
+
+
+# %% Random numbers
+
+@nb.njit(cache=True)
+def splitmix(x):
+    ''' Scramble a 64-bit integer (SplitMix64 finalizer) '''
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+@nb.njit(cache=True)
+def chunk_state(seed, ti, stage, chunk):
+    ''' Initial state of the random stream for one chunk of one stage of one timestep '''
+    state = splitmix(np.uint64(seed) + np.uint64(0x9E3779B97F4A7C15))
+    state = splitmix(state ^ np.uint64(ti))
+    state = splitmix(state ^ np.uint64(stage))
+    state = splitmix(state ^ np.uint64(chunk))
+    return np.array([state], dtype=np.uint64)
+
+
+@nb.njit(cache=True)
+def rand(state):
+    ''' Draw a uniform number on [0, 1), advancing the stream stored in state[0] '''
+    state[0] += np.uint64(0x9E3779B97F4A7C15)
+    return (splitmix(state[0]) >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+
+
+@nb.njit(cache=True)
+def randn(state):
+    ''' Draw a standard normal number (Box-Muller) '''
+    u1 = 1.0 - rand(state) # Avoid log(0)
+    u2 = rand(state)
+    return np.sqrt(-2.0*np.log(u1)) * np.cos(2.0*np.pi*u2)
+
+
+@nb.njit(cache=True)
+def truncnorm_draw(state, mean, sd, low, high):
+    ''' Draw from a normal distribution truncated to [low, high] by rejection '''
+    while True:
+        val = mean + sd*randn(state)
+        if low <= val <= high:
+            return val
+
+
+# %% Helper functions
+
+@nb.njit(cache=True)
+def nearest_ind(arr, val):
+    ''' Index of the closest value in a sorted array, matching the stillbirth age lookup '''
+    n = len(arr)
+    ind = np.searchsorted(arr, val, side='left')
+    if ind == n or (ind > 0 and abs(val - arr[ind-1]) < abs(val - arr[min(ind, n-1)])):
+        ind -= 1
+    return ind
+
+
+@nb.njit(cache=True)
+def annprob2ts(prob_annual, timestep):
+    ''' Scalar version of fpu.annprob2ts() '''
+    return 1 - (1 - min(1.0, prob_annual))**(timestep/fpd.mpy)
+
+
+@nb.njit(cache=True)
+def age_bin(age, bin_lows, bin_highs):
+    ''' Index of the age bin that an age falls into, or -1 '''
+    for b in range(len(bin_lows)):
+        if bin_lows[b] <= age < bin_highs[b]:
+            return b
+    return -1
+
+
+# %% Per-chunk transitions
+
+@nb.njit(cache=True)
+def pre_contra_chunk(start, stop, rng, ti, pars, tables, states, flags, stats, birth_bins, age_bin_totals):
+    '''
+    First half of the step for agents start:stop: general mortality, delivery (with
+    stillbirth, twins, maternal and infant mortality), partnership, pregnancy progression
+    and miscarriage, and sexual activity. Also flags who is non-pregnant and fecund,
+    lactating, and ready to update their method, as of after delivery, mirroring the
+    filters in People.step().
+    '''
+    timestep, age_limit, end_first_tri, pp_dur_max, short_int, twins_prob, maternal_prob, \
+        spacing_interval, spacing_nbins = pars
+    f_mort, m_mort, still_ages, still_probs, infant_ages, infant_probs, misc_rates, sex_act, \
+        pp_active, spacing_pref, bin_lows, bin_highs = tables
+    alive, sex, age, pregnant, gestation, preg_dur, lactating, postpartum, postpartum_dur, lam, \
+        breastfeed_dur, breastfeed_dur_total, sexually_active, sexual_debut, sexual_debut_age, fated_debut, \
+        months_inactive, ti_contra, parity, stillbirth, miscarriage, first_birth_age, last_birth_age, partnered, \
+        partnership_age, birth_ages, stillborn_ages, miscarriage_ages = states
+    nonpreg, lact, ready = flags
+    ncols = birth_ages.shape[1]
+
+    for i in range(start, stop):
+        nonpreg[i] = False
+        lact[i] = False
+        ready[i] = False
+        if not alive[i]:
+            continue
+
+        # General mortality for agents aged one and over
+        if age[i] >= 1:
+            a = int(age[i])
+            prob = f_mort[a] if sex[i] == 0 else m_mort[a]
+            if rand(rng) < prob:
+                alive[i] = False
+                pregnant[i] = False
+                gestation[i] = 0
+                sexually_active[i] = False
+                lactating[i] = False
+                postpartum[i] = False
+                lam[i] = False
+                breastfeed_dur[i] = 0
+                stats[DEATHS] += 1
+                continue
+
+        # Delivery
+        if pregnant[i] and gestation[i] == preg_dur[i]:
+            pregnant[i] = False
+            gestation[i] = 0
+            lactating[i] = True
+            postpartum[i] = True
+            breastfeed_dur[i] = 0
+            postpartum_dur[i] = 0
+            ti_contra[i] = ti + 1
+            par = parity[i]
+            if rand(rng) < still_probs[nearest_ind(still_ages, age[i])]:
+                stillbirth[i] += 1
+                lactating[i] = False
+                stats[STILLBIRTHS] += 1
+                if par < ncols:
+                    stillborn_ages[i, par] = age[i]
+            else:
+                n_babies = 2 if rand(rng) < twins_prob else 1
+                stats[BIRTHS] += n_babies
+                for k in range(n_babies):
+                    if par + k < ncols:
+                        birth_ages[i, par+k] = age[i]
+                if par == 0:
+                    first_birth_age[i] = age[i]
+                elif par <= fpd.max_parity:
+                    interval = age[i] - last_birth_age[i]
+                    if interval < short_int:
+                        stats[SHORT_INTERVALS] += 1
+                last_birth_age[i] = age[i]
+                parity[i] += n_babies
+                b = age_bin(age[i], bin_lows, bin_highs)
+                if b >= 0:
+                    birth_bins[b] += 1
+
+                # Maternal and infant mortality, for live births only
+                if rand(rng) < maternal_prob:
+                    alive[i] = False
+                    stats[MATERNAL_DEATHS] += 1
+                    stats[DEATHS] += 1
+                if rand(rng) < infant_probs[np.argmin(np.abs(infant_ages - age[i]))]:
+                    stats[INFANT_DEATHS] += 1
+                    lactating[i] = False
+                    breastfeed_dur_total[i] += breastfeed_dur[i]
+                    breastfeed_dur[i] = 0
+                    ti_contra[i] = ti + 1
+                if not alive[i]:
+                    continue
+
+        # Partnership
+        if not partnered[i] and age[i] >= partnership_age[i]:
+            partnered[i] = True
+
+        # Sets used by the rest of the step, as of after delivery
+        fecund = sex[i] == 0 and age[i] < age_limit
+        if fecund:
+            b = age_bin(age[i], bin_lows, bin_highs)
+            if b >= 0:
+                age_bin_totals[b] += 1
+            nonpreg[i] = not pregnant[i]
+            lact[i] = lactating[i]
+            ready[i] = nonpreg[i] and ti_contra[i] <= ti
+
+        # Pregnancy progression and miscarriage at the end of the first trimester
+        if pregnant[i]:
+            gestation[i] += timestep
+            if gestation[i] == end_first_tri:
+                if rand(rng) < misc_rates[min(int(age[i]), fpd.max_age_preg)]:
+                    if miscarriage[i] < ncols:
+                        miscarriage_ages[i, miscarriage[i]] = age[i]
+                    pregnant[i] = False
+                    miscarriage[i] += 1
+                    postpartum[i] = False
+                    gestation[i] = 0
+                    ti_contra[i] = ti + 1
+                    stats[MISCARRIAGES] += 1
+
+        # Sexual activity
+        if nonpreg[i]:
+            ppd = postpartum_dur[i]
+            if postpartum[i] and 0 <= ppd <= pp_dur_max:
+                sbin = int(min(ppd/spacing_interval, spacing_nbins))
+                sexually_active[i] = rand(rng) < pp_active[ppd] * spacing_pref[sbin]
+            elif age[i] >= fated_debut[i]:
+                sexually_active[i] = rand(rng) < sex_act[min(int(age[i]), len(sex_act)-1)]
+                if sexually_active[i] and not sexual_debut[i]:
+                    sexual_debut[i] = True
+                    sexual_debut_age[i] = age[i]
+            if sexual_debut[i]:
+                if sexually_active[i]:
+                    months_inactive[i] = 0
+                else:
+                    months_inactive[i] += 1
+    return
+
+
+@nb.njit(cache=True)
+def post_contra_chunk(start, stop, rng, pars, tables, states, flags, stats):
+    '''
+    Second half of the step for agents start:stop, run after contraceptive methods have
+    been updated: postpartum tracking, breastfeeding, lactational amenorrhea, and
+    conception (including abortion).
+    '''
+    timestep, pp_dur_max, max_lam_dur, lam_eff, bf_mean, bf_sd, exposure_factor, abortion_prob, \
+        preg_dur_low, preg_dur_high = pars
+    lam_rate, method_eff, age_fec, nullip_ratio, exposure_age, exposure_parity = tables
+    age, pregnant, gestation, preg_dur, lactating, postpartum, postpartum_dur, lam, breastfeed_dur, \
+        breastfeed_dur_total, sexually_active, fertile, personal_fecundity, on_contra, method, parity, \
+        abortion, abortion_ages = states
+    nonpreg, lact = flags
+    ncols = abortion_ages.shape[1]
+
+    for i in range(start, stop):
+        if not (nonpreg[i] or lact[i]):
+            continue
+
+        # Postpartum
+        if nonpreg[i]:
+            if postpartum_dur[i] >= pp_dur_max:
+                postpartum[i] = False
+                postpartum_dur[i] = 0
+            if postpartum[i]:
+                ppd = postpartum_dur[i]
+                if ppd < 6:
+                    stats[PP0TO5] += 1
+                elif ppd < 12:
+                    stats[PP6TO11] += 1
+                elif ppd < 24:
+                    stats[PP12TO23] += 1
+                postpartum_dur[i] += timestep
+
+        # Breastfeeding
+        if lact[i]:
+            if breastfeed_dur[i] >= np.ceil(truncnorm_draw(rng, bf_mean, bf_sd, 0.0, 50.0)):
+                lactating[i] = False
+                breastfeed_dur_total[i] += breastfeed_dur[i]
+                breastfeed_dur[i] = 0
+            else:
+                breastfeed_dur[i] += timestep
+
+        if not nonpreg[i]:
+            continue
+
+        # Lactational amenorrhea
+        ppd = postpartum_dur[i]
+        if postpartum[i] and ppd <= max_lam_dur:
+            lam[i] = rand(rng) < lam_rate[ppd]
+        if not postpartum[i] or ppd > max_lam_dur or breastfeed_dur[i] == 0:
+            lam[i] = False
+
+        # Conception
+        if sexually_active[i] and fertile[i]:
+            a = min(int(age[i]), fpd.max_age_preg)
+            eff = lam_eff if lam[i] else method_eff[method[i]]
+            prob = annprob2ts((1 - eff) * age_fec[a] * personal_fecundity[i], timestep)
+            if parity[i] == 0:
+                prob *= nullip_ratio[a]
+            prob *= exposure_factor * exposure_age[a] * exposure_parity[min(parity[i], fpd.max_parity)]
+            if rand(rng) < prob:
+                stats[PREGNANCIES] += 1
+                if method[i] != 0:
+                    stats[METHOD_FAILURES] += 1
+                if rand(rng) < abortion_prob:
+                    if abortion[i] < ncols:
+                        abortion_ages[i, abortion[i]] = age[i]
+                    postpartum[i] = False
+                    abortion[i] += 1
+                    postpartum_dur[i] = 0
+                    stats[ABORTIONS] += 1
+                else:
+                    pregnant[i] = True
+                    gestation[i] = 1
+                    preg_dur[i] = preg_dur_low + int(rand(rng) * (preg_dur_high - preg_dur_low + 1))
+                    postpartum[i] = False
+                    postpartum_dur[i] = 0
+                    lactating[i] = False
+                    breastfeed_dur_total[i] += breastfeed_dur[i]
+                    breastfeed_dur[i] = 0
+                    on_contra[i] = False
+                    method[i] = 0
+    return
+
+
+# %% Drivers: loop over chunks, either serially or in parallel
+
+@nb.njit(cache=True)
+def _pre_contra_serial(seed, ti, pars, tables, states, flags, stats, birth_bins, age_bin_totals):
+    n = len(flags[0])
+    for c in range(stats.shape[0]):
+        rng = chunk_state(seed, ti, 0, c)
+        pre_contra_chunk(c*chunk_size, min(n, (c+1)*chunk_size), rng, ti, pars, tables, states, flags,
+                         stats[c], birth_bins[c], age_bin_totals[c])
+    return
+
+
+@nb.njit(cache=True, parallel=True, nogil=True)
+def _pre_contra_parallel(seed, ti, pars, tables, states, flags, stats, birth_bins, age_bin_totals):
+    n = len(flags[0])
+    for c in nb.prange(stats.shape[0]):
+        rng = chunk_state(seed, ti, 0, c)
+        pre_contra_chunk(c*chunk_size, min(n, (c+1)*chunk_size), rng, ti, pars, tables, states, flags,
+                         stats[c], birth_bins[c], age_bin_totals[c])
+    return
+
+
+@nb.njit(cache=True)
+def _post_contra_serial(seed, ti, pars, tables, states, flags, stats):
+    n = len(flags[0])
+    for c in range(stats.shape[0]):
+        rng = chunk_state(seed, ti, 1, c)
+        post_contra_chunk(c*chunk_size, min(n, (c+1)*chunk_size), rng, pars, tables, states, flags, stats[c])
+    return
+
+
+@nb.njit(cache=True, parallel=True, nogil=True)
+def _post_contra_parallel(seed, ti, pars, tables, states, flags, stats):
+    n = len(flags[0])
+    for c in nb.prange(stats.shape[0]):
+        rng = chunk_state(seed, ti, 1, c)
+        post_contra_chunk(c*chunk_size, min(n, (c+1)*chunk_size), rng, pars, tables, states, flags, stats[c])
+    return
+
+
+def n_chunks(n):
+    ''' Number of chunks for a population of size n '''
+    return max(1, -(-n // chunk_size))
+
+
+def step_pre_contra(seed, ti, pars, tables, states, flags, parallel=False):
+    '''
+    Run the first half of the step over all chunks, returning the per-chunk step
+    results summed over chunks, plus the birth and age bin counts.
+    '''
+    n_bins = len(tables[-1])
+    nc = n_chunks(len(flags[0]))
+    stats = np.zeros((nc, len(stat_keys)), dtype=np.int64)
+    birth_bins = np.zeros((nc, n_bins), dtype=np.int64)
+    age_bin_totals = np.zeros((nc, n_bins), dtype=np.int64)
+    kernel = _pre_contra_parallel if parallel else _pre_contra_serial
+    kernel(seed, ti, pars, tables, states, flags, stats, birth_bins, age_bin_totals)
+    return stats.sum(axis=0), birth_bins.sum(axis=0), age_bin_totals.sum(axis=0)
+
+
+def step_post_contra(seed, ti, pars, tables, states, flags, parallel=False):
+    ''' Run the second half of the step over all chunks, returning the summed step results '''
+    stats = np.zeros((n_chunks(len(flags[0])), len(stat_keys)), dtype=np.int64)
+    kernel = _post_contra_parallel if parallel else _post_contra_serial
+    kernel(seed, ti, pars, tables, states, flags, stats)
+    return stats.sum(axis=0)
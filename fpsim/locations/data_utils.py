@@ -2,6 +2,12 @@
 Process datafiles - this file contains functions common to all locations
 """
 import os
+import time
+import pickle
+import hashlib
+import inspect
+import functools
+import collections as co
 import numpy as np
 import pandas as pd
 import sciris as sc
@@ -9,6 +15,8 @@ import yaml
 from scipy import interpolate as si
 from fpsim import defaults as fpd
 from fpsim import utils as fpu
+from fpsim import version as fpv
+from fpsim.settings import options as fpo
 import fpsim.shared_data as sd
 
 sd_dir = os.path.dirname(sd.__file__)  # path to the shared_data directory
@@ -28,6 +36,193 @@ def data2interp(data, ages, normalize=False):
         interp = np.minimum(1, np.maximum(0, interp))
     return interp
 
+# %% Cache of processed data
+
+bundle_filename = '.bundle.pkl' # Stored in each location's data folder
+bundle_format = 1 # Version of the bundle file layout; increase to discard all existing bundles
+max_bundles = 8 # Number of bundles to keep in memory
+check_interval = 1.0 # Seconds between checks that a bundle in memory still matches the files
+_bundles = co.OrderedDict() # In-process LRU cache of loaded bundles
+
+
+class DataBundle(sc.prettyobj):
+    """
+    The processed data for one location (or for the shared data), stored as a single
+    pickle alongside the data files, so the CSV and YAML files only need to be parsed
+    once. The bundle is keyed on the data files, the shared data files, and this file:
+    if a file's size or modification time changes, its hash is checked, and if that has
+    changed too, the bundle is cleared and the data are processed again.
+
+    The pickle is preceded by a header line (see bundle_header()) with the format of the
+    file, the FPsim version and the hash of this file, which does the processing; a
+    bundle file whose header does not match is discarded without being unpickled.
+    """
+
+    def __init__(self, folder):
+        self.folder = sc.path(folder)
+        self.version = fpv.__version__
+        self.files = {} # Filename: (modification time, size, hash)
+        self.data = {} # Function call: processed data
+        self.checked = time.time() # When the bundle was last checked against the files
+        self.hash_files()
+        return
+
+    def stats(self):
+        """ The modification time and size of all the files the processed data could depend on """
+        stats = {}
+        for folder in [str(self.folder), sd_dir]:
+            for entry in os.scandir(folder):
+                if entry.name.endswith(('.csv', '.yaml')):
+                    st = entry.stat()
+                    stats[entry.path] = (st.st_mtime_ns, st.st_size)
+        st = os.stat(__file__)
+        stats[__file__] = (st.st_mtime_ns, st.st_size)
+        return stats
+
+    @staticmethod
+    def hash(path):
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def hash_files(self, stats=None):
+        """ Key the bundle on the current files """
+        if stats is None: stats = self.stats()
+        self.files = {path: (*stat, self.hash(path)) for path, stat in stats.items()}
+        return
+
+    def check(self):
+        """
+        Check that the bundle still matches the files, clearing it if not; returns
+        whether the bundle needs to be saved again
+        """
+        self.checked = time.time()
+        stats = self.stats()
+        if {k: v[:2] for k, v in self.files.items()} == stats and self.version == fpv.__version__:
+            return False # Nothing has changed: the usual case
+
+        # Something has been touched: only clear the bundle if the contents have changed
+        valid = (set(stats) == set(self.files)) and (self.version == fpv.__version__)
+        if valid:
+            for path, stat in stats.items():
+                if stat != self.files[path][:2] and self.hash(path) != self.files[path][2]:
+                    valid = False
+                    break
+        if not valid:
+            self.data = {}
+            self.version = fpv.__version__
+        self.hash_files(stats)
+        return True
+
+    def save(self):
+        """ Save atomically; if the data folder is read-only, only keep the bundle in memory """
+        path = self.folder / bundle_filename
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(bundle_header())
+                pickle.dump(self, f, protocol=5)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return
+
+
+@functools.lru_cache()
+def bundle_header():
+    """ The first line of a bundle file, which must match for the bundle to be loaded """
+    return f'fpsim-bundle {bundle_format} {fpv.__version__} {DataBundle.hash(__file__)}\n'.encode()
+
+
+def get_bundle(folder):
+    """ Get the bundle for a data folder, from memory, from disk, or newly created """
+    key = str(folder)
+    bundle = _bundles.pop(key, None)
+    if bundle is None:
+        try:
+            with open(sc.path(folder) / bundle_filename, 'rb') as f:
+                if f.readline() == bundle_header(): # Otherwise, from another version: discard it without unpickling
+                    bundle = pickle.load(f)
+            if bundle is not None:
+                assert isinstance(bundle, DataBundle)
+                bundle.folder = sc.path(folder) # In case the package has been moved
+                fpu.freeze(bundle.data) # Arrays are writeable again after loading
+                bundle.checked = 0 # Always check a bundle loaded from disk
+        except Exception:
+            bundle = None
+    if bundle is None:
+        bundle = DataBundle(folder)
+    elif time.time() - bundle.checked > check_interval and bundle.check():
+        bundle.save()
+    _bundles[key] = bundle
+    while len(_bundles) > max_bundles:
+        _bundles.popitem(last=False)
+    return bundle
+
+
+def clear_bundles(location=None, disk=False):
+    """
+    Clear the cache of processed data, in memory and optionally on disk
+
+    **Example**::
+
+        fpld.clear_bundles(disk=True) # Parse all data files again on next use
+    """
+    folders = [this_dir() / location / 'data'] if location else [sc.path(k) for k in _bundles.keys()]
+    if disk and not location:
+        folders += [p.parent for p in this_dir().glob(f'*/data/{bundle_filename}')] + [sc.path(sd_dir)]
+    for folder in folders:
+        _bundles.pop(str(folder), None)
+        if disk:
+            try:
+                os.remove(folder / bundle_filename)
+            except FileNotFoundError:
+                pass
+    return
+
+
+def _cache_key(val):
+    """ Convert an argument to a hashable key; return None if this is not possible """
+    if val is None or isinstance(val, (str, int, float, bool)):
+        return val
+    elif isinstance(val, dict) and all(hasattr(v, 'csv_name') for v in val.values()):
+        return tuple((m.name, m.csv_name, m.idx) for m in val.values()) # Contraceptive methods
+    return None
+
+
+def cached(func):
+    """
+    Decorator to cache the output of a data-processing function in the bundle for its
+    location (or for the shared data, if it has no location argument). Calls with other
+    data supplied directly (e.g. a dataframe) are not cached. Each call returns a copy
+    that shares the (read-only) arrays, so the arrays can be replaced but not modified
+    in place.
+    """
+    argnames = list(inspect.signature(func).parameters)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        callargs = sc.mergedicts(dict(zip(argnames, args)), kwargs)
+        keys = {k: _cache_key(v) for k, v in callargs.items()}
+        key = (func.__name__,) + tuple(sorted(keys.items()))
+        cacheable = fpo.data_cache and all(keys[k] is not None or v is None for k, v in callargs.items())
+        if 'location' in argnames:
+            folder = this_dir() / str(callargs.get('location')) / 'data'
+        else:
+            folder = sc.path(sd_dir)
+        if not cacheable or not folder.is_dir():
+            return func(*args, **kwargs)
+        bundle = get_bundle(folder)
+        if key not in bundle.data:
+            bundle.data[key] = fpu.freeze(func(*args, **kwargs))
+            bundle.save()
+        return fpu.dcp(bundle.data[key]) # Share the read-only arrays
+
+    return wrapper
+
+
 def load_age_adjustments():
     with open(os.path.join(sd_dir, 'age_adjustments.yaml'), 'r') as f:
         adjustments = yaml.safe_load(f)
@@ -82,6 +277,7 @@ def _check_age_endpoints(df):
     return df
 
 # %% Scalar pars
+@cached
 def bf_stats(location):
     """ Load breastfeeding stats """
     bf_data = pd.read_csv(this_dir() / location / 'data' / 'bf_stats.csv')
@@ -92,6 +288,7 @@ def bf_stats(location):
 
     return bf_pars
 
+@cached
 def scalar_probs(location):
     """ Load abortion and twins probabilities """
     data = pd.read_csv(this_dir() / location / 'data' / 'scalar_probs.csv')
@@ -102,6 +299,7 @@ def scalar_probs(location):
 
 
 # %% Demographics
+@cached
 def age_spline(which):
     d = pd.read_csv(os.path.join(sd_dir, f'splines_{which}.csv'))
     # Set the age as the index
@@ -109,6 +307,7 @@ def age_spline(which):
     return d
 
 
+@cached
 def age_partnership(location):
     """ Probabilities of being partnered at age X"""
     age_partnership_data = pd.read_csv(this_dir() / location / 'data' / 'age_partnership.csv')
@@ -118,6 +317,7 @@ def age_partnership(location):
     return  partnership_dict
 
 
+@cached
 def wealth(location):
     """ Process percent distribution of people in each wealth quintile"""
     cols = ["quintile", "percent"]
@@ -125,12 +325,14 @@ def wealth(location):
     return wealth_data
 
 
+@cached
 def urban_proportion(location):
     """Load information about the proportion of people who live in an urban setting"""
     urban_data = pd.read_csv(this_dir() / location / 'data' / 'urban.csv')
     return urban_data["mean"][0]  # Return this value as a float
 
 
+@cached
 def age_pyramid(location):
     """Load age pyramid data"""
     age_pyramid_data = pd.read_csv(this_dir() / location / 'data' / 'age_pyramid.csv')
@@ -139,6 +341,7 @@ def age_pyramid(location):
 
 
 # %% Mortality
+@cached
 def age_mortality(location, data_year=None):
     """
     Age-dependent mortality rates taken from UN World Population Prospects 2022.  From probability of dying each year.
@@ -183,6 +386,7 @@ def age_mortality(location, data_year=None):
     return mortality
 
 
+@cached
 def maternal_mortality(location):
     """
     From World Bank indicators for maternal mortality ratio (modeled estimate) per 100,000 live births:
@@ -202,6 +406,7 @@ def maternal_mortality(location):
     return maternal_mortality
 
 
+@cached
 def infant_mortality(location):
     '''
     From World Bank indicators for infant mortality (< 1 year) for Kenya, per 1000 live births
@@ -223,6 +428,7 @@ def infant_mortality(location):
 
 
 # %% Pregnancy and birth outcomes
+@cached
 def miscarriage():
     """
     Returns a linear interpolation of the likelihood of a miscarriage
@@ -238,6 +444,7 @@ def miscarriage():
     return miscarriage_interp
 
 
+@cached
 def stillbirth(location):
     '''
     From Report of the UN Inter-agency Group for Child Mortality Estimation, 2020
@@ -258,6 +465,7 @@ def stillbirth(location):
 
 
 # %% Fecundity and conception
+@cached
 def female_age_fecundity():
     '''
     Use fecundity rates from PRESTO study: https://www.ncbi.nlm.nih.gov/pmc/articles/PMC5712257/
@@ -277,6 +485,7 @@ def female_age_fecundity():
     return fecundity_interp
 
 
+@cached
 def fecundity_ratio_nullip():
     '''
     Returns an array of fecundity ratios for a nulliparous woman vs a gravid woman
@@ -292,6 +501,7 @@ def fecundity_ratio_nullip():
     return fecundity_nullip_interp
 
 
+@cached
 def lactational_amenorrhea(location):
     '''
     Returns an array of the percent of breastfeeding women by month postpartum 0-11 months who meet criteria for LAM:
@@ -308,6 +518,7 @@ def lactational_amenorrhea(location):
     return lactational_amenorrhea
 
 
+@cached
 def sexual_activity(location):
     '''
     Returns a linear interpolation of rates of female sexual activity, defined as
@@ -328,6 +539,7 @@ def sexual_activity(location):
     return activity_interp
 
 
+@cached
 def sexual_activity_pp(location):
     '''
     Returns an array of monthly likelihood of having resumed sexual activity within 0-35 months postpartum
@@ -344,6 +556,7 @@ def sexual_activity_pp(location):
     return postpartum_activity
 
 
+@cached
 def debut_age(location):
     """
     Returns an array of weighted probabilities of sexual debut by a certain age 10-45.
@@ -358,6 +571,7 @@ def debut_age(location):
     return debut_age
 
 
+@cached
 def birth_spacing_pref(location):
     '''
     Returns an array of birth spacing preferences by closest postpartum month.
@@ -457,6 +671,7 @@ def education_dropout_probs(df):
     return data
 
 
+@cached
 def education_distributions(location):
     """
     Loads and processes all education-related data files. Performs additional interpolation
@@ -490,6 +705,7 @@ def education_distributions(location):
     return education_dict, education_data
 
  
+@cached
 def process_contra_use(which, location):
     """
     Process cotraceptive use parameters.
@@ -532,6 +748,7 @@ def process_contra_use(which, location):
     return contra_use_pars
 
 
+@cached
 def process_markovian_method_choice(methods, location, df=None):
     """ Choice of method is age and previous method """
     if df is None:
@@ -574,47 +791,59 @@ def process_markovian_method_choice(methods, location, df=None):
 
 def process_dur_use(methods, location, df=None):
     """ Process duration of use parameters"""
+    dur_use = dur_use_pars(methods, location, df=df)
+    for method in methods.values():
+        method.dur_use = dur_use[method.name]
+    return methods
+
+
+@cached
+def dur_use_pars(methods, location, df=None):
+    """ Duration of use parameters for each method, keyed by method name """
     if df is None:
         df = pd.read_csv(this_dir() / location / 'data' / 'method_time_coefficients.csv', keep_default_na=False, na_values=['NaN'])
+    dur_uses = dict()
     for method in methods.values():
         if method.name == 'btl':
-            method.dur_use = dict(dist='unif', par1=1000, par2=1200)
+            dur_use = dict(dist='unif', par1=1000, par2=1200)
         else:
             mlabel = method.csv_name
 
             thisdf = df.loc[df.method == mlabel]
             dist = thisdf.functionform.iloc[0]
-            method.dur_use = dict()
+            dur_use = dict()
             age_ind = sc.findfirst(thisdf.coef.values, 'age_grp_fact(0,18]')
-            method.dur_use['age_factors'] = thisdf.estimate.values[age_ind:]
+            dur_use['age_factors'] = thisdf.estimate.values[age_ind:]
 
             if dist in ['lognormal', 'lnorm']:
-                method.dur_use['dist'] = 'lognormal_sps'
-                method.dur_use['par1'] = thisdf.estimate[thisdf.coef == 'meanlog'].values[0]
-                method.dur_use['par2'] = thisdf.estimate[thisdf.coef == 'sdlog'].values[0]
+                dur_use['dist'] = 'lognormal_sps'
+                dur_use['par1'] = thisdf.estimate[thisdf.coef == 'meanlog'].values[0]
+                dur_use['par2'] = thisdf.estimate[thisdf.coef == 'sdlog'].values[0]
             elif dist in ['gamma']:
-                method.dur_use['dist'] = dist
-                method.dur_use['par1'] = thisdf.estimate[thisdf.coef == 'shape'].values[0]
-                method.dur_use['par2'] = thisdf.estimate[thisdf.coef == 'rate'].values[0]
+                dur_use['dist'] = dist
+                dur_use['par1'] = thisdf.estimate[thisdf.coef == 'shape'].values[0]
+                dur_use['par2'] = thisdf.estimate[thisdf.coef == 'rate'].values[0]
             elif dist == 'llogis':
-                method.dur_use['dist'] = dist
-                method.dur_use['par1'] = thisdf.estimate[thisdf.coef == 'shape'].values[0]
-                method.dur_use['par2'] = thisdf.estimate[thisdf.coef == 'scale'].values[0]
+                dur_use['dist'] = dist
+                dur_use['par1'] = thisdf.estimate[thisdf.coef == 'shape'].values[0]
+                dur_use['par2'] = thisdf.estimate[thisdf.coef == 'scale'].values[0]
             elif dist == 'weibull':
-                method.dur_use['dist'] = dist
-                method.dur_use['par1'] = thisdf.estimate[thisdf.coef == 'shape'].values[0]
-                method.dur_use['par2'] = thisdf.estimate[thisdf.coef == 'scale'].values[0]
+                dur_use['dist'] = dist
+                dur_use['par1'] = thisdf.estimate[thisdf.coef == 'shape'].values[0]
+                dur_use['par2'] = thisdf.estimate[thisdf.coef == 'scale'].values[0]
             elif dist == 'exponential':
-                method.dur_use['dist'] = dist
-                method.dur_use['par1'] = thisdf.estimate[thisdf.coef == 'rate'].values[0]
-                method.dur_use['par2'] = None
+                dur_use['dist'] = dist
+                dur_use['par1'] = thisdf.estimate[thisdf.coef == 'rate'].values[0]
+                dur_use['par2'] = None
             else:
                 errormsg = f"Duration of use distribution {dist} not recognized"
                 raise ValueError(errormsg)
+        dur_uses[method.name] = dur_use
 
-    return methods
+    return dur_uses
 
 
+@cached
 def mcpr(location):
 
     mcpr = {}
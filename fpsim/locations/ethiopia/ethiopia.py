@@ -20,7 +20,7 @@ def scalar_pars():
 def filenames():
     """ Data files for use with calibration, etc -- not needed for running a sim """
     files = {}
-    files['base'] = sc.thisdir(aspath=True) / 'data'
+    files['base'] = sc.thisdir(__file__, aspath=True) / 'data'
     files['basic_wb'] = 'basic_wb.yaml' # From World Bank https://data.worldbank.org/indicator/SH.STA.MMRT?locations=ET
     files['popsize'] = 'popsize.csv' # From UN World Population Prospects 2022: https://population.un.org/wpp/Download/Standard/Population/
     files['mcpr'] = 'cpr.csv'  # From UN Population Division Data Portal, married women 1970-1986, all women 1990-2030
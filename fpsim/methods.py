@@ -10,7 +10,6 @@ Idea:
 # %% Imports
 import numpy as np
 import sciris as sc
-import starsim as ss  # TODO add to dependencies
 from . import utils as fpu
 from . import defaults as fpd
 from . import locations as fplocs
@@ -55,7 +54,7 @@ def make_methods():
         idx += 1
 
     method_map = {method.label: method.idx for method in method_list}
-    Methods = ss.ndict(method_list, type=Method)
+    Methods = fpd.ndict(method_list, type=Method)
 
     m = sc.prettyobj()
     m.method_list = sc.dcp(method_list)
@@ -64,6 +63,17 @@ def make_methods():
     return m
 
 
+def choose_inds(probs, n, u=None, inds=None):
+    '''
+    Choose n outcomes with the given probabilities, either from the global random state,
+    or from the uniform draws u (at indices inds) if the sim uses random streams
+    '''
+    if u is None:
+        return fpu.n_multinomial(probs, n)
+    else:
+        return np.minimum(np.searchsorted(np.cumsum(probs), u[inds]), len(probs)-1)
+
+
 
 # %% Define classes to contain information about the way women choose contraception
 
@@ -125,7 +135,7 @@ class ContraceptiveChoice:
     def get_contra_users(self, ppl, year=None, event=None, ti=None, tiperyear=None):
         """ Select contraception users, return boolean array """
         prob_use = self.get_prob_use(ppl, event=event, year=year, ti=ti, tiperyear=tiperyear)
-        uses_contra_bool = fpu.binomial_arr(prob_use)
+        uses_contra_bool = ppl.binomial(prob_use, stream='contra_use')
         return uses_contra_bool
 
     def choose_method(self, ppl, event=None):
@@ -154,7 +164,10 @@ class RandomChoice(ContraceptiveChoice):
         return self.choose_method(ppl)
 
     def choose_method(self, ppl, event=None):
-        choice_arr = np.random.choice(np.arange(1, self.n_methods+1), size=len(ppl), p=self.pars['method_mix'])
+        if ppl.uses_streams:
+            choice_arr = 1 + np.searchsorted(np.cumsum(self.pars['method_mix']), ppl.rand('method_choice'))
+        else:
+            choice_arr = np.random.choice(np.arange(1, self.n_methods+1), size=len(ppl), p=self.pars['method_mix'])
         return choice_arr.astype(int)
 
 
@@ -200,6 +213,7 @@ class SimpleChoice(RandomChoice):
     def init_method_dist(self, ppl):
         if self.init_dist is not None:
             choice_array = np.zeros(len(ppl))
+            u = ppl.rand('init_method') if ppl.uses_streams else None
 
             # Loop over age groups and methods
             for key, (age_low, age_high) in fpd.method_age_map.items():
@@ -209,7 +223,7 @@ class SimpleChoice(RandomChoice):
                     these_probs = self.init_dist[key]
                     these_probs = np.array(these_probs) * self.pars['method_weights']  # Scale by weights
                     these_probs = these_probs/np.sum(these_probs)  # Renormalize
-                    these_choices = fpu.n_multinomial(these_probs, len(ppl_this_age))  # Choose
+                    these_choices = choose_inds(these_probs, len(ppl_this_age), u, ppl_this_age)  # Choose
                     # Adjust method indexing to correspond to datafile (removing None: Marita to confirm)
                     choice_array[this_age_bools] = np.array(list(self.init_dist.method_idx))[these_choices]
             return choice_array.astype(int)
@@ -295,6 +309,7 @@ class SimpleChoice(RandomChoice):
 
         dur_method = np.zeros(len(ppl), dtype=float)
         if method_used is None: method_used = ppl.method
+        u = ppl.rand('method_dur') if ppl.uses_streams else None  # Quantiles to sample at, if using random streams
 
         for mname, method in self.methods.items():
             dur_use = method.dur_use
@@ -323,7 +338,10 @@ class SimpleChoice(RandomChoice):
                         dist_dict = dict(dist=dur_use['dist'], par1=par1, par2=par2)
 
                     # Draw samples of how many months women use this method
-                    dur_method[users] = fpu.sample(**dist_dict, size=n_users)
+                    if u is None:
+                        dur_method[users] = fpu.sample(**dist_dict, size=n_users)
+                    else:
+                        dur_method[users] = fpu.sample_quantiles(u[users], **dist_dict)
 
                 elif sc.isnumber(dur_use):
                     dur_method[users] = dur_use
@@ -345,6 +363,7 @@ class SimpleChoice(RandomChoice):
             # Initialize arrays and get parameters
             jitter_dist = dict(dist='normal_pos', par1=jitter, par2=jitter)
             choice_array = np.zeros(len(ppl))
+            u = ppl.rand('method_choice') if ppl.uses_streams else None
 
             # Loop over age groups and methods
             for key, (age_low, age_high) in fpd.method_age_map.items():
@@ -366,10 +385,10 @@ class SimpleChoice(RandomChoice):
                             except:
                                 errormsg = f'Cannot find {key} in method switch for {mname}!'
                                 raise ValueError(errormsg)
-                            these_probs = [p if p > 0 else p+fpu.sample(**jitter_dist)[0] for p in these_probs]  # No 0s
+                            these_probs = [p if p > 0 else p+(fpu.sample(**jitter_dist)[0] if u is None else jitter) for p in these_probs]  # No 0s; without a global draw if using streams
                             these_probs = np.array(these_probs) * self.pars['method_weights']  # Scale by weights
                             these_probs = these_probs/sum(these_probs)  # Renormalize
-                            these_choices = fpu.n_multinomial(these_probs, len(switch_iinds))  # Choose
+                            these_choices = choose_inds(these_probs, len(switch_iinds), u, switch_iinds)  # Choose
 
                             # Adjust method indexing to correspond to datafile (removing None: Marita to confirm)
                             choice_array[switch_iinds] = np.array(list(mcp.method_idx))[these_choices]
@@ -380,6 +399,7 @@ class SimpleChoice(RandomChoice):
         mcp = self.method_choice_pars[1]
         jitter_dist = dict(dist='normal_pos', par1=jitter, par2=jitter)
         choice_array = np.zeros(len(ppl))
+        u = ppl.rand('method_choice') if ppl.uses_streams else None
 
         # Loop over age groups and methods
         for key, (age_low, age_high) in fpd.method_age_map.items():
@@ -388,10 +408,10 @@ class SimpleChoice(RandomChoice):
 
             if len(switch_iinds):
                 these_probs = mcp[key]
-                these_probs = [p if p > 0 else p+fpu.sample(**jitter_dist)[0] for p in these_probs]  # No 0s
+                these_probs = [p if p > 0 else p+(fpu.sample(**jitter_dist)[0] if u is None else jitter) for p in these_probs]  # No 0s; without a global draw if using streams
                 these_probs = np.array(these_probs) * self.pars['method_weights']  # Scale by weights
                 these_probs = these_probs/sum(these_probs)  # Renormalize
-                these_choices = fpu.n_multinomial(these_probs, len(switch_iinds))  # Choose
+                these_choices = choose_inds(these_probs, len(switch_iinds), u, switch_iinds)  # Choose
                 choice_array[switch_iinds] = np.array(list(mcp.method_idx))[these_choices]
 
         return choice_array
@@ -43,8 +43,8 @@ class Pars(dict):
         return sc.odict.__repr__(self, quote='', numsep='.', classname='fp.Parameters()', *args, **kwargs)
 
     def copy(self):
-        ''' Shortcut for deep copying '''
-        return sc.dcp(self)
+        ''' Shortcut for deep copying (read-only arrays are shared) '''
+        return fpu.dcp(self)
 
     def to_dict(self):
         ''' Return parameters as a new dictionary '''
@@ -183,6 +183,12 @@ default_pars = {
     'timestep':             1,      # The simulation timestep in months
     'seed':                 1,      # Random seed
     'verbose':              1,      # How much detail to print during the simulation
+    'step_mode':            'python', # How to update people each timestep: 'python' (reference), 'compiled', or 'parallel' (compiled and multithreaded); about 1.3-1.7x faster than 'python' in practice, see fpsim.kernels
+    'rng':                  'global', # Source of random numbers for agent events: 'global' (numpy/numba global state) or 'streams' (per-agent counter-based streams; see fpsim.rng)
+    'female_only':          False,  # Whether to simulate only female agents, with males counted by age in aggregate (see fpsim.demographics.AgeSexCounts)
+    'longitude':            None,   # States whose history People.get_longitudinal_state() can look up: a list of keys, or a dict of keys to a depth in timesteps (or to a dict with depth and dtype); defaults to fpd.longitude_keys for one year
+    'event_log':            False,  # Whether to store the ages at births, stillbirths, miscarriages and abortions as a list of events rather than as matrices (see fpsim.events)
+    'retire_age':           None,   # If set, move agents who reach this age (at least age_limit_fecundity) out of the agent arrays once a year, and count them by age in aggregate instead
 
     # Settings - what aspects are being modeled - TODO, remove
     'use_partnership':      0,      #
@@ -286,7 +292,8 @@ def pars(location=None, validate=True, die=True, update=True, **kwargs):
     location = fpd.get_location(location)  # Handle location
 
     # Initialize parameter dict, which will be updated with location data
-    pars = sc.mergedicts(default_pars, kwargs, _copy=True)  # Merge all pars with kwargs and copy
+    kwargs = fpu.dcp(kwargs) # Copy, but share read-only arrays (e.g. location data from another sim)
+    pars = sc.mergedicts(sc.dcp(default_pars), kwargs)  # Merge all pars with kwargs
 
     # Pull out values needed for the location-specific make_pars functions
     loc_kwargs = dict(seed=pars['seed'])
@@ -308,7 +315,7 @@ def pars(location=None, validate=True, die=True, update=True, **kwargs):
     #     location_pars = getattr(fplocs.ethiopia.regions, location).make_pars(**loc_kwargs)
 
     # Merge again, so that we ensure the user-defined values overwrite any location defaults
-    pars = sc.mergedicts(pars, kwargs, _copy=True)
+    pars = sc.mergedicts(pars, kwargs)
 
     # Convert to the class
     pars = Pars(pars)
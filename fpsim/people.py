@@ -10,20 +10,272 @@ from . import utils as fpu
 from . import defaults as fpd
 from . import base as fpb
 from . import demographics as fpdmg
+from . import kernels as fpk
+from . import events as fpev
 
 # Specify all externally visible things this file defines
-__all__ = ['People']
+__all__ = ['People', 'ActiveSets', 'LongitudinalBuffer']
 
 
 # %% Define classes
 
+class ActiveSets(sc.prettyobj):
+    """
+    Membership masks for the subsets of agents that People.step() operates on.
+    Each set includes the conditions of the ones before it, i.e. "female" means
+    alive and female, and "fecund" means alive, female and younger than the
+    fecundity age limit; "pregnant" and "postpartum" are restricted to the living.
+
+    The masks are only updated for the rows touched by an event (see
+    People.__setattr__), and only those masks that depend on the state written;
+    the index arrays are cached until membership of that set actually changes, so
+    most timesteps reuse them as-is. Ageing, which touches every living agent, is
+    handled separately (see aged()): fecund agents are kept in a queue from oldest
+    to youngest, so that each timestep only the agents crossing the age limit are
+    looked at.
+    """
+    keys = ['alive', 'female', 'fecund', 'pregnant', 'postpartum']
+    states = {'alive', 'sex', 'age', 'pregnant', 'postpartum'}  # States that can change membership
+    depends = {  # The sets whose membership depends on each state
+        'alive':      keys,
+        'sex':        ['female', 'fecund'],
+        'age':        ['fecund'],
+        'pregnant':   ['pregnant'],
+        'postpartum': ['postpartum'],
+    }
+
+    def __init__(self, people):
+        self.resync(people)
+        return
+
+    @staticmethod
+    def _compute(arrs, limit, keys, inds=None):
+        """ Compute some of the masks from the raw state arrays, optionally for a subset of rows """
+        get = (lambda k: arrs[k]) if inds is None else (lambda k: arrs[k][inds])
+        alive = get('alive').astype(bool)
+        masks = dict(alive=alive)
+        if 'female' in keys or 'fecund' in keys:
+            masks['female'] = alive & (get('sex') == 0)
+        if 'fecund' in keys:
+            masks['fecund'] = masks['female'] & (get('age') < limit)
+        if 'pregnant' in keys:
+            masks['pregnant'] = alive & get('pregnant').astype(bool)
+        if 'postpartum' in keys:
+            masks['postpartum'] = alive & get('postpartum').astype(bool)
+        return {key: masks[key] for key in keys}
+
+    def resync(self, people):
+        """ Rebuild all masks from scratch, e.g. after a change of the fecundity age limit """
+        self.limit = people.pars['age_limit_fecundity']
+        self.masks = self._compute(people.__dict__, self.limit, self.keys)
+        self._inds = dict.fromkeys(self.keys)
+        self._queue = None  # Rebuilt on the next call to aged()
+        return
+
+    def update(self, people, inds, attr):
+        """ Update the masks that depend on attr for the given rows, invalidating only the sets whose membership changed """
+        if inds is None:
+            return self.resync(people)
+        if not len(inds):
+            return
+        keys = self.depends[attr]
+        if attr == 'age':
+            self._queue = None  # Ages may have changed out of order
+        new = self._compute(people.__dict__, self.limit, keys, inds=inds)
+        for key in keys:
+            mask = self.masks[key]
+            if not np.array_equal(mask[inds], new[key]):
+                if key == 'fecund' and (new[key] & ~mask[inds]).any():
+                    self._queue = None  # Agents joined the set other than by being born, so the queue may be out of order
+                mask[inds] = new[key]
+                self._inds[key] = None
+        return
+
+    def refresh(self, people, attrs):
+        """
+        Update the masks after some states were written in place, e.g. by a compiled
+        kernel, looking only at the rows whose membership actually changed. Each of
+        attrs must be 'alive', 'pregnant' or 'postpartum', the states that define
+        the set of the same name.
+        """
+        if self.limit != people.pars['age_limit_fecundity']:
+            return self.resync(people)
+        for attr in attrs:
+            new = self._compute(people.__dict__, self.limit, [attr])[attr]
+            self.update(people, np.nonzero(new != self.masks[attr])[0], attr)
+        return
+
+    def aged(self, people):
+        """
+        Update the fecund set after every living agent has aged by the same amount. Since
+        this keeps the fecund agents in the same order of age, only the oldest, at the
+        front of the queue, can have reached the age limit.
+        """
+        if self.limit != people.pars['age_limit_fecundity']:
+            return self.resync(people)
+        if self._queue is None:
+            inds = self.inds('fecund')
+            order = np.argsort(-people.age[inds], kind='stable')
+            self._queue = inds[order]
+            self._qstart, self._qstop = 0, len(inds)
+        mask, age, queue = self.masks['fecund'], people.age, self._queue
+        start = self._qstart
+        while start < self._qstop:
+            i = queue[start]
+            if mask[i]: # Agents who have left the set another way, e.g. by dying, are just dropped from the queue
+                if age[i] < self.limit:
+                    break
+                mask[i] = False
+                self._inds['fecund'] = None
+            start += 1
+        self._qstart = start
+        return
+
+    def append(self, other, ages):
+        """ Extend the masks with those of newly created people, given the ages of everyone """
+        n = len(self.masks['alive'])
+        for key in self.keys:
+            self.masks[key] = np.concatenate([self.masks[key], other.masks[key]])
+            if self._inds[key] is not None and other.masks[key].any():
+                self._inds[key] = None
+        new = n + other.masks['fecund'].nonzero()[0]
+        if self._queue is not None and len(new):
+            order = np.argsort(-ages[new], kind='stable')
+            new = new[order]
+            if self._qstop > self._qstart and ages[new[0]] > ages[self._queue[self._qstop-1]]:
+                self._queue = None  # Not younger than everyone in the queue, e.g. not newborns, so rebuild it
+            else:
+                self._extend_queue(new)
+        return
+
+    def _extend_queue(self, new):
+        """ Add agents to the back of the queue, compacting or growing its array as needed """
+        m = len(new)
+        if self._qstop + m > len(self._queue):
+            n = self._qstop - self._qstart
+            queue = np.zeros(max(len(self._queue), 2*(n + m)), dtype=self._queue.dtype)
+            queue[:n] = self._queue[self._qstart:self._qstop]
+            self._queue, self._qstart, self._qstop = queue, 0, n
+        self._queue[self._qstop:self._qstop+m] = new
+        self._qstop += m
+        return
+
+    def inds(self, key):
+        """ Sorted indices of the agents currently in a set """
+        if self._inds[key] is None:
+            self._inds[key] = self.masks[key].nonzero()[0]
+        return self._inds[key]
+
+    def count(self, key):
+        """ Number of agents currently in a set """
+        return len(self.inds(key))
+
+
+
+class LongitudinalBuffer(sc.prettyobj):
+    """
+    History of one state over the last few timesteps, for People.get_longitudinal_state().
+    Rather than a copy of the whole state every timestep, this stores the value of each
+    agent as of ``depth`` timesteps ago, plus a log of the changes since then: each
+    timestep, only the rows whose value changed are appended. Changes older than the
+    depth are folded back into the stored values, so the log stays short.
+
+    Args:
+        vals (array): the initial value of each agent
+        depth (int): the maximum lag, in timesteps, that can be looked up
+        dtype (dtype): the type to store the values as; by default, that of vals
+    """
+
+    def __init__(self, vals, depth, dtype=None):
+        self.depth = int(depth)
+        self.base = np.array(vals, dtype=dtype)  # Values as of depth timesteps ago
+        self.last = self.base.copy()  # Most recently recorded values
+        self.row = np.zeros(0, dtype=np.int64)  # Log of changes since then
+        self.ti = np.zeros(0, dtype=np.int32)
+        self.val = np.zeros(0, dtype=self.base.dtype)
+        self.start = 0  # The log entries in use are start:stop
+        self.stop = 0
+        return
+
+    def __len__(self):
+        return len(self.base)
+
+    def __getitem__(self, inds):
+        """ A copy of the buffer for a subset of the agents, e.g. after some are removed """
+        keep = np.zeros(len(self), dtype=bool)
+        keep[inds] = True
+        new = LongitudinalBuffer(self.base[keep], self.depth)
+        new.last = self.last[keep]
+        rows = self.row[self.start:self.stop]
+        used = keep[rows]
+        new._append((np.cumsum(keep) - 1)[rows[used]], self.ti[self.start:self.stop][used], self.val[self.start:self.stop][used])
+        return new
+
+    def _append(self, rows, ti, vals):
+        """ Add entries to the log, compacting or growing its arrays as needed """
+        m = len(rows)
+        if self.stop + m > len(self.row):
+            n = self.stop - self.start
+            capacity = max(len(self.row), 2*(n + m), 64)
+            for key in ['row', 'ti', 'val']:
+                arr = getattr(self, key)
+                new = np.zeros(capacity, dtype=arr.dtype)
+                new[:n] = arr[self.start:self.stop]
+                setattr(self, key, new)
+            self.start, self.stop = 0, n
+        sl = slice(self.stop, self.stop + m)
+        self.row[sl] = rows
+        self.ti[sl] = ti
+        self.val[sl] = vals
+        self.stop += m
+        return
+
+    def extend(self, other):
+        """ Add the agents of another buffer, e.g. for newborns, with the first value of its history """
+        if len(other):
+            new_rows = np.full(len(other), other.base[0], dtype=self.base.dtype)
+            self.base = np.concatenate([self.base, new_rows])
+            self.last = np.concatenate([self.last, new_rows])
+        return
+
+    def record(self, vals, ti):
+        """ Log the agents whose value changed at timestep ti, and fold in changes older than the depth """
+        rows = np.nonzero(vals != self.last)[0]
+        if len(rows):
+            self.last[rows] = vals[rows]
+            self._append(rows, ti, self.last[rows])
+        n_old = np.searchsorted(self.ti[self.start:self.stop], ti - self.depth, side='right')
+        if n_old:
+            sl = slice(self.start, self.start + n_old)
+            self.base[self.row[sl]] = self.val[sl]  # In time order, so the latest change of each row wins
+            self.start += n_old
+        return
+
+    def get(self, ti, lag, inds=None):
+        """ The values recorded at the end of timestep ti - lag, for all agents or the given rows """
+        if not 0 < lag <= self.depth:
+            errormsg = f'Lag must be between 1 and the depth of the buffer ({self.depth}), not {lag}'
+            raise ValueError(errormsg)
+        inds = np.arange(len(self)) if inds is None else np.asarray(inds)
+        out = self.base[inds].copy()
+        sl = slice(self.start, self.stop)
+        use = self.ti[sl] <= ti - lag
+        if use.any():
+            pos = np.full(len(self), -1)
+            pos[inds] = np.arange(len(inds))
+            rows = pos[self.row[sl][use]]
+            found = rows >= 0
+            out[rows[found]] = self.val[sl][use][found]
+        return out
+
+
 class People(fpb.BasePeople):
     """
     Class for all the people in the simulation.
     """
 
-    def __init__(self, pars, n=None, age=None, sex=None,
-                 empowerment_module=None, education_module=None, **kwargs):
+    def __init__(self, pars, n=None, age=None, sex=None, uids=None,
+                 empowerment_module=None, education_module=None, streams=None, **kwargs):
 
         # Initialization
         super().__init__(**kwargs)
@@ -43,8 +295,18 @@ class People(fpb.BasePeople):
         for state_name, state in self.states.items():
             self[state_name] = state.new(n)
 
+        # Store reproductive events in a log instead of the matrices of ages, if requested
+        self.events = None
+        if self.pars.get('event_log'):
+            self.events = fpev.EventLog()
+            for key in fpev.matrix_keys:
+                self[key] = np.empty((n, 0), dtype=self.states[key].dtype)
+
         # Overwrite some states with alternative values
-        self.uid = np.arange(n)
+        self.uid = np.arange(n) if uids is None else np.asarray(uids)
+        self.streams = streams  # Counter-based random streams, if used (see fpsim.rng); also used to initialize the people
+        self.ti = None  # The current timestep, set by the sim; draws to initialize the people are keyed on timestep 0
+        self.n_reps = None  # Number of replicates, if the population holds several (see fp.BatchSim)
 
         # Basic demographics
         _age, _sex = self.get_age_sex(n)
@@ -57,7 +319,7 @@ class People(fpb.BasePeople):
         self.urban = self.states['urban'].new(n, _urban)  # Urban (1) or rural (0)
 
         # Parameters on sexual and reproductive history
-        self.fertile = fpu.n_binomial(1 - self.pars['primary_infertility'], n)
+        self.fertile = self.binomial(1 - self.pars['primary_infertility'], stream='fertile')
 
         # Fertility intent
         has_intent = "fertility_intent"
@@ -76,12 +338,14 @@ class People(fpb.BasePeople):
         self.update_wealthquintile(n)
 
         # Default initialization for fated_debut
-        self.fated_debut = self.pars['debut_age']['ages'][fpu.n_multinomial(self.pars['debut_age']['probs'], n)]
+        debut_probs = self.pars['debut_age']['probs']
+        debut_inds = self.choose(debut_probs, 'fated_debut') if self.uses_streams else fpu.n_multinomial(debut_probs, n)
+        self.fated_debut = self.pars['debut_age']['ages'][debut_inds]
 
         # Fecundity variation
         fv = [self.pars['fecundity_var_low'], self.pars['fecundity_var_high']]
         fac = (fv[1] - fv[0]) + fv[0]  # Stretch fecundity by a factor bounded by [f_var[0], f_var[1]]
-        self.personal_fecundity = np.random.random(n) * fac
+        self.personal_fecundity = self.rand('personal_fecundity') * fac
 
         # Initialise ti_contra based on age and fated debut
         self.update_time_to_choose()
@@ -109,20 +373,170 @@ class People(fpb.BasePeople):
         # Store keys
         self._keys = [s.name for s in self.states.values()]
 
+        # Index sets used by step(), maintained incrementally from here on
+        self._active = ActiveSets(self)
+
         return
 
-    def initialize_circular_buffer(self):
-        # Initialize circular buffers to track longitudinal data
-        longitude_keys = fpd.longitude_keys
-        # NOTE: by default the history array/circular buffer is initialised with constant
-        # values. We could potentially initialise the buffer
-        # with the data from a previous simulation.
+    def __setattr__(self, attr, value):
+        """ Set the attribute as usual, and keep the active sets in sync if a tracked state changed """
+        super().__setattr__(attr, value)
+        if attr in ActiveSets.states:
+            active = self.__dict__.get('_active')
+            if active is not None:
+                active.update(self, self.inds, attr)
+        return
+
+    def __add__(self, people2):
+        """ Combine two people arrays, carrying the active sets of the new people across """
+        newpeople = super().__add__(people2)
+        active = newpeople.__dict__.get('_active')
+        if active is not None:
+            active.append(people2._active, newpeople.age)
+        return newpeople
+
+    def active_inds(self, key):
+        """
+        Indices of the agents in one of the incrementally maintained sets: 'alive',
+        'female', 'fecund', 'pregnant' or 'postpartum' (see ActiveSets).
+        """
+        active = self._active
+        if active.limit != self.pars['age_limit_fecundity']:
+            active.resync(self)
+        return active.inds(key)
+
+    def active_view(self, key):
+        """
+        Filtered People object for one of the maintained sets; this avoids rescanning
+        the full arrays every time the set is needed.
+
+        **Example**::
+
+            fecund = sim.people.active_view('fecund')
+            fecund.update_age_bin_totals()
+        """
+        return self.filter(inds=self.active_inds(key))
+
+    def resync_active(self):
+        """ Rebuild the active sets, e.g. after state arrays were modified in place """
+        self._active.resync(self.unfilter())
+        return
+
+    def remove(self, inds):
+        """
+        Remove agents from the arrays entirely, e.g. people who are counted in aggregate
+        instead (see fpsim.demographics.AgeSexCounts). Links between mothers and children are not updated,
+        so this cannot be used when tracking children.
+
+        Args:
+            inds (array): the indices of the agents to remove
+        """
+        if self.inds is not None:
+            errormsg = 'Agents can only be removed from the full People object, not a filtered one'
+            raise ValueError(errormsg)
+        keep = np.ones(len(self), dtype=bool)
+        keep[inds] = False
+        for key in self.keys():
+            val = self[key]
+            if isinstance(val, np.ndarray):
+                self[key] = val[keep]
+            elif isinstance(val, dict):
+                for attr in val.keys():
+                    val[attr] = val[attr][keep]
+            elif isinstance(val, list):
+                self[key] = [v for v, k in zip(val, keep) if k]
+        self.resync_active()
+        return
 
-        for key in longitude_keys:
+    def event_counts(self):
+        """ Copies of the counters of each kind of reproductive event, for log_events() """
+        return {kind: self[spec.counter].copy() for kind, spec in fpev.event_kinds.items()}
+
+    def log_events(self, counts):
+        """
+        Add the reproductive events since event_counts() was called to the event log, by
+        comparing the counters (e.g. parity) with their earlier values. This works the same
+        whichever step_mode updated them.
+        """
+        for kind, spec in fpev.event_kinds.items():
+            diff = self[spec.counter] - counts[kind]
+            inds = np.nonzero(diff > 0)[0]
+            for k in range(1, diff.max(initial=0) + 1): # Twins are two births
+                inds = inds[diff[inds] >= k]
+                self.events.append(self.uid[inds], kind, self.age[inds], self.ti)
+        return
+
+    def event_ages(self, key):
+        """
+        Ages at each live birth, stillbirth, miscarriage or abortion, as a matrix with one
+        row per agent: the state arrays if they are used, otherwise built from the event log.
+        From the log, column k is the agent's (k+1)th event of that kind; note that the
+        stillborn_ages state array is instead indexed by parity at the time of the stillbirth.
+
+        Args:
+            key (str): 'birth_ages', 'stillborn_ages', 'miscarriage_ages' or 'abortion_ages'
+        """
+        if self.events is None:
+            return self[key]
+        kinds = {spec.matrix: kind for kind, spec in fpev.event_kinds.items()}
+        if key not in kinds:
+            errormsg = f'"{key}" is not a matrix of event ages; choices are {sc.strjoin(kinds.keys())}'
+            raise ValueError(errormsg)
+        return self.events.ages(self.uid, kinds[key])
+
+    def count(self, arr=None):
+        """
+        Number of people in the current view, or the sum of arr over them; if the population
+        holds several replicates (see fp.BatchSim), an array with the count for each replicate.
+
+        **Example**::
+
+            n_deaths = died.count()
+            n_women = ppl.count(ppl.is_female)
+        """
+        if not self.n_reps:
+            return len(self) if arr is None else np.sum(arr)
+        return np.bincount(self.rep, weights=arr, minlength=self.n_reps)
+
+    def mean(self, arr):
+        """ Mean of arr over the current view, or of each replicate (see count()) """
+        if not self.n_reps:
+            return np.mean(arr)
+        return self.count(arr) / self.count()
+
+    def initialize_circular_buffer(self):
+        """
+        Initialize the buffers that track the history of the states given by the longitude
+        parameter (see LongitudinalBuffer). By default the history is initialised with
+        a constant value, that of the first agent; it could instead be initialised with
+        data from a previous simulation.
+        """
+        for key, spec in self.longitude_spec().items():
             current = getattr(self, key)  # Current value of this attribute
-            self.longitude[key] = np.full((self.n, self.tiperyear), current[0])
+            vals = np.full(len(current), current[0]) if len(current) else current
+            self.longitude[key] = LongitudinalBuffer(vals, depth=spec['depth'], dtype=spec['dtype'])
         return
 
+    def longitude_spec(self):
+        """
+        The states to track and the depth and dtype of each buffer, from the longitude
+        parameter: a list of keys, or a dict of keys to a depth or to a dict of depth and
+        dtype. By default, the keys in fpd.longitude_keys are tracked for one year.
+        """
+        longitude = self.pars.get('longitude')
+        if longitude is None:
+            longitude = fpd.longitude_keys
+        if not isinstance(longitude, dict):
+            longitude = dict.fromkeys(sc.tolist(longitude))
+        spec = {}
+        for key, val in longitude.items():
+            if key not in self.states:
+                errormsg = f'Cannot track the history of "{key}": it is not a state of People'
+                raise ValueError(errormsg)
+            val = val if isinstance(val, dict) else {'depth': val}
+            spec[key] = dict(depth=val.get('depth') or self.tiperyear, dtype=val.get('dtype'))
+        return spec
+
     @property
     def dt(self):
         return self.pars['timestep'] / fpd.mpy
@@ -131,27 +545,21 @@ class People(fpb.BasePeople):
     def tiperyear(self):
         return self.pars['tiperyear']
 
-    @property
-    def yei(self):
-        """
-        The index of year-ending as of the same date expressed in ti
-        or 12-months ago as of the same date.
-        """
-        return (self.ti + 1) % self.tiperyear
-
-    def get_longitudinal_state(self, state_name):
+    def get_longitudinal_state(self, state_name, lag=None):
         """
         Extract values of one of the longitudinal state/attributes (aka states with history)
 
         Arguments:
             state_name (str): the name of the state or attribute that we are extracting
+            lag (int): how many timesteps back to look, up to the depth of its buffer; by default tiperyear - 1, i.e. the values recorded one year before the end of this timestep
 
         Returns:
-            state_vals (np.arr):  array of the ppl.term values from one year prior to current timestep
+            state_vals (np.arr):  array of the ppl.term values from lag timesteps prior to current timestep
         """
-        # Calculate correct index for data 1 year prior
+        if lag is None:
+            lag = self.tiperyear - 1
         if len(self):
-            state_vals = self['longitude'][state_name][self.inds, self.yei]
+            state_vals = self['longitude'][state_name].get(self.ti, lag, inds=self.inds)
         else:
             state_vals = np.empty((0,))
         return state_vals
@@ -159,7 +567,7 @@ class People(fpb.BasePeople):
     def get_urban(self, n):
         """ Get initial distribution of urban """
         urban_prop = self.pars['urban_prop']
-        urban = fpu.n_binomial(urban_prop, n)
+        urban = self.binomial(urban_prop, stream='urban')
         return urban
 
     def get_age_sex(self, n):
@@ -172,7 +580,7 @@ class People(fpb.BasePeople):
         m_frac = pyramid[:, 1].sum() / pyramid[:, 1:3].sum()
 
         ages = np.zeros(n)
-        sexes = np.random.random(n) < m_frac  # Pick the sex based on the fraction of men vs. women
+        sexes = self.rand('sex') < m_frac  # Pick the sex based on the fraction of men vs. women
         f_inds = sc.findinds(sexes == 0)
         m_inds = sc.findinds(sexes == 1)
 
@@ -183,9 +591,13 @@ class People(fpb.BasePeople):
             if len(inds):
                 age_data_prob = pyramid[:, i + 1]
                 age_data_prob = age_data_prob / age_data_prob.sum()  # Ensure it sums to 1
-                age_bins = fpu.n_multinomial(age_data_prob, len(inds))  # Choose age bins
-                ages[inds] = age_data_min[age_bins] + age_data_range[age_bins] * np.random.random(
-                    len(inds))  # Uniformly distribute within this age bin
+                if self.uses_streams:
+                    age_bins = self.choose(age_data_prob, 'age_bin', inds)
+                    u = self.rand('age')[inds]
+                else:
+                    age_bins = fpu.n_multinomial(age_data_prob, len(inds))  # Choose age bins
+                    u = np.random.random(len(inds))
+                ages[inds] = age_data_min[age_bins] + age_data_range[age_bins] * u  # Uniformly distribute within this age bin
 
         return ages, sexes
 
@@ -205,7 +617,10 @@ class People(fpb.BasePeople):
         if self.pars['wealth_quintile'] is None:
             return
         wq_probs = self.pars['wealth_quintile']['percent']
-        vals = np.random.choice(len(wq_probs), size=n, p=wq_probs)+1
+        if self.uses_streams:
+            vals = self.choose(wq_probs, 'wealthquintile') + 1
+        else:
+            vals = np.random.choice(len(wq_probs), size=n, p=wq_probs)+1
         self.wealthquintile = vals
         return
 
@@ -269,7 +684,10 @@ class People(fpb.BasePeople):
             aged_x_inds = f_inds[age_inds == age]
             fi_cats = list(intent_pars[age].keys())  # all ages have the same intent categories
             probs = np.array(list(intent_pars[age].values()))
-            ci = np.random.choice(fi_cats, aged_x_inds.size, p=probs)
+            if self.uses_streams:
+                ci = np.array(fi_cats)[self.choose(probs, 'fertility_intent', aged_x_inds)]
+            else:
+                ci = np.random.choice(fi_cats, aged_x_inds.size, p=probs)
             self.categorical_intent[aged_x_inds] = ci
 
         self.fertility_intent[sc.findinds(self.categorical_intent == "yes")] = True
@@ -293,7 +711,10 @@ class People(fpb.BasePeople):
         for age in intent_pars.keys():
             f_aged_x_inds = f_inds[age_inds == age]  # indices of women of a given age
             prob = intent_pars[age][1]  # Get the probability of having intent
-            self.intent_to_use[f_aged_x_inds] = fpu.n_binomial(prob, len(f_aged_x_inds))
+            if self.uses_streams:
+                self.intent_to_use[f_aged_x_inds] = self.rand('intent_to_use')[f_aged_x_inds] < prob
+            else:
+                self.intent_to_use[f_aged_x_inds] = fpu.n_binomial(prob, len(f_aged_x_inds))
         return
 
     def update_method(self, year=None, ti=None):
@@ -321,10 +742,10 @@ class People(fpb.BasePeople):
 
                     if len(must_use):
                         must_use.on_contra = True
-                        pp0.step_results['contra_access'] += len(must_use)
+                        pp0.step_results['contra_access'] += must_use.count()
                         must_use.method = cm.choose_method(must_use)
                         must_use.ever_used_contra = 1
-                        pp0.step_results['new_users'] += np.count_nonzero(must_use.method)
+                        pp0.step_results['new_users'] += must_use.count(must_use.method != 0)
 
                 else:
                     choosers = pp0
@@ -338,12 +759,12 @@ class People(fpb.BasePeople):
                     # Divide people into those that keep using contraception vs those that stop
                     continuing_contra = choosers.filter(choosers.on_contra)
                     stopping_contra = choosers.filter(~choosers.on_contra)
-                    pp0.step_results['contra_access'] += len(continuing_contra)
+                    pp0.step_results['contra_access'] += continuing_contra.count()
 
                     # For those who keep using, choose their next method
                     if len(continuing_contra):
                         continuing_contra.method = cm.choose_method(continuing_contra)
-                        choosers.step_results['new_users'] += np.count_nonzero(continuing_contra.method)
+                        choosers.step_results['new_users'] += continuing_contra.count(continuing_contra.method != 0)
 
                     # For those who stop using, set method to zero
                     if len(stopping_contra):
@@ -368,7 +789,7 @@ class People(fpb.BasePeople):
                     pp.on_contra = cm.get_contra_users(pp, year=year, event=event, ti=ti, tiperyear=self.pars['tiperyear'])
                     on_contra = pp.filter(pp.on_contra)
                     off_contra = pp.filter(~pp.on_contra)
-                    pp.step_results['contra_access'] += len(on_contra)
+                    pp.step_results['contra_access'] += on_contra.count()
 
                     # Set method for those who use contraception
                     if len(on_contra):
@@ -410,8 +831,8 @@ class People(fpb.BasePeople):
         f_mort_prob = fpu.annprob2ts(f_spline[f_ages], timestep)
         m_mort_prob = fpu.annprob2ts(m_spline[m_ages], timestep)
 
-        f_died = female.binomial(f_mort_prob, as_filter=True)
-        m_died = male.binomial(m_mort_prob, as_filter=True)
+        f_died = female.binomial(f_mort_prob, as_filter=True, stream='death')
+        m_died = male.binomial(m_mort_prob, as_filter=True, stream='death')
         for died in [f_died, m_died]:
             died.alive = False,
             died.pregnant = False,
@@ -421,7 +842,7 @@ class People(fpb.BasePeople):
             died.postpartum = False,
             died.lam = False,
             died.breastfeed_dur = 0,
-            self.step_results['deaths'] += len(died)
+            self.step_results['deaths'] += died.count()
 
         return
 
@@ -460,12 +881,12 @@ class People(fpb.BasePeople):
             probs_pp = self.pars['sexual_activity_pp']['percent_active'][pp.postpartum_dur]
             # Adjust the probability: check the overall probability with print(pref['preference'][spacing_bins].mean())
             probs_pp *= pref['preference'][spacing_bins]
-            pp.sexually_active = fpu.binomial_arr(probs_pp)
+            pp.sexually_active = pp.binomial(probs_pp, stream='sexual_activity')
 
         # Set non-postpartum probabilities
         if len(non_pp):
             probs_non_pp = self.pars['sexual_activity'][non_pp.int_age]
-            non_pp.sexually_active = fpu.binomial_arr(probs_non_pp)
+            non_pp.sexually_active = non_pp.binomial(probs_non_pp, stream='sexual_activity')
 
             # Set debut to True if sexually active for the first time
             # Record agent age at sexual debut in their memory
@@ -521,23 +942,25 @@ class People(fpb.BasePeople):
         preg_probs *= pars['exposure_parity'][np.minimum(all_ppl.parity, fpd.max_parity)]
 
         # Use a single binomial trial to check for conception successes this month
-        conceived = active.binomial(preg_probs[active.inds], as_filter=True)
-        self.step_results['pregnancies'] += len(conceived)  # track all pregnancies
+        conceived = active.binomial(preg_probs[active.inds], as_filter=True, stream='conception')
+        self.step_results['pregnancies'] += conceived.count()  # track all pregnancies
         unintended = conceived.filter(conceived.method != 0)
-        self.step_results['method_failures'] += len(unintended)  # unintended pregnancies due to method failure
+        self.step_results['method_failures'] += unintended.count()  # unintended pregnancies due to method failure
 
         # Check for abortion
-        is_abort = conceived.binomial(pars['abortion_prob'])
+        is_abort = conceived.binomial(pars['abortion_prob'], stream='abortion')
         abort = conceived.filter(is_abort)
         preg = conceived.filter(~is_abort)
 
         # Update states
         n_aborts = len(abort)
-        self.step_results['abortions'] = n_aborts
+        self.step_results['abortions'] = abort.count()
         if n_aborts:
-            all_ppl = self.unfilter()
-            for cum_aborts in np.unique(abort.abortion):
-                all_ppl.abortion_ages[abort.inds, cum_aborts] = abort.age
+            if self.events is None:
+                all_ppl = self.unfilter()
+                for cum_aborts in np.unique(abort.abortion):
+                    inds = abort.inds[abort.abortion == cum_aborts]
+                    all_ppl.abortion_ages[inds, cum_aborts] = all_ppl.age[inds]
             abort.postpartum = False
             abort.abortion += 1  # Add 1 to number of abortions agent has had
             abort.postpartum_dur = 0
@@ -554,7 +977,10 @@ class People(fpb.BasePeople):
         pregdur = [self.pars['preg_dur_low'], self.pars['preg_dur_high']]
         self.pregnant = True
         self.gestation = 1  # Start the counter at 1
-        self.preg_dur = np.random.randint(pregdur[0], pregdur[1] + 1, size=len(self))  # Duration of this pregnancy
+        if self.uses_streams:
+            self.preg_dur = pregdur[0] + np.floor(self.rand('preg_dur') * (pregdur[1] + 1 - pregdur[0])).astype(int)
+        else:
+            self.preg_dur = np.random.randint(pregdur[0], pregdur[1] + 1, size=len(self))  # Duration of this pregnancy
         self.postpartum = False
         self.postpartum_dur = 0
         self.reset_breastfeeding()  # Stop lactating if becoming pregnant
@@ -570,7 +996,7 @@ class People(fpb.BasePeople):
         max_lam_dur = self.pars['max_lam_dur']
         lam_candidates = self.filter((self.postpartum) * (self.postpartum_dur <= max_lam_dur))
         probs = self.pars['lactational_amenorrhea']['rate'][lam_candidates.postpartum_dur]
-        lam_candidates.lam = lam_candidates.binomial(probs)
+        lam_candidates.lam = lam_candidates.binomial(probs, stream='lam')
 
         not_postpartum = self.postpartum == 0
         over5mo = self.postpartum_dur > max_lam_dur
@@ -590,7 +1016,10 @@ class People(fpb.BasePeople):
         mean, sd = self.pars['breastfeeding_dur_mean'], self.pars['breastfeeding_dur_sd']
         a, b = 0, 50 # Truncate at 0 to ensure positive durations
         a_std, b_std = (a - mean) / sd, (b - mean) / sd
-        breastfeed_durs = truncnorm.rvs(a_std, b_std, loc=mean, scale=sd, size=len(self))
+        if self.uses_streams:
+            breastfeed_durs = truncnorm.ppf(self.rand('breastfeeding'), a_std, b_std, loc=mean, scale=sd)
+        else:
+            breastfeed_durs = truncnorm.rvs(a_std, b_std, loc=mean, scale=sd, size=len(self))
         breastfeed_durs = np.ceil(breastfeed_durs)
         breastfeed_finished_inds = self.breastfeed_dur >= breastfeed_durs
         breastfeed_finished = self.filter(breastfeed_finished_inds)
@@ -614,7 +1043,7 @@ class People(fpb.BasePeople):
         postpart = self.filter(self.postpartum)
         for key, (pp_low, pp_high) in fpd.postpartum_map.items():
             this_pp_bin = postpart.filter((postpart.postpartum_dur >= pp_low) * (postpart.postpartum_dur < pp_high))
-            self.step_results[key] += len(this_pp_bin)
+            self.step_results[key] += this_pp_bin.count()
         postpart.postpartum_dur += self.pars['timestep']
 
         return
@@ -628,16 +1057,18 @@ class People(fpb.BasePeople):
         # Check for miscarriage at the end of the first trimester
         end_first_tri = preg.filter(preg.gestation == self.pars['end_first_tri'])
         miscarriage_probs = self.pars['miscarriage_rates'][end_first_tri.int_age_clip]
-        miscarriage = end_first_tri.binomial(miscarriage_probs, as_filter=True)
+        miscarriage = end_first_tri.binomial(miscarriage_probs, as_filter=True, stream='miscarriage')
 
         # Reset states and track miscarriages
         n_miscarriages = len(miscarriage)
-        self.step_results['miscarriages'] = n_miscarriages
+        self.step_results['miscarriages'] = miscarriage.count()
 
         if n_miscarriages:
-            all_ppl = self.unfilter()
-            for cum_miscarriages in np.unique(miscarriage.miscarriage):
-                all_ppl.miscarriage_ages[miscarriage.inds, cum_miscarriages] = miscarriage.age
+            if self.events is None:
+                all_ppl = self.unfilter()
+                for cum_miscarriages in np.unique(miscarriage.miscarriage):
+                    inds = miscarriage.inds[miscarriage.miscarriage == cum_miscarriages]
+                    all_ppl.miscarriage_ages[inds, cum_miscarriages] = all_ppl.age[inds]
             miscarriage.pregnant = False
             miscarriage.miscarriage += 1  # Add 1 to number of miscarriages agent has had
             miscarriage.postpartum = False
@@ -660,11 +1091,11 @@ class People(fpb.BasePeople):
         Check for probability of maternal mortality
         """
         prob = self.pars['mortality_probs']['maternal'] * self.pars['maternal_mortality_factor']
-        is_death = self.binomial(prob)
+        is_death = self.binomial(prob, stream='maternal_death')
         death = self.filter(is_death)
         death.alive = False
-        self.step_results['maternal_deaths'] += len(death)
-        self.step_results['deaths'] += len(death)
+        self.step_results['maternal_deaths'] += death.count()
+        self.step_results['deaths'] += death.count()
         return death
 
     def check_infant_mortality(self):
@@ -675,9 +1106,9 @@ class People(fpb.BasePeople):
         if len(self) > 0:
             age_inds = sc.findnearest(self.pars['infant_mortality']['ages'], self.age)
             death_prob = death_prob * (self.pars['infant_mortality']['age_probs'][age_inds])
-        is_death = self.binomial(death_prob)
+        is_death = self.binomial(death_prob, stream='infant_death')
         death = self.filter(is_death)
-        self.step_results['infant_deaths'] += len(death)
+        self.step_results['infant_deaths'] += death.count()
         death.reset_breastfeeding()
         death.ti_contra = self.ti + 1  # Trigger update to contraceptive choices following infant death
         return death
@@ -708,62 +1139,54 @@ class People(fpb.BasePeople):
             age_ind[prev_idx_is_less] -= 1  # adjusting for quirks of np.searchsorted
             still_prob = still_prob * (self.pars['stillbirth_rate']['age_probs'][age_ind]) if len(self) > 0 else 0
 
-            is_stillborn = deliv.binomial(still_prob)
+            is_stillborn = deliv.binomial(still_prob, stream='stillbirth')
             stillborn = deliv.filter(is_stillborn)
             stillborn.stillbirth += 1  # Track how many stillbirths an agent has had
             stillborn.lactating = False  # Set agents of stillbith to not lactate
-            self.step_results['stillbirths'] = len(stillborn)
+            self.step_results['stillbirths'] = stillborn.count()
 
             live = deliv.filter(~is_stillborn)
 
             # Increment parity for live births
-            is_twin = live.binomial(self.pars['twins_prob'])
+            is_twin = live.binomial(self.pars['twins_prob'], stream='twins')
             twin = live.filter(is_twin) # Handle twins
-            self.step_results['births'] += 2 * len(twin)  # only add births to population if born alive
+            self.step_results['births'] += 2 * twin.count()  # only add births to population if born alive
             single = live.filter(~is_twin)  # Handle singles
-            self.step_results['births'] += len(single)
+            self.step_results['births'] += single.count()
 
-            # Record ages of agents when live births / stillbirths occur
+            # Record ages of agents when live births / stillbirths occur; with an event log, these are logged by the sim
             all_ppl = self.unfilter()
-            for parity in np.unique(single.parity):
-                inds = single.inds[single.parity == parity]
-                all_ppl.birth_ages[inds, parity] = all_ppl.age[inds]
-                if parity == 0: all_ppl.first_birth_age[inds] = all_ppl.age[inds]
-            for parity in np.unique(twin.parity):
-                inds = twin.inds[twin.parity == parity]
-                all_ppl.birth_ages[inds, parity] = all_ppl.age[inds]
-                all_ppl.birth_ages[inds, parity+1] = all_ppl.age[inds]  # Record twin birth
-                if parity == 0: all_ppl.first_birth_age[inds] = all_ppl.age[inds]
-            for parity in np.unique(stillborn.parity):
-                inds = stillborn.inds[stillborn.parity == parity]
-                all_ppl.stillborn_ages[inds, parity] = all_ppl.age[inds]
+            first = live.filter(live.parity == 0)
+            first.first_birth_age = first.age
+            if self.events is None:
+                for parity in np.unique(single.parity):
+                    inds = single.inds[single.parity == parity]
+                    all_ppl.birth_ages[inds, parity] = all_ppl.age[inds]
+                for parity in np.unique(twin.parity):
+                    inds = twin.inds[twin.parity == parity]
+                    all_ppl.birth_ages[inds, parity] = all_ppl.age[inds]
+                    all_ppl.birth_ages[inds, parity+1] = all_ppl.age[inds]  # Record twin birth
+                for parity in np.unique(stillborn.parity):
+                    inds = stillborn.inds[stillborn.parity == parity]
+                    all_ppl.stillborn_ages[inds, parity] = all_ppl.age[inds]
 
             single.parity += 1
             twin.parity += 2  # Add 2 because matching DHS "total children ever born (alive) v201"
 
-            # Calculate short intervals
-            prev_birth_single = single.filter(single.parity > 1)
-            prev_birth_twins = twin.filter(twin.parity > 2)
-            if len(prev_birth_single):
-                pidx = prev_birth_single.parity - 1
-                all_ints = prev_birth_single.birth_ages[:, pidx] - prev_birth_single.birth_ages[:, pidx-1]
-                latest_ints = np.array([r[~np.isnan(r)][-1] for r in all_ints])
-                short_ints = np.count_nonzero(latest_ints < (self.pars['short_int']/fpd.mpy))
-                self.step_results['short_intervals'] += short_ints
-            if len(prev_birth_twins):
-                pidx = prev_birth_twins.parity - 2
-                all_ints = prev_birth_twins.birth_ages[:, pidx] - prev_birth_twins.birth_ages[:, pidx-1]
-                latest_ints = np.array([r[~np.isnan(r)][-1] for r in all_ints])
-                short_ints = np.count_nonzero(latest_ints < (self.pars['short_int']/fpd.mpy))
-                self.step_results['short_intervals'] += short_ints
+            # Calculate short intervals, from the age at the previous live birth
+            prev_parity = live.parity - 1 - is_twin
+            prev_birth = live.filter((prev_parity > 0) & (prev_parity <= fpd.max_parity))
+            short_ints = prev_birth.count((prev_birth.age - prev_birth.last_birth_age) < (self.pars['short_int']/fpd.mpy))
+            self.step_results['short_intervals'] += short_ints
+            live.last_birth_age = live.age
 
             # Calculate total births
-            self.step_results['total_births'] = len(stillborn) + self.step_results['births']
+            self.step_results['total_births'] = stillborn.count() + self.step_results['births']
 
             live_age = live.age
             for key, (age_low, age_high) in fpd.age_bin_map.items():
                 match_low_high = fpu.match_ages(live_age, age_low, age_high)
-                birth_bins = np.sum(match_low_high)
+                birth_bins = live.count(match_low_high)
                 self.step_results['birth_bins'][key] += birth_bins
 
             # Check mortality
@@ -787,7 +1210,7 @@ class People(fpb.BasePeople):
         """
         for key, (age_low, age_high) in fpd.age_bin_map.items():
             this_age_bin = self.filter((fpu.match_ages(self.age, age_low, age_high)))
-            self.step_results['age_bin_totals'][key] += len(this_age_bin)
+            self.step_results['age_bin_totals'][key] += this_age_bin.count()
         return
 
     def track_mcpr(self):
@@ -802,8 +1225,8 @@ class People(fpb.BasePeople):
         fecund_age = self.age < self.pars['age_limit_fecundity']
         denominator = method_age * fecund_age * self.is_female * (self.alive)
         numerator = np.isin(self.method, modern_methods_num)
-        no_method_mcpr = np.sum((self.method == 0) * denominator)
-        on_method_mcpr = np.sum(numerator * denominator)
+        no_method_mcpr = self.count((self.method == 0) * denominator)
+        on_method_mcpr = self.count(numerator * denominator)
         self.step_results['no_methods_mcpr'] += no_method_mcpr
         self.step_results['on_methods_mcpr'] += on_method_mcpr
 
@@ -819,8 +1242,8 @@ class People(fpb.BasePeople):
         denominator = ((self.pars['method_age'] <= self.age) * (self.age < self.pars['age_limit_fecundity']) * (
                 self.sex == 0) * (self.alive))
         numerator = self.method != 0
-        no_method_cpr = np.sum((self.method == 0) * denominator)
-        on_method_cpr = np.sum(numerator * denominator)
+        no_method_cpr = self.count((self.method == 0) * denominator)
+        on_method_cpr = self.count(numerator * denominator)
         self.step_results['no_methods_cpr'] += no_method_cpr
         self.step_results['on_methods_cpr'] += on_method_cpr
 
@@ -836,8 +1259,8 @@ class People(fpb.BasePeople):
         denominator = ((self.pars['method_age'] <= self.age) * (self.age < self.pars['age_limit_fecundity']) * (
                 self.sex == 0) * (self.pregnant == 0) * (self.sexually_active == 1) * (self.alive))
         numerator = self.method != 0
-        no_method_cpr = np.sum((self.method == 0) * denominator)
-        on_method_cpr = np.sum(numerator * denominator)
+        no_method_cpr = self.count((self.method == 0) * denominator)
+        on_method_cpr = self.count(numerator * denominator)
         self.step_results['no_methods_acpr'] += no_method_cpr
         self.step_results['on_methods_acpr'] += on_method_cpr
 
@@ -913,12 +1336,9 @@ class People(fpb.BasePeople):
         Updates longitudinal params in people object
         """
 
-        # Calculate column index in which to store current vals
-        index = self.ti % self.tiperyear
-
-        # Store the current params in people.longitude object
-        for key in self.longitude.keys():
-            self.longitude[key][:, index] = getattr(self, key)
+        # Log the agents whose values changed this timestep
+        for key, buffer in self.longitude.items():
+            buffer.record(getattr(self, key), self.ti)
 
         return
 
@@ -926,25 +1346,29 @@ class People(fpb.BasePeople):
         """
         Perform all updates to people within a single timestep
         """
+        step_mode = self.pars.get('step_mode', 'python')
+        if step_mode in ['compiled', 'parallel']:
+            return self.step_compiled(parallel=(step_mode == 'parallel'))
+
         self.reset_step_results()  # Allocate an 'empty' dictionary for the outputs of this time step
 
-        alive_start = self.filter(self.alive)
+        # The active sets are kept up to date as states change, so these are cheap views
+        alive_start = self.active_view('alive')
         alive_start.decide_death_outcome()     # Decide if person dies at this t in the simulation
-        alive_check = self.filter(self.alive)  # Reselect live agents after exposure to general mortality
 
         # Update pregnancy with maternal mortality outcome
-        preg = alive_check.filter(alive_check.pregnant)
+        preg = self.active_view('pregnant')  # Live agents after exposure to general mortality who are pregnant
         preg.process_delivery()  # Deliver with birth outcomes if reached pregnancy duration
 
         # Reselect for live agents after exposure to maternal mortality
-        alive_now = self.filter(self.alive)
-        fecund = alive_now.filter((alive_now.sex == 0) * (alive_now.age < alive_now.pars['age_limit_fecundity']))
+        alive_now = self.active_view('alive')
+        fecund = self.active_view('fecund')
 
         nonpreg = fecund.filter(~fecund.pregnant)
         lact = fecund.filter(fecund.lactating)
 
         # Update empowerment states, and empowerment-related states
-        alive_now_f = self.filter(self.is_female & self.alive)
+        alive_now_f = self.active_view('female')
 
         if self.empowerment_module is not None: alive_now_f.step_empowerment()
         if self.education_module is not None: alive_now_f.step_education()
@@ -962,7 +1386,7 @@ class People(fpb.BasePeople):
         # Update methods for those who are eligible
         if len(ready):
             ready.update_method()
-            self.step_results['switchers'] = len(ready)  # Track how many people switch methods (incl on/off)
+            self.step_results['switchers'] = ready.count()  # Track how many people switch methods (incl on/off)
 
         # Make sure that women who are on contraception do not have intent to use contraception
         self.intent_to_use[self.on_contra] = False
@@ -987,6 +1411,96 @@ class People(fpb.BasePeople):
 
         return
 
+    def step_compiled(self, parallel=False):
+        """
+        Equivalent of step() in which the per-agent transitions of the reproductive cycle
+        run in two compiled loops (see fpsim.kernels): one before and one after contraceptive
+        methods are updated, which still happens here via the contraception module.
+
+        Args:
+            parallel (bool): whether to spread the chunks of agents over threads
+        """
+        self.reset_step_results()
+        pars = self.pars
+        d = self.__dict__  # Raw, unfiltered state arrays
+        n = len(self)
+        seed = pars['seed'] or 0
+        timestep = int(pars['timestep'])
+        bins = np.array(list(fpd.age_bin_map.values()), dtype=float)
+        nonpreg = np.zeros(n, dtype=bool)
+        lact = np.zeros(n, dtype=bool)
+        ready = np.zeros(n, dtype=bool)
+
+        # Time-varying probability tables, as used by the reference path
+        mort = pars['mortality_probs']
+        age_mort = pars['age_mortality']
+        still = pars['stillbirth_rate']
+        infant = pars['infant_mortality']
+        pref = pars['spacing_pref']
+        kpars = (timestep, float(pars['age_limit_fecundity']), int(pars['end_first_tri']), int(pars['postpartum_dur']),
+                 pars['short_int']/fpd.mpy, float(pars['twins_prob']),
+                 float(mort['maternal'] * pars['maternal_mortality_factor']), float(pref['interval']), int(pref['n_bins']))
+        tables = (fpu.annprob2ts(age_mort['f_spline'] * mort['gen_trend'], timestep),
+                  fpu.annprob2ts(age_mort['m_spline'] * mort['gen_trend'], timestep),
+                  np.asarray(still['ages'], dtype=float), mort['stillbirth'] * np.asarray(still['age_probs'], dtype=float),
+                  np.asarray(infant['ages'], dtype=float), mort['infant'] * np.asarray(infant['age_probs'], dtype=float),
+                  pars['miscarriage_rates'], pars['sexual_activity'], pars['sexual_activity_pp']['percent_active'],
+                  pref['preference'], bins[:,0], bins[:,1])
+        states = tuple(d[key] for key in ['alive', 'sex', 'age', 'pregnant', 'gestation', 'preg_dur', 'lactating',
+                       'postpartum', 'postpartum_dur', 'lam', 'breastfeed_dur', 'breastfeed_dur_total',
+                       'sexually_active', 'sexual_debut', 'sexual_debut_age', 'fated_debut', 'months_inactive',
+                       'ti_contra', 'parity', 'stillbirth', 'miscarriage', 'first_birth_age', 'last_birth_age', 'partnered',
+                       'partnership_age', 'birth_ages', 'stillborn_ages', 'miscarriage_ages'])
+        stats, birth_bins, age_bin_totals = fpk.step_pre_contra(seed, self.ti, kpars, tables, states,
+                                                                (nonpreg, lact, ready), parallel=parallel)
+        self._active.refresh(self, ['alive', 'pregnant', 'postpartum'])  # The kernels write to the arrays directly
+
+        # Empowerment and education are not part of the compiled loop
+        alive_now_f = self.active_view('female')
+        if self.empowerment_module is not None: alive_now_f.step_empowerment()
+        if self.education_module is not None: alive_now_f.step_education()
+
+        # Update methods for those who are eligible
+        ready = self.filter(inds=ready.nonzero()[0])
+        if len(ready):
+            ready.update_method()
+            self.step_results['switchers'] = len(ready)
+
+        # Make sure that women who are on contraception do not have intent to use contraception
+        self.intent_to_use[self.on_contra] = False
+
+        methods_ok = np.array_equal(self.on_contra.nonzero()[-1], self.method.nonzero()[-1])
+        if not methods_ok:
+            errormsg = 'Agents not using contraception are not the same as agents who are using None method'
+            raise ValueError(errormsg)
+
+        method_eff = np.array([m.efficacy for m in self.contraception_module.methods.values()], dtype=float)
+        kpars = (timestep, int(pars['postpartum_dur']), int(pars['max_lam_dur']), float(pars['LAM_efficacy']),
+                 float(pars['breastfeeding_dur_mean']), float(pars['breastfeeding_dur_sd']), float(pars['exposure_factor']),
+                 float(pars['abortion_prob']), int(pars['preg_dur_low']), int(pars['preg_dur_high']))
+        tables = (pars['lactational_amenorrhea']['rate'], method_eff, pars['age_fecundity'],
+                  pars['fecundity_ratio_nullip'], pars['exposure_age'], pars['exposure_parity'])
+        states = tuple(d[key] for key in ['age', 'pregnant', 'gestation', 'preg_dur', 'lactating', 'postpartum',
+                       'postpartum_dur', 'lam', 'breastfeed_dur', 'breastfeed_dur_total', 'sexually_active', 'fertile',
+                       'personal_fecundity', 'on_contra', 'method', 'parity', 'abortion', 'abortion_ages'])
+        stats += fpk.step_post_contra(seed, self.ti, kpars, tables, states, (nonpreg, lact), parallel=parallel)
+        self._active.refresh(self, ['pregnant', 'postpartum'])  # No deaths after contraception
+
+        # Copy the accumulated results across
+        for key, val in zip(fpk.stat_keys, stats):
+            self.step_results[key] = self.step_results.get(key, 0) + int(val)  # Miscarriages and abortions are not preallocated
+        self.step_results['total_births'] = self.step_results['stillbirths'] + self.step_results['births']
+        for b, key in enumerate(fpd.age_bin_map.keys()):
+            self.step_results['birth_bins'][key] += int(birth_bins[b])
+            self.step_results['age_bin_totals'][key] += int(age_bin_totals[b])
+
+        # Add check for ti contra
+        if (self.ti_contra < 0).any():
+            errormsg = f'Invalid values for ti_contra at timestep {self.ti}'
+            raise ValueError(errormsg)
+
+        return
+
     def step_empowerment(self):
         """
         NOTE: by default this will not be used, but it will be used for analyses run from the kenya_empowerment repo
@@ -1015,9 +1529,11 @@ class People(fpb.BasePeople):
         and update the age_by_group, based on the new age distribution to
         quantify results in the next time step.
         """
-        alive_now = self.filter(self.alive)
+        alive_now = self.active_view('alive')
+        alive_now._active = None  # Everyone alive ages alike, so the sets are updated by aged() rather than row by row
         # Age person at end of timestep after tabulating results
         alive_now.update_age()  # Important to keep this here so birth spacing gets recorded accurately
+        self._active.aged(self)
         return
 
     def get_step_results(self):
@@ -1028,13 +1544,14 @@ class People(fpb.BasePeople):
         age_min = self.age >= fpd.min_age
         age_max = self.age < self.pars['age_limit_fecundity']
 
-        self.step_results['total_women_fecund'] = np.sum(self.is_female * age_min * age_max)
-        self.step_results['urban_women'] = np.sum(self.urban * self.is_female) / np.sum(self.is_female) * 100
-        self.step_results['ever_used_contra'] = np.sum(self.ever_used_contra * self.is_female) / np.sum(self.is_female) * 100
-        self.step_results['parity0to1'] = np.sum((self.parity <= 1) & self.is_female) / np.sum(self.is_female) * 100
-        self.step_results['parity2to3'] = np.sum((self.parity >= 2) & (self.parity <= 3) & self.is_female) / np.sum(self.is_female) * 100
-        self.step_results['parity4to5'] = np.sum((self.parity >= 4) & (self.parity <= 5) & self.is_female) / np.sum(self.is_female) * 100
-        self.step_results['parity6plus'] = np.sum((self.parity >= 6) & self.is_female) / np.sum(self.is_female) * 100
+        self.step_results['n_alive'] = self.count(self.alive)
+        self.step_results['total_women_fecund'] = self.count(self.is_female * age_min * age_max)
+        self.step_results['urban_women'] = self.count(self.urban * self.is_female) / self.count(self.is_female) * 100
+        self.step_results['ever_used_contra'] = self.count(self.ever_used_contra * self.is_female) / self.count(self.is_female) * 100
+        self.step_results['parity0to1'] = self.count((self.parity <= 1) & self.is_female) / self.count(self.is_female) * 100
+        self.step_results['parity2to3'] = self.count((self.parity >= 2) & (self.parity <= 3) & self.is_female) / self.count(self.is_female) * 100
+        self.step_results['parity4to5'] = self.count((self.parity >= 4) & (self.parity <= 5) & self.is_female) / self.count(self.is_female) * 100
+        self.step_results['parity6plus'] = self.count((self.parity >= 6) & self.is_female) / self.count(self.is_female) * 100
 
         # Update wealth and education
         self._step_results_wq()
@@ -1050,7 +1567,7 @@ class People(fpb.BasePeople):
     def _step_results_wq(self):
         """" Calculate step results on wealthquintile """
         for i in range(1, 6):
-            self.step_results[f'wq{i}'] = (np.sum((self.wealthquintile == i) & self.is_female) / np.sum(self.is_female) * 100)
+            self.step_results[f'wq{i}'] = (self.count((self.wealthquintile == i) & self.is_female) / self.count(self.is_female) * 100)
         return
 
     @staticmethod
@@ -1060,8 +1577,9 @@ class People(fpb.BasePeople):
 
     def _step_results_edu(self):
         denom = self.is_female & self.alive & (self.age >= fpd.min_age) & (self.age < fpd.max_age)
-        self.step_results['edu_objective'] = np.mean(self.filter(denom).edu_objective)
-        self.step_results['edu_attainment'] = np.mean(self.filter(denom).edu_attainment)
+        women = self.filter(denom)
+        self.step_results['edu_objective'] = women.mean(women.edu_objective)
+        self.step_results['edu_attainment'] = women.mean(women.edu_attainment)
 
     def _step_results_empower(self):
         self.step_results['paid_employment'] = (np.sum(self.paid_employment & self.is_female & self.alive  & (self.age>=fpd.min_age) & (self.age<fpd.max_age))/ np.sum(self.is_female & self.alive  & (self.age>=fpd.min_age) & (self.age<fpd.max_age)))*100
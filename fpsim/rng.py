@@ -0,0 +1,163 @@
+'''
+Counter-based random number streams.
+
+By default FPsim draws from the global numpy and numba random states, so any change
+in the order or number of draws (an extra intervention, a different filter, another
+agent being born) shifts every random number that follows. With ``rng='streams'``,
+the draws for agent events instead come from named streams keyed on
+(seed, stream name, timestep), and each agent's draw is a hash of that key and her uid. An
+agent then receives the same random numbers for the same event regardless of what
+else happens in the sim, which gives common random numbers across scenarios and
+results that do not depend on how the work is split up.
+'''
+
+import zlib
+import numpy as np
+import sciris as sc
+from . import utils as fpu
+
+
+__all__ = ['Streams', 'ReplicateStreams']
+
+
+golden = np.uint64(0x9E3779B97F4A7C15)
+
+
+def splitmix(x):
+    ''' Scramble 64-bit integers (SplitMix64 finalizer); a vectorized version of kernels.splitmix() '''
+    x = np.asarray(x, dtype=np.uint64)
+    with np.errstate(over='ignore'): # Wrapping around is intended
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class Streams(sc.prettyobj):
+    '''
+    Registry of named, counter-based random streams for one sim.
+
+    Per-agent draws are counter-based: each agent's value is a SplitMix64 hash of the
+    sim's seed, a hash of the stream name, the timestep and her uid (as in kernels.py),
+    so it depends only on that key, and drawing for a few agents costs only as much as
+    the number of agents. For population-level draws, each (stream, timestep) pair gets
+    its own generator, built from a Philox (default) or PCG64 bit generator keyed in
+    the same way, so streams can be drawn from in any order.
+
+    Each stream should be used at most once per agent per timestep; use a different
+    name for each distinct event.
+
+    Args:
+        seed (int): the sim's random seed
+        bit_generator (str): 'philox' or 'pcg64', for population-level draws
+
+    **Example**::
+
+        streams = fp.Streams(seed=1)
+        u = streams.random('death', ti=10, uids=np.array([0, 5, 7]))
+    '''
+
+    def __init__(self, seed=None, bit_generator='philox'):
+        self.seed = int(seed or 0)
+        if bit_generator not in ['philox', 'pcg64']:
+            errormsg = f'Bit generator "{bit_generator}" not recognized; choices are "philox" or "pcg64"'
+            raise ValueError(errormsg)
+        self.bit_generator = bit_generator
+        return
+
+    @staticmethod
+    def name_key(name):
+        ''' Stable 32-bit key for a stream name (unlike hash(), this is the same in every process) '''
+        return zlib.crc32(name.encode())
+
+    def generator(self, name, ti):
+        ''' Generator for one stream at one timestep, for population-level draws '''
+        ti = int(ti or 0)
+        key = self.name_key(name)
+        if self.bit_generator == 'philox':
+            bitgen = np.random.Philox(key=[self.seed, key], counter=[0, 0, 0, ti])
+        else:
+            bitgen = np.random.PCG64(np.random.SeedSequence([self.seed, key, ti]))
+        return np.random.Generator(bitgen)
+
+    def key(self, name, ti):
+        ''' The state of one stream at one timestep, from which each agent's draw is hashed '''
+        with np.errstate(over='ignore'):
+            state = splitmix(np.uint64(self.seed) + golden)
+            state = splitmix(state ^ np.uint64(self.name_key(name)))
+            return splitmix(state ^ np.uint64(int(ti or 0)))
+
+    @staticmethod
+    def uniform(state, uids):
+        ''' Uniform draws on [0, 1) hashed from a state (or one state per uid) and the uids '''
+        uids = np.asarray(uids, dtype=np.int64).astype(np.uint64)
+        with np.errstate(over='ignore'):
+            x = splitmix((state ^ uids) + golden)
+        return (x >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+
+    def random(self, name, ti, uids):
+        ''' Uniform draws on [0, 1), one per uid '''
+        return self.uniform(self.key(name, ti), uids)
+
+    def reseed_global(self, ti):
+        '''
+        Reseed the global numpy and numba states from the timestep, so that any draws
+        not yet made from a stream (e.g. the initialization of newborns) do not depend
+        on how many draws were made in earlier timesteps.
+        '''
+        seed = int(self.generator('global', ti).integers(2**32))
+        fpu.set_seed(seed)
+        return
+
+
+class ReplicateStreams(Streams):
+    '''
+    Random streams for the replicates of a batched sim (see fp.BatchSim). Each agent's
+    draws are keyed on her replicate and her uid within it, rather than her uid in the
+    whole population, so the draws of a replicate -- and hence its results -- do not
+    depend on how many other replicates are simulated alongside it.
+
+    The replicate of each uid is registered with add() before the agents are created;
+    uids are numbered from 0 in the order they are added, as by People and Sim.
+
+    Args:
+        seed (int): the sim's random seed
+        n_reps (int): the number of replicates
+        kwargs (dict): passed to Streams
+
+    **Example**::
+
+        streams = fp.ReplicateStreams(seed=1, n_reps=2)
+        streams.add(np.arange(4), reps=np.array([0, 0, 1, 1]))
+        u = streams.random('death', ti=10, uids=np.array([1, 3])) # The second agent of each replicate
+    '''
+
+    def __init__(self, seed=None, n_reps=1, **kwargs):
+        super().__init__(seed=seed, **kwargs)
+        self.n_reps = int(n_reps)
+        self.rep = np.zeros(0, dtype=np.int64) # The replicate of each uid
+        self.rep_uid = np.zeros(0, dtype=np.int64) # The uid of each agent within her replicate
+        self.counts = np.zeros(self.n_reps, dtype=np.int64) # The number of agents added to each replicate so far
+        return
+
+    def add(self, uids, reps):
+        ''' Register new agents, with consecutive uids following those already added, and their replicates '''
+        uids = np.asarray(uids, dtype=np.int64)
+        reps = np.asarray(reps, dtype=np.int64)
+        if len(uids) and not np.array_equal(uids, len(self.rep) + np.arange(len(uids))):
+            errormsg = f'Replicate streams need consecutive uids starting from {len(self.rep)}, not {uids[:3]}...'
+            raise ValueError(errormsg)
+        order = np.argsort(reps, kind='stable')
+        sorted_reps = reps[order]
+        rank = np.empty(len(reps), dtype=np.int64)
+        rank[order] = np.arange(len(reps)) - np.searchsorted(sorted_reps, sorted_reps) # Position among the new agents of the same replicate
+        self.rep = np.concatenate([self.rep, reps])
+        self.rep_uid = np.concatenate([self.rep_uid, self.counts[reps] + rank])
+        self.counts += np.bincount(reps, minlength=self.n_reps)
+        return
+
+    def random(self, name, ti, uids):
+        ''' Uniform draws on [0, 1), one per uid, keyed on the replicate and uid within it '''
+        uids = np.asarray(uids, dtype=np.int64)
+        with np.errstate(over='ignore'):
+            state = splitmix(self.key(name, ti) ^ splitmix(self.rep[uids].astype(np.uint64) + golden)) # One state per replicate
+        return self.uniform(state, self.rep_uid[uids])
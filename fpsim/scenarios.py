@@ -5,6 +5,7 @@ Class to define and run scenarios
 import numpy as np
 import pandas as pd
 import sciris as sc
+import scipy.stats as sps
 from . import defaults as fpd
 from . import parameters as fpp
 from . import sim as fps
@@ -266,16 +267,16 @@ class Scenarios(sc.prettyobj):
         return
 
 
-    def make_sims(self, scenlabel, **kwargs):
-        ''' Create a list of sims that are all identical except for the random seed '''
+    def make_sims(self, scenlabel, start=0, **kwargs):
+        ''' Create a list of sims that are all identical except for the random seed, for repeats start to self.repeats '''
         if scenlabel is None:
             errormsg = 'Scenario label must be defined'
             raise ValueError(errormsg)
         sims = sc.autolist()
-        for i in range(self.repeats):
-            pars = sc.mergedicts(fpp.pars(self.pars.get('location')), self.pars, _copy=True)
-            pars.update(kwargs)
-            pars['seed'] += i
+        base_pars = sc.mergedicts(fpp.pars(self.pars.get('location')), self.pars) # Only make the parameters once; each sim makes its own copy
+        for i in range(start, self.repeats):
+            pars = sc.mergedicts(base_pars, kwargs)
+            pars['seed'] = base_pars['seed'] + i
             sim = fps.Sim(pars=pars)
             sim.scenlabel = scenlabel # Special label for scenarios objects
             if sim.label is None:
@@ -284,8 +285,8 @@ class Scenarios(sc.prettyobj):
         return sims
 
 
-    def make_scens(self):
-        ''' Convert a scenario specification into a list of sims '''
+    def make_scens(self, start=0):
+        ''' Convert a scenario specification into a list of sims, for repeats start to self.repeats '''
         for i,scen in enumerate(self.scens):
             simlabel = scen.label
             interventions = sc.autolist()
@@ -327,13 +328,19 @@ class Scenarios(sc.prettyobj):
 
             if simlabel is None:
                 simlabel = f'Scenario {i}'
-            sims = self.make_sims(scenlabel=simlabel, interventions=interventions, **scen.pars)
+            sims = self.make_sims(scenlabel=simlabel, start=start, interventions=interventions, **scen.pars)
             self.simslist.append(sims)
         return
 
 
     def run(self, recompute=True, *args, **kwargs):
-        ''' Actually run a list of sims '''
+        '''
+        Actually run a list of sims
+
+        Args:
+            recompute (bool): whether to compute the statistics of each scenario
+            kwargs (dict): passed to MultiSim.run(); e.g. with folder='sweep', each sim is saved as it finishes and a rerun only runs the sims not already saved
+        '''
 
         # Check that it's set up
         if not self.scens:
@@ -358,6 +365,106 @@ class Scenarios(sc.prettyobj):
         return
 
 
+    def run_adaptive(self, contrasts, precision, batch=10, max_repeats=100, level=0.95, recompute=True, verbose=True, **kwargs):
+        '''
+        Run repeats of the scenarios in batches until the differences between them are known
+        precisely enough, rather than running a fixed number of repeats.
+
+        Repeat i of each scenario has the same seed, so each contrast is estimated from the
+        paired differences between two scenarios, which usually vary much less than the
+        results themselves. After each batch, the confidence interval of the mean difference
+        is computed for each contrast; the runs stop once every interval is within the target
+        precision, or after max_repeats repeats. The contrasts are stored in scens.contrasts,
+        and the sims are processed as for run(), with scens.repeats set to the number run.
+
+        Args:
+            contrasts (dict): for each contrast, a tuple of the labels of two scenarios and a metric: either the name of an array or list result to sum over the run, or a function that takes a sim and returns a number
+            precision (float/dict): the target half-width of the confidence intervals, or a dict with one per contrast
+            batch (int): the number of repeats of each scenario to run at a time
+            max_repeats (int): the maximum number of repeats of each scenario
+            level (float): the confidence level of the intervals
+            recompute (bool): as for run()
+            verbose (bool): whether to print the intervals after each batch
+            kwargs (dict): passed to MultiSim.run(); keep_sims cannot be False, since the contrasts need the sims
+
+        **Example**::
+
+            mcpr_2030 = lambda sim: sim.results['mcpr'][sim.year2ind(2030)]
+            contrasts = dict(mcpr=('Baseline', 'Stockout', mcpr_2030), births=('Baseline', 'Stockout', 'births'))
+            scens = fp.Scenarios(location='kenya', start_year=2020, end_year=2035, scens=[baseline, stockout])
+            scens.run_adaptive(contrasts, precision=dict(mcpr=0.005, births=50), max_repeats=100)
+            print(scens.contrasts.mcpr)
+        '''
+        if not self.scens:
+            errormsg = 'No scenarios are defined'
+            raise ValueError(errormsg)
+        if not isinstance(precision, dict):
+            precision = {key:precision for key in contrasts}
+        missing = [key for key in contrasts if key not in precision]
+        if missing:
+            errormsg = f'No precision given for contrast(s) {sc.strjoin(missing)}; please give one for each of {sc.strjoin(contrasts.keys())}'
+            raise ValueError(errormsg)
+        if not kwargs.pop('keep_sims', True):
+            errormsg = 'keep_sims=False is not supported by run_adaptive(), since the sims are needed to compute the contrasts'
+            raise ValueError(errormsg)
+
+        def metric(sim, which):
+            if not isinstance(which, str):
+                return which(sim)
+            result = sim.results[which]
+            if isinstance(result, dict):
+                errormsg = f'Result "{which}" is a dict, so cannot be summed; please give a function of the sim as the metric instead'
+                raise ValueError(errormsg)
+            return np.sum(np.asarray(result, dtype=float)) # Results can be lists as well as arrays
+
+        # Run batches of repeats until all the contrasts are precise enough
+        sims = sc.objdict(defaultdict=sc.autolist)
+        values = sc.objdict(defaultdict=sc.autolist) # The metrics of each contrast for each pair of sims
+        self.repeats = 0
+        self.contrasts = sc.objdict()
+        while self.repeats < max_repeats:
+            start = self.repeats
+            self.repeats = min(start + batch, max_repeats)
+            self.simslist = []
+            self.make_scens(start=start)
+            msim = fps.MultiSim(sc.mergelists(*self.simslist)).run(compute_stats=False, **kwargs)
+            for sim in msim.sims:
+                sims[sim.scenlabel] += sim
+            for key, (label1, label2, which) in contrasts.items():
+                for label in [label1, label2]:
+                    if label not in sims:
+                        errormsg = f'Scenario "{label}" of contrast "{key}" not found among: {sc.strjoin(sims.keys())}'
+                        raise ValueError(errormsg)
+            for key, (label1, label2, which) in contrasts.items():
+                for sim1, sim2 in zip(sims[label1][start:], sims[label2][start:]):
+                    values[key] += metric(sim1, which) - metric(sim2, which)
+
+            # Compute the confidence intervals
+            done = True
+            for key, diffs in values.items():
+                n = len(diffs)
+                mean = np.mean(diffs)
+                halfwidth = sps.t.ppf((1 + level)/2, n - 1)*np.std(diffs, ddof=1)/np.sqrt(n) if n > 1 else np.inf
+                self.contrasts[key] = sc.objdict(mean=mean, low=mean - halfwidth, high=mean + halfwidth, n=n)
+                done = done and halfwidth <= precision[key]
+            if verbose:
+                ci = sc.strjoin([f'{k} {c.mean:0.4g} ({c.low:0.4g}, {c.high:0.4g})' for k, c in self.contrasts.items()])
+                print(f'After {self.repeats} repeats: {ci}')
+            if done:
+                break
+
+        # Process as for run()
+        self.simslist = list(sims.values())
+        msims = [fps.MultiSim(simlist) for simlist in self.simslist]
+        self.msim = fps.MultiSim.merge(*msims)
+        self.msim.compute_stats()
+        self.msim.already_run = True
+        self.already_run = True
+        self.msim_merged = self.msim.remerge(recompute=recompute)
+        self.analyze_sims()
+        return
+
+
     def check_run(self):
         ''' Give a meaningful error message if the scenarios haven't been run '''
         if not self.already_run:
@@ -13,7 +13,7 @@ is used to refer to the choices made (e.g., DPI=150).
 '''
 
 import os
-import pylab as pl
+import matplotlib.pyplot as pl
 import sciris as sc
 
 
@@ -24,6 +24,27 @@ __all__ = ['options']
 #%% General settings
 
 
+def env_bool(key, default):
+    '''
+    Read a true/false setting from an environment variable, accepting e.g. 1/0, true/false,
+    yes/no or on/off in any case, and returning the default if the variable is not set.
+
+    **Example**::
+
+        cache = env_bool('FPSIM_DATA_CACHE', True) # False for FPSIM_DATA_CACHE=no
+    '''
+    val = os.getenv(key)
+    if val is None:
+        return default
+    val = val.strip().lower()
+    if val in ['1', 'true', 't', 'yes', 'y', 'on']:
+        return True
+    elif val in ['0', 'false', 'f', 'no', 'n', 'off', '']:
+        return False
+    errormsg = f'Could not interpret {key}="{val}" as true or false; use e.g. 1/0, true/false or yes/no'
+    raise ValueError(errormsg)
+
+
 # Define simple plotting options -- similar to Matplotlib default
 rc_simple = {
     'axes.axisbelow':    True, # So grids show up behind
@@ -70,6 +91,7 @@ class Options(sc.objdict):
         - close:          whether to close the figures
         - backend:        which Matplotlib backend to use
         - warnings:       how to handle warnings (e.g. print, raise as errors, ignore)
+        - data_cache:     whether to cache processed location data
 
     **Examples**::
 
@@ -194,6 +216,9 @@ class Options(sc.objdict):
         optdesc.warnings = 'How warnings are handled: options are "warn" (default), "print", and "error"'
         options.warnings = str(os.getenv('FPSIM_WARNINGS', 'warn'))
 
+        optdesc.data_cache = 'Whether to cache processed location data, in memory and in a file alongside the data (see fpsim.locations.data_utils.cached)'
+        options.data_cache = env_bool('FPSIM_DATA_CACHE', True)
+
         return optdesc, options
 
 
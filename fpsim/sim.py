@@ -3,9 +3,10 @@ Defines the Sim class, the core class of the FP model (FPsim).
 """
 
 # %% Imports
+import os
+import functools
 import numpy as np  # Needed for a few things not provided by pl
-import pylab as pl
-import seaborn as sns
+import matplotlib.pyplot as pl
 import sciris as sc
 import pandas as pd
 from .settings import options as fpo
@@ -16,6 +17,12 @@ from . import parameters as fpp
 from . import people as fpppl
 from . import methods as fpm
 from . import education as fped
+from . import rng as fprng
+from . import demographics as fpdmg
+from . import version as fpv
+from . import stats as fpst
+from . import cache as fpc
+from . import counts as fpcnt
 
 # Specify all externally visible things this file defines
 __all__ = ['Sim', 'MultiSim', 'parallel']
@@ -92,7 +99,7 @@ class Sim(fpb.BaseSim):
     def __init__(self, pars=None, location=None, label=None, track_children=False, regional=False,
                  contraception_module=None, empowerment_module=None, education_module=None, **kwargs):
 
-        pars = sc.dcp(pars)
+        pars = sc.mergedicts(pars) # Shallow copy, since fpp.pars() makes the deep copy
         # Handle location
         if location is None:
             if pars is not None and pars.get('location'):
@@ -119,9 +126,13 @@ class Sim(fpb.BaseSim):
         self.track_children = track_children
         self.regional = regional
         self.ti = None  # The current timestep of the simulation
+        self.ti_next = 0  # The next timestep to run, if the sim has been run part of the way, e.g. for a checkpoint
+        self.rng_state = None  # The random number state to restore before continuing, if loaded from a checkpoint
         self.scale = pars['scaled_pop'] / pars['n_agents'] if pars['scaled_pop'] is not None else 1
         fpu.set_metadata(self)  # Set version, date, and git info
         self.summary = None
+        self.group_counts = fpcnt.GroupCounts()  # Counts of agents by group, shared between analyzers (see get_counts())
+        self.aggregate = None  # People counted but not simulated as agents, e.g. the men if female_only is set, or people past retire_age
 
         # Add a new parameter to pars that determines the size of the circular buffer
         self.pars['tiperyear'] = self.tiperyear
@@ -131,8 +142,8 @@ class Sim(fpb.BaseSim):
         self.people = None  # Sims are generally constructed without people, since People construction is time-consuming
 
         # Add modules, also initialized later
-        self.contraception_module = contraception_module or sc.dcp(fpm.StandardChoice(location=location))
-        self.education_module = education_module or sc.dcp(fped.Education(location=location))
+        self.contraception_module = contraception_module or fpm.StandardChoice(location=location)
+        self.education_module = education_module or fped.Education(location=location)
         self.empowerment_module = empowerment_module
 
         return
@@ -150,6 +161,7 @@ class Sim(fpb.BaseSim):
         """ Fully initialize the Sim with people and result storage"""
         if force or not self.initialized:
             self.ti = 0  # The current time index
+            self.ti_next = 0
             fpu.set_seed(self['seed'])
             self.init_results()
             self.init_people()  # This step also initializes the empowerment and education modules if provided
@@ -177,13 +189,48 @@ class Sim(fpb.BaseSim):
 
         return
 
-    def init_people(self):
+    def init_people(self, n=None):
         """
         Initialize people by calling the People constructor and initialization methods.
         See people.py for details of people construction.
+
+        Args:
+            n (int): the number of people to create; defaults to sim['n_agents']
         """
-        self.people = fpppl.People(pars=self.pars, contraception_module=self.contraception_module,
-                                    empowerment_module=self.empowerment_module, education_module=self.education_module)
+        step_modes = ['python', 'compiled', 'parallel']
+        if self['step_mode'] not in step_modes:
+            errormsg = f'Step mode "{self["step_mode"]}" not recognized; choices are {sc.strjoin(step_modes)}'
+            raise ValueError(errormsg)
+        if self['step_mode'] != 'python' and self['rng'] == 'streams':
+            errormsg = f'Random streams (rng="streams") are only supported with step_mode="python"; step_mode="{self["step_mode"]}" draws from its own per-chunk streams'
+            raise ValueError(errormsg)
+        self.people = fpppl.People(pars=self.pars, n=n, contraception_module=self.contraception_module,
+                                    empowerment_module=self.empowerment_module, education_module=self.education_module,
+                                    streams=self.init_streams(n))
+        if self['female_only'] or self['retire_age'] is not None:
+            if self.track_children:
+                errormsg = 'Tracking children is not supported with female_only or retire_age, since agents are removed from the population'
+                raise ValueError(errormsg)
+            self.aggregate = fpdmg.AgeSexCounts(self['max_age'])
+        if self['female_only']:
+            males = sc.findinds(self.people.is_male)
+            self.aggregate.add(self.people.age[males], sex=1)
+            self.people.remove(males)
+        if self['retire_age'] is not None:
+            if self['retire_age'] < self['age_limit_fecundity']:
+                errormsg = f'retire_age ({self["retire_age"]}) cannot be less than age_limit_fecundity ({self["age_limit_fecundity"]})'
+                raise ValueError(errormsg)
+            self.retire_people()
+        self.people.ti = self.ti
+
+    def init_streams(self, n):
+        """ Create the random streams, if used (see fpsim.rng), for the n people about to be created """
+        if self['rng'] == 'streams':
+            return fprng.Streams(seed=self['seed'])
+        elif self['rng'] != 'global':
+            errormsg = f'Random number source "{self["rng"]}" not recognized; choices are "global" or "streams"'
+            raise ValueError(errormsg)
+        return None
 
     def init_contraception(self):
         if self.contraception_module is not None:
@@ -238,6 +285,18 @@ class Sim(fpb.BaseSim):
                 raise TypeError(errormsg)
         return
 
+    def get_counts(self, keep=None, **selections):
+        """
+        Number of agents in groups defined by alive, sex, age, method, pregnant and
+        postpartum, from a table that is computed once per timestep and shared between
+        analyzers; see fp.GroupCounts for details.
+
+        **Example**::
+
+            n_users = sim.get_counts(alive=1, sex=0, age=(15, 50), method=slice(1, None))
+        """
+        return self.group_counts.get(self, keep=keep, **selections)
+
     def apply_analyzers(self):
         """ Apply each analyzer in the model """
         from . import analyzers as fpa  # To avoid circular import
@@ -263,29 +322,62 @@ class Sim(fpb.BaseSim):
     def finalize_analyzers(self):
         """ Make any final updates to analyzers (e.g. to shrink) """
         from . import analyzers as fpa  # To avoid circular import
+        self.group_counts.reset() # States may have changed since the counts were last taken
         for analyzer in sc.tolist(self['analyzers']):
             if isinstance(analyzer, fpa.Analyzer):
                 analyzer.finalize(self)
+        self.group_counts.reset() # Not needed after the run, so don't store it with the sim
 
     def finalize_people(self):
         """Clean up and reset people's attributes at the end of a time step"""
         if not self.track_children:
             delattr(self.people, "mothers")
 
+    def retire_people(self):
+        """
+        Move living agents who are at least retire_age out of the agent arrays and into
+        the aggregate counts, where they keep ageing and dying but are no longer updated
+        individually. Results that are shares of all women (e.g. urban_women, parity0to1)
+        then only include the women who are still agents.
+        """
+        ppl = self.people
+        retired = sc.findinds(ppl.alive & (ppl.age >= self['retire_age']))
+        if len(retired):
+            sexes = ppl.sex[retired]
+            for sex in [0, 1]:
+                self.aggregate.add(ppl.age[retired[sexes == sex]], sex=sex)
+            ppl.remove(retired)
+        return
+
     def grow_population(self, n_new_people):
         """Expand population size"""
-        # Births
+        # Births; uids are assigned up front so that draws from random streams are keyed correctly
+        if self['female_only']: # Only daughters become agents; sons are counted in aggregate
+            pyramid = self['age_pyramid']
+            m_frac = pyramid[:, 1].sum() / pyramid[:, 1:3].sum()
+            n_male = int(np.sum(np.random.random(int(n_new_people)) < m_frac))
+            self.aggregate.add(0, sex=1, n=n_male)
+            n_new_people = int(n_new_people) - n_male
+            if not n_new_people:
+                return
+        max_uid = self.people.uid.max() + 1
         new_people = fpppl.People(
-                    pars=self.pars, n=n_new_people, age=0,
+                    pars=self.pars, n=n_new_people, age=0, sex=0 if self['female_only'] else None, uids=max_uid + np.arange(n_new_people),
                     education_module=self.education_module,
-                    empowerment_module=self.empowerment_module
+                    empowerment_module=self.empowerment_module,
+                    streams=self.people.streams,
                     )
+        new_people.ti = self.ti
         new_people.decide_contraception(ti=self.ti, year=self.y, contraception_module=self.contraception_module)
         self.people += new_people
 
     def step(self):
         """ Update logic of a single time step """
 
+        # Key any remaining global draws on the timestep, if using random streams
+        if self.people.uses_streams:
+            self.people.streams.reseed_global(self.ti)
+
         # Update mortality probabilities for year of sim
         self.update_mortality()
 
@@ -295,7 +387,13 @@ class Sim(fpb.BaseSim):
         self.people.y = self.y
 
         # Step forward people's states and attributes
+        if self.people.events is not None:
+            event_counts = self.people.event_counts()
         self.people.step()
+        if self.people.events is not None:
+            self.people.log_events(event_counts)
+        if self.aggregate is not None:
+            agg_deaths = self.aggregate.step(self.pars)
 
         # Apply interventions
         self.apply_interventions()
@@ -309,37 +407,91 @@ class Sim(fpb.BaseSim):
 
         # Store results
         res = sc.dictobj(**step_results)
+        if self.aggregate is not None:
+            res.n_alive += self.aggregate.n
+            res.deaths += agg_deaths
         self.update_results(res, self.ti)
 
         # Add births
         n_new_people = res.births - res.infant_deaths  # Do not add agents who died before age 1 to population
-        if n_new_people > 0: self.grow_population(n_new_people)
+        if np.any(n_new_people > 0): self.grow_population(n_new_people)
 
         # Update mothers
         if self.track_children:
             self.update_mothers()
 
         # Lastly, update analyzers. Needs to happen at the end of the sim as they report on events from this timestep
+        self.group_counts.reset()
         self.apply_analyzers()
 
         self.people.step_age()
+        if self.aggregate is not None:
+            self.aggregate.step_age(int(self['timestep']))
+        if self['retire_age'] is not None and (self.ti + 1) % self.tiperyear == 0:
+            self.retire_people()
+        self.group_counts.reset() # Ages have changed, so the counts taken by the analyzers are out of date
 
         return res
 
-    def run(self, verbose=None):
-        """ Run the simulation """
+    def run(self, verbose=None, until=None, cache=None):
+        """
+        Run the simulation
+
+        Args:
+            verbose (float): level of detail to print; defaults to sim['verbose']
+            until (float): if supplied, stop at the start of this year instead of running to the end; calling run() again continues from there
+            cache (ResultCache/str): if supplied, load the sim from this cache (or folder) if the same sim has been run before, and otherwise store it there after running; see fp.ResultCache
+
+        **Examples**::
+
+            sim = fp.Sim(start_year=2000, end_year=2020).run(until=2010) # Run the first 10 years
+            sim.run() # Run the remaining 10 years
+
+            sim = fp.Sim(location='senegal', seed=1).run(cache='fpsim_cache') # Only run the first time
+        """
 
         # Initialize -- reset settings and results
         T = sc.timer()
         if verbose is None:
             verbose = self['verbose']
+
+        # Load the sim if it has been run before; only whole runs of new sims are cached
+        key = None
+        if cache is not None and not self.initialized and until is None:
+            if not isinstance(cache, fpc.ResultCache):
+                cache = fpc.ResultCache(cache)
+            key = fpc.hash_sim(self, die=False)
+            if key is None and verbose:
+                print(f'Not caching "{self.label}", since some of its inputs cannot be hashed')
+            cached = cache.get(key) if key is not None else None
+            if cached is not None:
+                label = self.label
+                self.__dict__.update(cached.__dict__)
+                self.label = label
+                if verbose:
+                    print(f'Loaded "{self.label}" from the cache')
+                return self
+
         self.initialize()
         if self.already_run:
             errormsg = 'Cannot re-run an already run sim; please recreate or copy prior to a run'
             raise RuntimeError(errormsg)
 
+        # Restore the random state if continuing from a checkpoint
+        if self.rng_state is not None:
+            fpu.set_rng_state(self.rng_state)
+            self.rng_state = None
+
+        # Work out where to stop
+        stop = self.npts
+        if until is not None:
+            stop = self.year2ind(until)
+            if not (self.ti_next <= stop <= self.npts):
+                errormsg = f'Cannot run until {until}: the sim is at {self.ind2calendar(self.ti_next)} and ends in {self["end_year"]}'
+                raise ValueError(errormsg)
+
         # Main simulation loop
-        for ti in range(self.npts):  # Range over number of timesteps in simulation (ie, 0 to 261 steps)
+        for ti in range(self.ti_next, stop):  # Range over number of timesteps in simulation (ie, 0 to 261 steps)
 
             self.ti = ti
 
@@ -356,6 +508,11 @@ class Sim(fpb.BaseSim):
 
             self.step()
 
+        # Stop here if only running part of the way
+        self.ti_next = stop
+        if stop < self.npts:
+            return self
+
         # Finalize people
         self.finalize_people()
 
@@ -375,6 +532,158 @@ class Sim(fpb.BaseSim):
         self.summary.final = self.results['pop_size'][-1]
 
         self.already_run = True
+        if key is not None:
+            cache.put(key, self)
+
+        return self
+
+    def save_checkpoint(self, path, at_year=None):
+        """
+        Save the sim part of the way through a run, e.g. after burn-in, so it can be continued
+        later (possibly many times, with different interventions) via Sim.from_checkpoint().
+        The checkpoint includes the people, module states, results so far, and random state.
+
+        Args:
+            path (str): the file to save to
+            at_year (float): if supplied, run the sim until the start of this year before saving
+
+        **Example**::
+
+            sim = fp.Sim(location='kenya', start_year=1960, end_year=2040)
+            sim.save_checkpoint('burnin.ckpt', at_year=2020)
+        """
+        if self.already_run:
+            errormsg = 'Cannot save a checkpoint of a sim that has finished running'
+            raise RuntimeError(errormsg)
+        self.initialize()
+        if at_year is not None:
+            self.run(until=at_year, verbose=0)
+        checkpoint = sc.objdict(
+            version = fpv.__version__,
+            year = self.ind2calendar(self.ti_next),
+            rng_state = self.rng_state if self.rng_state is not None else fpu.get_rng_state(),
+            sim = self,
+        )
+        return sc.save(path, checkpoint)
+
+    @classmethod
+    def from_checkpoint(cls, path, end_year=None, interventions=None, analyzers=None, seed=None, label=None):
+        """
+        Load a sim saved by save_checkpoint(), ready to run from where it stopped.
+
+        Args:
+            path (str): the file to load
+            end_year (float): if supplied, change the year the sim ends
+            interventions (list): if supplied, replace the sim's interventions (they start from the checkpoint year)
+            analyzers (list): if supplied, replace the sim's analyzers
+            seed (int): if supplied, use a new random seed from the checkpoint on, e.g. for replicate continuations; otherwise, continuing gives identical results to an uninterrupted run
+            label (str): if supplied, the label for the new sim
+
+        **Example**::
+
+            sims = [fp.Sim.from_checkpoint('burnin.ckpt', interventions=intv, seed=i) for i in range(100)]
+            msim = fp.MultiSim(sims).run()
+        """
+        checkpoint = sc.load(path)
+        sim = checkpoint.sim
+        if not isinstance(sim, cls):
+            errormsg = f'File "{path}" does not contain a {cls.__name__} checkpoint'
+            raise TypeError(errormsg)
+
+        sim._branch(rng_state=checkpoint.rng_state, end_year=end_year, interventions=interventions, analyzers=analyzers, seed=seed, label=label)
+        return sim
+
+    def fork(self, branches, year=None):
+        """
+        Split a partly run sim into branches, e.g. at the start of a stockout. The shared part of
+        the run is only simulated once, and each branch continues from the same state with its
+        own interventions. Unless given a new seed, each branch gives the same results as an
+        uninterrupted run with its interventions.
+
+        The location data -- the parameters that only hold frozen arrays, see fpu.freeze() --
+        are shared between the branches, and must not be modified in place by them. Everything
+        else is copied, since each branch changes it: mostly the state of the people, which
+        takes about 1.2 kB per agent, so e.g. 10 branches of a sim of 100,000 agents take
+        about 1.2 GB in addition to the sim. Branches run in separate processes, as by
+        fp.parallel(), are copied to each process anyway, so nothing is shared between them.
+
+        Args:
+            branches (int/list/dict): the number of replicate branches, each with a new seed; or a list with the interventions for each branch (None to keep the sim's own); or a dict of these by label. Instead of interventions, a branch can be a dict of arguments to from_checkpoint(), e.g. dict(interventions=intv, seed=2).
+            year (float): if supplied, run the sim until the start of this year first
+
+        Returns:
+            A list of sims, ready to run, e.g. with fp.parallel()
+
+        **Example**::
+
+            sim = fp.Sim(location='senegal', start_year=2020, end_year=2040)
+            sims = sim.fork(dict(baseline=None, stockout_m7=stockout), year=2025)
+            msim = fp.parallel(sims)
+        """
+        if self.already_run:
+            errormsg = 'Cannot fork a sim that has finished running'
+            raise RuntimeError(errormsg)
+        self.initialize()
+        if year is not None:
+            self.run(until=year, verbose=0)
+
+        # Convert to a list of arguments for each branch
+        if sc.isnumber(branches):
+            specs = [dict(seed=self['seed'] + i + 1) for i in range(int(branches))]
+        elif isinstance(branches, dict):
+            specs = [sc.mergedicts(b if isinstance(b, dict) else dict(interventions=b), dict(label=label)) for label, b in branches.items()]
+        else:
+            specs = [b if isinstance(b, dict) else dict(interventions=b) for b in branches]
+
+        # Make the branches, sharing the parameters that only hold location data
+        shared = []
+        for val in self.pars.values():
+            arrays = fpu._find_arrays(val)
+            if isinstance(val, (dict, np.ndarray)) and arrays and not any(arr.flags.writeable for arr in arrays):
+                shared.append(val)
+        rng_state = self.rng_state if self.rng_state is not None else fpu.get_rng_state() # Saved if not yet continued
+        sims = []
+        for spec in specs:
+            sim = fpu.dcp(self, share=shared)
+            sim._branch(rng_state=rng_state, **spec)
+            sims.append(sim)
+        fpu.set_rng_state(rng_state) # Reseeding branches changes it
+        self.rng_state = rng_state # In case this sim is continued after the branches are run
+        return sims
+
+    def _branch(self, rng_state, end_year=None, interventions=None, analyzers=None, seed=None, label=None):
+        """ Update a partly run sim to continue as a new branch; see from_checkpoint() and fork() """
+
+        # Change the end of the sim, keeping the results so far
+        if end_year is not None:
+            year = self.ind2calendar(self.ti_next)
+            if end_year < year:
+                errormsg = f'Cannot end the sim in {end_year} since it has already been run until {year}'
+                raise ValueError(errormsg)
+            self['end_year'] = end_year
+            for key in fpd.array_results:
+                old = self.results[key]
+                if isinstance(old, np.ndarray): # Some are lists, which do not need resizing
+                    self.results[key] = np.zeros(int(self.npts))
+                    self.results[key][:self.ti_next] = old[:self.ti_next]
+
+        # Update the interventions, analyzers, and labels
+        if interventions is not None:
+            self['interventions'] = interventions
+        if analyzers is not None:
+            self['analyzers'] = analyzers
+        if label is not None:
+            self.label = label
+
+        # Either continue the same random state, or reseed
+        if seed is None:
+            self.rng_state = rng_state
+        else:
+            self['seed'] = seed
+            fpu.set_seed(seed)
+            self.rng_state = fpu.get_rng_state()
+            if self.people.uses_streams:
+                self.people.streams = fprng.Streams(seed=seed)
 
         return self
 
@@ -390,7 +699,7 @@ class Sim(fpb.BaseSim):
         else:
             scale = 1
         self.results['t'][ti] = self.tvec[ti]
-        self.results['pop_size_months'][ti] = self.n * scale
+        self.results['pop_size_months'][ti] = res.n_alive * scale
         self.results['births'][ti] = res.births * scale
         self.results['deaths'][ti] = res.deaths * scale
         self.results['stillbirths'][ti] = res.stillbirths * scale
@@ -480,7 +789,7 @@ class Sim(fpb.BaseSim):
                 self.results[annual_res_name].append(res_over_year)
 
             # self.results['method_usage'].append(self.compute_method_usage())  # only want this per year
-            self.results['pop_size'].append(scale * self.n)  # CK: TODO: replace with arrays
+            self.results['pop_size'].append(scale * res.n_alive)  # CK: TODO: replace with arrays
             self.results['mcpr_by_year'].append(self.results['mcpr'][ti])
             self.results['cpr_by_year'].append(self.results['cpr'][ti])
 
@@ -815,6 +1124,7 @@ class Sim(fpb.BaseSim):
             do_save (bool): whether the user wants to save the plot to filepath (default: false)
             filename (str): the name of the path to output the plot
         """
+        import seaborn as sns # Imported here since slow to import
         birth_age = self.people.first_birth_age
         data = birth_age[birth_age > 0]
         fig = pl.figure(**sc.mergedicts(dict(figsize=(7, 5)), fig_args))
@@ -897,6 +1207,25 @@ class Sim(fpb.BaseSim):
             output += f'{reprstr}'
         print(output)
 
+    def shrink(self, keep_analyzers=True):
+        """
+        Remove the people from a sim that has been run, keeping the results, e.g. to make it
+        much smaller to send back from a parallel run (see MultiSim.run()). Modifies the sim
+        in place.
+
+        Args:
+            keep_analyzers (bool/list): whether to keep the analyzers, or the labels of the ones to keep
+
+        **Example**::
+
+            sim = fp.Sim().run().shrink()
+        """
+        self.people = None
+        if keep_analyzers is not True:
+            keep = sc.tolist(keep_analyzers) if keep_analyzers else []
+            self['analyzers'] = [a for a in sc.tolist(self['analyzers']) if getattr(a, 'label', None) in keep]
+        return self
+
 
 # %% Multisim and running
 class MultiSim(sc.prettyobj):
@@ -912,7 +1241,7 @@ class MultiSim(sc.prettyobj):
                 base_sim = sims
                 sims = None
             elif isinstance(sims, list):
-                base_sim = sc.dcp(sims[0]) # Copy so we don't accidentally overwrite with compute_stats()
+                base_sim = fpu.dcp(sims[0]) # Copy so we don't accidentally overwrite with compute_stats()
             else:
                 errormsg = f'If base_sim is not supplied, sims must be either a single sim (treated as base_sim) or a list of sims, not {type(sims)}'
                 raise TypeError(errormsg)
@@ -937,8 +1266,26 @@ class MultiSim(sc.prettyobj):
         else:
             return 0
 
-    def run(self, compute_stats=True, **kwargs):
-        """ Run all simulations in the MultiSim """
+    def run(self, compute_stats=True, keep_people=True, keep_analyzers=True, keep_sims=True, folder=None, cache=None, **kwargs):
+        """
+        Run all simulations in the MultiSim
+
+        Args:
+            compute_stats (bool/dict): whether to compute statistics across the sims after running, or arguments to compute_stats() (e.g. quantiles)
+            keep_people (bool): whether to keep the people of each sim; if False, only the results (and analyzers) are sent back from the parallel runs, which uses much less memory
+            keep_analyzers (bool/list): if not keeping people, whether to keep the analyzers, or the labels of the ones to keep
+            keep_sims (bool): if False, add each sim to the statistics as it finishes and then discard it, so only a few sims are in memory at once (see fp.ResultStats)
+            folder (str): if given, save each sim to this folder as it finishes, and skip the sims already saved there (with the same parameters), so an interrupted run can be resumed; sims are run longest first
+            cache (ResultCache/str): if given, load the sims that have been run before from this cache, and store the others (see Sim.run())
+            kwargs (dict): passed to sc.parallelize(), e.g. serial=True or ncpus; with a folder, also verbose, the level of progress to print (default: that of the first sim)
+
+        **Examples**::
+
+            msim = fp.MultiSim(sims).run(keep_people=False)
+            sims = [fp.Sim(location='kenya', seed=i) for i in range(1000)]
+            msim = fp.MultiSim(sims).run(keep_sims=False) # Only the statistics are kept
+            msim = fp.MultiSim(sims).run(folder='sweep', keep_people=False) # Rerun to resume after an interruption
+        """
         # Handle missing labels
         for s, sim in enumerate(sc.tolist(self.sims)):
             if sim.label is None:
@@ -947,11 +1294,18 @@ class MultiSim(sc.prettyobj):
         if self.already_run:
             errormsg = 'Cannot re-run an already run MultiSim'
             raise RuntimeError(errormsg)
-        self.sims = multi_run(self.sims, **kwargs)
-
-        # Recompute stats
-        if compute_stats:
-            self.compute_stats()
+        stats_args = compute_stats if isinstance(compute_stats, dict) else {}
+        if keep_sims:
+            self.sims = multi_run(self.sims, keep_people=keep_people, keep_analyzers=keep_analyzers, cache=cache, folder=folder, **kwargs)
+            if compute_stats:
+                self.compute_stats(**stats_args)
+        else:
+            stats = fpst.ResultStats(**stats_args)
+            for sim in multi_run(self.sims, keep_people=False, keep_analyzers=keep_analyzers, cache=cache, iterate=True, folder=folder, **kwargs):
+                stats.add(sim)
+            self.sims = []
+            self.results = stats.compute()
+            self.base_sim.results = self.results  # Store here too, to enable plotting
         self.already_run = True
         return self
 
@@ -971,7 +1325,7 @@ class MultiSim(sc.prettyobj):
                     errormsg = f'Could not figure out how to convert {quantiles} into a quantiles object: must be a dict with keys low, high or a 2-element array ({str(E)})'
                     raise ValueError(errormsg)
 
-        base_sim = sc.dcp(self.sims[0])
+        base_sim = self.sims[0]
         raw = sc.objdict()
         results = sc.objdict()
         axis = 1
@@ -984,7 +1338,7 @@ class MultiSim(sc.prettyobj):
 
         bad_keys = ['t', 'tfr_years', 'method_usage']
         for key in bad_keys:  # Don't compute high/low for these
-            results[key] = base_sim.results[key]
+            results[key] = fpu.dcp(base_sim.results[key])
             reskeys.remove(key)
         for reskey in reskeys:
             if isinstance(base_sim.results[reskey], dict):
@@ -1005,9 +1359,8 @@ class MultiSim(sc.prettyobj):
                     results[reskey].low = r_mean - bounds * r_std
                     results[reskey].high = r_mean + bounds * r_std
                 else:
-                    results[reskey].best = np.quantile(raw[reskey], q=0.5, axis=axis)
-                    results[reskey].low = np.quantile(raw[reskey], q=quantiles['low'], axis=axis)
-                    results[reskey].high = np.quantile(raw[reskey], q=quantiles['high'], axis=axis)
+                    q = np.quantile(raw[reskey], q=[0.5, quantiles['low'], quantiles['high']], axis=axis)  # One sort for all three
+                    results[reskey].best, results[reskey].low, results[reskey].high = q
 
         self.results = results
         self.base_sim.results = results  # Store here too, to enable plotting
@@ -1040,21 +1393,21 @@ class MultiSim(sc.prettyobj):
             args = args[0]  # A single list of MultiSims has been provided
 
         # Create the multisim from the base sim of the first argument
-        msim = MultiSim(base_sim=sc.dcp(args[0].base_sim), sims=[], label=args[0].label)
+        msim = MultiSim(base_sim=fpu.dcp(args[0].base_sim), sims=[], label=args[0].label)
         msim.sims = []
         msim.chunks = []  # This is used to enable automatic splitting later
 
         # Handle different options for combining
         if base:  # Only keep the base sims
             for i, ms in enumerate(args):
-                sim = sc.dcp(ms.base_sim)
+                sim = fpu.dcp(ms.base_sim)
                 sim.label = ms.label
                 msim.sims.append(sim)
                 msim.chunks.append([[i]])
         else:  # Keep all the sims
             for ms in args:
                 len_before = len(msim.sims)
-                msim.sims += list(sc.dcp(ms.sims))
+                msim.sims += list(fpu.dcp(ms.sims))
                 len_after = len(msim.sims)
                 msim.chunks.append(list(range(len_before, len_after)))
 
@@ -1109,7 +1462,7 @@ class MultiSim(sc.prettyobj):
         # Do the conversion
         mlist = []
         for indlist in inds:
-            sims = sc.dcp([self.sims[i] for i in indlist])
+            sims = fpu.dcp([self.sims[i] for i in indlist])
             msim = MultiSim(sims=sims)
             mlist.append(msim)
 
@@ -1270,6 +1623,7 @@ class MultiSim(sc.prettyobj):
                                       **kwargs)
 
     def plot_age_first_birth(self, do_show=False, do_save=True, output_file='age_first_birth_multi.png'):
+        import seaborn as sns # Imported here since slow to import
         length = sum([len([num for num in sim.people.first_birth_age if num is not None]) for sim in self.sims])
         data_dict = {"age": [0] * length, "sim": [0] * length}
         i = 0
@@ -1289,16 +1643,96 @@ class MultiSim(sc.prettyobj):
             pl.savefig(output_file)
 
 
-def single_run(sim):
+def single_run(sim, keep_people=True, keep_analyzers=True, cache=None):
     """ Helper function for multi_run(); rarely used on its own """
-    sim.run()
+    sim.run(cache=cache)
+    if not keep_people:
+        sim.shrink(keep_analyzers=keep_analyzers)
     return sim
 
 
-def multi_run(sims, **kwargs):
-    """ Run multiple sims in parallel; usually used via the MultiSim class, not directly """
-    sims = sc.parallelize(single_run, iterarg=sims, **kwargs)
-    return sims
+def multi_run(sims, keep_people=True, keep_analyzers=True, cache=None, iterate=False, folder=None, **kwargs):
+    """
+    Run multiple sims in parallel; usually used via the MultiSim class, not directly.
+    With iterate=True, return an iterator that yields the sims in order as they finish,
+    rather than a list of all of them. With a folder, save each sim there as it finishes
+    (see MultiSim.run()).
+    """
+    run_args = dict(keep_people=keep_people, keep_analyzers=keep_analyzers, cache=cache)
+    if folder is not None:
+        runs = _spool_run(sims, folder, run_args, **kwargs)
+    elif iterate:
+        runs = _iter_run(sims, run_args, **kwargs)
+    else:
+        return sc.parallelize(single_run, iterarg=sims, kwargs=run_args, **kwargs)
+    return runs if iterate else list(runs)
+
+
+def _iter_run(sims, run_args, serial=False, ncpus=None, **kwargs):
+    """ Helper function for multi_run(iterate=True) """
+    if kwargs:
+        errormsg = f'Only the serial and ncpus arguments are supported when iterating over runs, not {sc.strjoin(kwargs.keys())}'
+        raise ValueError(errormsg)
+    if serial:
+        for sim in sims:
+            yield single_run(sim, **run_args)
+    else:
+        import multiprocess as mp  # The pool used by sc.parallelize()
+        with mp.Pool(processes=ncpus) as pool:
+            yield from pool.imap(functools.partial(single_run, **run_args), sims) # In order, so the statistics are reproducible
+
+
+def _spool_job(job, run_args):
+    """ Helper function for _spool_run(): run a sim and save it """
+    sim, path = job
+    sim = single_run(sim, **run_args)
+    sc.save(path + '.tmp', sim)
+    os.replace(path + '.tmp', path) # Only complete files are found when resuming
+    return sim.label, sim['n_agents']*sim.npts
+
+
+def _spool_run(sims, folder, run_args, serial=False, ncpus=None, verbose=None):
+    """
+    Helper function for multi_run(folder=...): run the sims that are not already saved
+    in the folder, longest first, saving each one as it finishes; then yield all the sims
+    from the folder in order. Files are named by the hash of the sim (see fp.hash_sim()),
+    so a sim whose parameters have changed is rerun rather than loaded; sims that cannot
+    be hashed are always rerun.
+    """
+    if verbose is None:
+        verbose = sims[0]['verbose'] if len(sims) else 0
+    os.makedirs(folder, exist_ok=True)
+    keys = [fpc.hash_sim(sim, die=False) for sim in sims]
+    paths = [os.path.join(folder, sc.sanitizefilename(f'{i:04d}_{sim.label}_{key[:16] if key else "unhashed"}.sim')) for i, (sim, key) in enumerate(zip(sims, keys))]
+    todo = [i for i, path in enumerate(paths) if keys[i] is None or not os.path.exists(path)]
+    todo.sort(key=lambda i: sims[i]['n_agents']*sims[i].npts, reverse=True) # Longest first, so the last jobs to finish are short
+    if len(todo) < len(sims):
+        sc.printv(f'Skipping {len(sims) - len(todo)} of {len(sims)} sims already saved in {folder}', 1, verbose)
+
+    # Run the remaining sims, reporting progress
+    jobs = [(sims[i], paths[i]) for i in todo]
+    total = sum(sims[i]['n_agents']*sims[i].npts for i in todo)
+    done = 0
+    T = sc.timer()
+    if serial:
+        finished = (_spool_job(job, run_args) for job in jobs)
+    else:
+        import multiprocess as mp  # The pool used by sc.parallelize()
+        pool = mp.Pool(processes=ncpus)
+        finished = pool.imap_unordered(functools.partial(_spool_job, run_args=run_args), jobs)
+    try:
+        for j, (label, steps) in enumerate(finished):
+            done += steps
+            if verbose:
+                rate = done/T.toc(output=True)
+                sc.printv(f'  Finished {label} ({j+1}/{len(jobs)}): {rate:,.0f} agent-steps/s, ETA {(total - done)/rate:0.0f} s', 1, verbose)
+    finally:
+        if not serial:
+            pool.close()
+            pool.join()
+
+    for path in paths:
+        yield sc.load(path)
 
 
 def parallel(*args, **kwargs):
@@ -0,0 +1,196 @@
+'''
+Streaming statistics across sims.
+
+MultiSim.compute_stats() stacks each result of every sim into one matrix, so all the
+sims have to be held in memory at once. ResultStats instead takes the sims one at a time,
+e.g. as they finish running, and keeps only running summaries: the mean and variance
+(Welford's algorithm), and estimates of the median and other quantiles (the P² algorithm
+of Jain and Chlamtac, 1985). Memory use does not depend on the number of sims.
+'''
+
+import numpy as np
+import sciris as sc
+
+
+__all__ = ['P2Quantile', 'ResultStats']
+
+
+class P2Quantile(sc.prettyobj):
+    '''
+    Running estimate of a quantile of each element of a series of arrays, using the P²
+    algorithm. The first n_exact arrays are stored and the quantile is calculated exactly;
+    after that, five markers per element track the minimum, the quantile, and the points
+    halfway to it from either end, and are adjusted as each new array is added.
+
+    Args:
+        q (float): the quantile to estimate, between 0 and 1
+        n_exact (int): the number of arrays for which to give exact quantiles (at least 5)
+
+    **Example**::
+
+        est = fp.P2Quantile(0.9)
+        for i in range(1000):
+            est.add(np.random.randn(3))
+        est.value # Close to 1.28
+    '''
+
+    def __init__(self, q, n_exact=20):
+        if not 0 <= q <= 1:
+            errormsg = f'Quantile must be between 0 and 1, not {q}'
+            raise ValueError(errormsg)
+        self.q = q
+        self.n_exact = max(5, int(n_exact))
+        self.n = 0
+        self.buffer = [] # Values until there are n_exact of them
+        self.dn = np.array([0, q/2, q, (1+q)/2, 1]) # Increments of the desired marker positions
+        self.heights = None # Marker heights, shape (len(x), 5)
+        self.pos = None # Actual marker positions
+        self.desired = None # Desired marker positions
+        return
+
+    def add(self, x):
+        ''' Add an array of values '''
+        x = np.asarray(x, dtype=float)
+        self.n += 1
+        if self.heights is None:
+            self.buffer.append(x)
+            if len(self.buffer) == self.n_exact:
+                self._start()
+        else:
+            self._update(x)
+        return
+
+    def _start(self):
+        ''' Initialize the markers at their desired positions among the values so far '''
+        values = np.sort(np.array(self.buffer), axis=0)
+        desired = 1 + (self.n - 1)*self.dn
+        inds = np.round(desired).astype(int) - 1
+        self.desired = np.tile(desired, (values.shape[1], 1))
+        self.pos = np.tile(inds + 1.0, (values.shape[1], 1))
+        self.heights = values[inds].T.copy()
+        self.buffer = []
+        return
+
+    def _update(self, x):
+        ''' Update the markers with a new array of values '''
+        h, pos = self.heights, self.pos
+        h[:,0] = np.minimum(h[:,0], x)
+        h[:,4] = np.maximum(h[:,4], x)
+        cell = np.sum(x[:,None] >= h[:,1:4], axis=1) # Which of the four cells between markers each value falls into
+        pos += np.arange(5) > cell[:,None]
+        self.desired += self.dn
+
+        # Move the middle markers if they are more than a position away from where they should be
+        with np.errstate(divide='ignore', invalid='ignore'): # Only used where the markers are moved, when the denominators are nonzero
+            for i in [1, 2, 3]:
+                d = self.desired[:,i] - pos[:,i]
+                up = (d >= 1) & (pos[:,i+1] - pos[:,i] > 1)
+                down = (d <= -1) & (pos[:,i-1] - pos[:,i] < -1)
+                move = up | down
+                if not move.any():
+                    continue
+                s = np.where(up, 1.0, -1.0)
+                left, right = pos[:,i] - pos[:,i-1], pos[:,i+1] - pos[:,i]
+                parabolic = h[:,i] + s/(left + right) * ((left + s)*(h[:,i+1] - h[:,i])/right + (right - s)*(h[:,i] - h[:,i-1])/left)
+                linear = h[:,i] + np.where(up, (h[:,i+1] - h[:,i])/right, (h[:,i] - h[:,i-1])/left)*s
+                in_range = (h[:,i-1] < parabolic) & (parabolic < h[:,i+1])
+                h[:,i] = np.where(move, np.where(in_range, parabolic, linear), h[:,i])
+                pos[:,i] += move*s
+        return
+
+    @property
+    def value(self):
+        ''' The current estimate of the quantile '''
+        if self.heights is None:
+            return np.quantile(np.array(self.buffer), self.q, axis=0)
+        return self.heights[:,2].copy()
+
+
+class ResultStats(sc.prettyobj):
+    '''
+    Statistics of sim results, computed as the sims are added one at a time, giving the same
+    output as MultiSim.compute_stats(). With use_mean=True, the mean and standard deviation are
+    exact; otherwise, the median and quantiles are exact for up to n_exact sims, and estimated
+    with the P² algorithm for more (see P2Quantile).
+
+    Args:
+        quantiles (dict): the quantiles to use for the low and high bounds (default 10% and 90%)
+        use_mean (bool): whether to use the mean and standard deviation instead of the median and quantiles
+        bounds (float): if using the mean, the number of standard deviations for the low and high bounds
+        n_exact (int): the number of sims for which to keep all values, to give exact quantiles
+
+    **Example**::
+
+        stats = fp.ResultStats()
+        for sim in sims:
+            stats.add(sim.run())
+            sim.people = None
+        results = stats.compute()
+    '''
+
+    skip_keys = ['t', 'tfr_years', 'method_usage'] # Copied from the first sim rather than summarized
+
+    def __init__(self, quantiles=None, use_mean=False, bounds=None, n_exact=20):
+        if quantiles is None:
+            quantiles = {'low': 0.1, 'high': 0.9}
+        if not isinstance(quantiles, dict):
+            try:
+                quantiles = {'low': float(quantiles[0]), 'high': float(quantiles[1])}
+            except Exception as E:
+                errormsg = f'Could not figure out how to convert {quantiles} into a quantiles object: must be a dict with keys low, high or a 2-element array ({str(E)})'
+                raise ValueError(errormsg)
+        self.quantiles = quantiles
+        self.use_mean = use_mean
+        self.bounds = 1 if bounds is None else bounds
+        self.n_exact = n_exact
+        self.n = 0
+        self.tvec = None
+        self.fixed = sc.objdict() # Results copied from the first sim
+        self.stats = sc.objdict() # Running statistics of each result
+        return
+
+    def add(self, sim):
+        ''' Add the results of a sim that has been run '''
+        tvec = sim.tvec[[0, -1]]
+        if self.tvec is None:
+            self.tvec = tvec
+            for key, val in sim.results.items():
+                if key in self.skip_keys:
+                    self.fixed[key] = val
+                elif not isinstance(val, dict):
+                    if self.use_mean:
+                        self.stats[key] = sc.objdict(mean=np.zeros(len(val)), m2=np.zeros(len(val)))
+                    else:
+                        self.stats[key] = sc.objdict(best=P2Quantile(0.5, self.n_exact), low=P2Quantile(self.quantiles['low'], self.n_exact),
+                                                     high=P2Quantile(self.quantiles['high'], self.n_exact))
+        elif not np.array_equal(tvec, self.tvec):
+            errormsg = f'Cannot compute stats for sims: start and end values do not match:\n{self.tvec} vs. {tvec}'
+            raise ValueError(errormsg)
+
+        self.n += 1
+        for key, stats in self.stats.items():
+            val = sim.results[key]
+            if self.use_mean: # Welford's algorithm
+                delta = val - stats.mean
+                stats.mean += delta/self.n
+                stats.m2 += delta*(val - stats.mean)
+            else:
+                for est in stats.values():
+                    est.add(val)
+        return
+
+    def compute(self):
+        ''' Return the statistics of the sims added so far, in the format of MultiSim.results '''
+        if not self.n:
+            errormsg = 'No sims have been added'
+            raise ValueError(errormsg)
+        results = sc.objdict()
+        for key, val in self.fixed.items():
+            results[key] = val
+        for key, stats in self.stats.items():
+            if self.use_mean:
+                std = np.sqrt(stats.m2/self.n)
+                results[key] = sc.objdict(best=stats.mean.copy(), low=stats.mean - self.bounds*std, high=stats.mean + self.bounds*std)
+            else:
+                results[key] = sc.objdict({k: est.value for k, est in stats.items()})
+        return results
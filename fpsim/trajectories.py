@@ -0,0 +1,170 @@
+'''
+On-disk storage of per-agent trajectories.
+
+Recorders such as lifeof_recorder copy some states of every agent at every timestep.
+Kept in memory, and then assembled into dense (timepoints x agents) arrays, this takes
+twice the size of the recording at its peak, which is more than fits in memory for
+realistic population sizes. TrajectoryStore instead appends the values to files on disk
+as the sim runs, in chunks of a few timesteps per state, and reads them back through
+memory maps only when, and only as far as, they are indexed. Without a folder to write
+to, the chunks are kept in memory instead, which still avoids the dense copy.
+'''
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import sciris as sc
+
+
+__all__ = ['TrajectoryStore']
+
+
+class TrajectoryStore(sc.prettyobj):
+    '''
+    Values of some states of each agent over time, stored in chunks on disk or in memory.
+
+    Values are buffered in memory for chunk timesteps, then written for each key to a
+    .npy file of shape (agents, chunk timesteps) in a new folder inside path -- or, if
+    no path is given, kept in memory as arrays of that shape. Each agent's values within
+    a chunk are thus contiguous, so reading one agent's trajectory -- as the plots do --
+    reads a few short runs from each chunk. Agents are identified by their position in the
+    arrays passed to append(), so later agents may be added at the end; agents not yet
+    present at a timestep read as NaN.
+
+    Indexing a key gives a view that reads from the chunks on demand, with numpy indexing
+    over (timepoint, agent); np.array(view) gives the whole dense array.
+
+    Since the files are not copied when the store is saved or pickled, a store with a
+    path can only be read where the files are.
+
+    Args:
+        keys (list): the states to store
+        path (str): the folder to create the store in (default: keep the chunks in memory)
+        chunk (int): the number of timesteps to buffer in memory before writing to disk
+        dtype (type): the type to store values as; must be able to represent NaN
+
+    **Example**::
+
+        store = fp.TrajectoryStore(['age', 'method'], path='recordings')
+        for ti in range(sim.npts):
+            ... # Run the sim
+            store.append(ti, {key: sim.people[key] for key in store.keys})
+        store.flush()
+        store['method'][:, 5] # Method of the sixth agent over time
+        store.remove() # Delete the files
+    '''
+
+    def __init__(self, keys, path=None, chunk=12, dtype=np.float64):
+        self.keys = list(dict.fromkeys(keys)) # Remove duplicates, keeping order
+        self.folder = None
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self.folder = tempfile.mkdtemp(prefix='trajectories_', dir=path) # Unique, so stores from several sims can share a path
+        self.arrays = {} # The chunks, by key and chunk number, if not stored on disk
+        self.chunk = chunk
+        self.dtype = np.dtype(dtype)
+        self.time = [] # The timestep of each timepoint
+        self.chunks = [] # The first timepoint, number of timepoints and number of agents of each chunk
+        self.max_agents = 0
+        self._buffer = []
+        return
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self, key):
+        if key not in self.keys:
+            errormsg = f'State "{key}" is not stored; stored states are {self.keys}'
+            raise KeyError(errormsg)
+        return TrajectoryView(self, key)
+
+    def filename(self, key, c):
+        return os.path.join(self.folder, f'{key}_{c}.npy')
+
+    def append(self, ti, data):
+        ''' Add the values of each key at timestep ti '''
+        self.time.append(ti)
+        self._buffer.append({key: np.asarray(data[key]) for key in self.keys})
+        if len(self._buffer) >= self.chunk:
+            self.flush()
+        return
+
+    def flush(self):
+        ''' Write the buffered timepoints as a new chunk '''
+        if not self._buffer:
+            return
+        m = len(self._buffer)
+        n = max(len(vals[self.keys[0]]) for vals in self._buffer)
+        c = len(self.chunks)
+        for key in self.keys:
+            if self.folder is None:
+                arr = np.full((n, m), np.nan, dtype=self.dtype)
+            else:
+                arr = np.lib.format.open_memmap(self.filename(key, c), mode='w+', dtype=self.dtype, shape=(n, m))
+                arr[:] = np.nan
+            for j, vals in enumerate(self._buffer):
+                arr[:len(vals[key]), j] = vals[key]
+            if self.folder is None:
+                self.arrays[(key, c)] = arr
+            else:
+                arr.flush()
+                del arr
+        self.chunks.append((len(self.time) - m, m, n))
+        self.max_agents = max(self.max_agents, n)
+        self._buffer = []
+        return
+
+    def read(self, key, times, agents):
+        ''' Values of a key as a (times, agents) array, for arrays of timepoint and agent indices '''
+        self.flush()
+        out = np.full((len(times), len(agents)), np.nan)
+        for c, (t0, m, n) in enumerate(self.chunks):
+            tmask = (times >= t0) & (times < t0 + m)
+            amask = agents < n
+            if not tmask.any() or not amask.any():
+                continue
+            arr = self.arrays[(key, c)] if self.folder is None else np.load(self.filename(key, c), mmap_mode='r')
+            out[np.ix_(tmask, amask)] = arr[np.ix_(agents[amask], times[tmask] - t0)].T
+        return out
+
+    def remove(self):
+        ''' Delete the contents of the store, including its files '''
+        if self.folder is not None:
+            shutil.rmtree(self.folder, ignore_errors=True)
+        self.arrays = {}
+        self.chunks = []
+        return
+
+
+class TrajectoryView:
+    ''' One key of a TrajectoryStore, read from its chunks as it is indexed '''
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+        return
+
+    @property
+    def shape(self):
+        return (len(self.store), self.store.max_agents)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, inds):
+        self.store.flush() # So that max_agents is up to date
+        inds = inds if isinstance(inds, tuple) else (inds,)
+        tinds, ainds = (inds + (slice(None),)*2)[:2]
+        times = np.arange(self.shape[0])[tinds]
+        agents = np.arange(self.shape[1])[ainds]
+        out = self.store.read(self.key, np.atleast_1d(times), np.atleast_1d(agents))
+        if np.ndim(agents) == 0:
+            out = out[:, 0]
+        if np.ndim(times) == 0:
+            out = out[0]
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[:, :]
+        return out.astype(dtype) if dtype is not None else out
@@ -11,9 +11,14 @@ from . import version as fpv
 
 
 # Specify all externally visible things this file defines
-__all__ = ['set_seed', 'bt', 'bc', 'rbt', 'mt', 'sample', 'match_ages']
+__all__ = ['set_seed', 'warmup', 'bt', 'bc', 'rbt', 'mt', 'sample', 'match_ages']
 __all__ += ['DuplicateNameException']
 
+# Read-only arrays, e.g. shared location data (see freeze()), need their own Numba signatures;
+# contiguous arrays get their own signature too, since otherwise they match both
+ro_float64_1d = nb.types.Array(nb.float64, 1, 'A', readonly=True)
+float64_1d_types = [nb.float64[::1], nb.float64[:], ro_float64_1d]
+
 
 @nb.jit((nb.float64[:], nb.float64, nb.float64), cache=True, nopython=True)
 def match_ages(age, age_low, age_high):
@@ -34,7 +39,7 @@ def digitize_ages_1yr(ages):
     return np.digitize(ages, age_cutoffs) - 1
 
 
-@nb.jit((nb.float64[:], nb.float64[:]), cache=True, nopython=True)
+@nb.jit([(nb.float64[:], arr) for arr in float64_1d_types], cache=True, nopython=True)
 def digitize_ages(ages, age_group_lb):
     """
     This function returns the 0-based indices of the age bins passed in age_group_lb
@@ -42,19 +47,34 @@ def digitize_ages(ages, age_group_lb):
     return np.digitize(ages, age_group_lb) - 1  # returns 0-based indices of the group
 
 
+@nb.njit((nb.int64,), cache=True)
+def set_seed_numba(seed):
+    ''' Seed Numba's random state, which is separate from Numpy's '''
+    return np.random.seed(seed)
+
+
 def set_seed(seed=None):
     ''' Reset the random seed -- complicated because of Numba '''
+    if seed is not None:
+        set_seed_numba(int(seed))
+        np.random.seed(seed)
+    return
 
-    @nb.njit
-    def set_seed_numba(seed):
-        return np.random.seed(seed)
 
-    def set_seed_regular(seed):
-        return np.random.seed(seed)
+def get_rng_state():
+    ''' Get the state of the global Numpy and Numba random number generators, e.g. for a checkpoint '''
+    from numba import _helperlib # Numba does not provide a public API for this
+    ptr = _helperlib.rnd_get_np_state_ptr()
+    state = dict(numpy=np.random.get_state(), numba=_helperlib.rnd_get_state(ptr))
+    return state
 
-    if seed is not None:
-        set_seed_numba(seed)
-        set_seed_regular(seed)
+
+def set_rng_state(state):
+    ''' Restore the state of the random number generators from get_rng_state() '''
+    from numba import _helperlib
+    ptr = _helperlib.rnd_get_np_state_ptr()
+    np.random.set_state(state['numpy'])
+    _helperlib.rnd_set_state(ptr, state['numba'])
     return
 
 
@@ -76,13 +96,13 @@ def rbt(prob, repeats):
     return np.random.binomial(repeats, prob) > 0  # Or (np.random.rand(repeats) < prob).any()
 
 
-@nb.njit((nb.float64[:],), cache=True)
+@nb.njit([(arr,) for arr in float64_1d_types], cache=True)
 def mt(probs):
     ''' A multinomial trial '''
     return np.searchsorted(np.cumsum(probs), np.random.random())
 
 
-@nb.njit((nb.float64[:], nb.int64), cache=True)
+@nb.njit([(arr, nb.int64) for arr in float64_1d_types], cache=True)
 def n_multinomial(probs, n):
     '''
     An array of multinomial trials.
@@ -145,21 +165,114 @@ def annprob2ts(prob_annual, timestep=1):
 
 
 
-@nb.njit((nb.float64[:], nb.float64, nb.float64), cache=True)
+@nb.njit([(arr, nb.float64, nb.float64) for arr in float64_1d_types], cache=True)
 def numba_miscarriage_prob(miscarriage_rates, age, resolution):
     '''Run interpolation eval to check for probability of miscarriage here'''
     miscarriage_prob = miscarriage_rates[int(round(age*resolution))]
     return miscarriage_prob
 
 
+def warmup(kernels=True, verbose=False):
+    '''
+    Compile (or load from the on-disk cache) all of FPsim's Numba functions, so that
+    later sims do not pay any JIT cost. The functions in this file have explicit
+    signatures and are compiled on import; the step kernels in fpsim.kernels are
+    compiled on first use, so a tiny sim is run in each compiled step mode.
+
+    Call this once per process, e.g. in each worker of a process pool, or run
+    ``python -m fpsim warmup`` once after installing to populate the cache.
+
+    Args:
+        kernels (bool): whether to also compile the step kernels
+        verbose (bool): whether to print timings
+
+    **Example**::
+
+        fp.warmup()
+    '''
+    T = sc.timer()
+    set_seed(1)
+    match_ages(np.zeros(1), 0.0, 1.0)
+    digitize_ages_1yr(np.zeros(1))
+    digitize_ages(np.zeros(1), np.zeros(1))
+    bt(0.5)
+    bc(0.5, 1)
+    rbt(0.5, 1)
+    mt(np.ones(2)/2)
+    n_multinomial(np.ones(2)/2, 1)
+    numba_miscarriage_prob(np.zeros(2), 0.0, 1.0)
+    if verbose: T.toc('Utility functions ready')
+
+    if kernels:
+        from . import sim as fps # Here to avoid circular import
+        for step_mode in ['compiled', 'parallel']:
+            fps.Sim(location='senegal', n_agents=50, start_year=2000, end_year=2001, step_mode=step_mode, verbose=0).run()
+            if verbose: T.toc(f'Step kernels for step_mode="{step_mode}" ready')
+    return
+
+
+_git_info = None # Git info only needs to be looked up once per process
+
 def set_metadata(obj):
     ''' Set standard metadata for an object '''
+    global _git_info
+    if _git_info is None:
+        _git_info = sc.gitinfo(verbose=False)
     obj.created = sc.now()
     obj.version = fpv.__version__
-    obj.git_info = sc.gitinfo(verbose=False)
+    obj.git_info = sc.dcp(_git_info)
     return
 
 
+def freeze(obj):
+    '''
+    Make all the arrays in a (nested) set of parameters read-only, in place. Read-only
+    arrays are shared rather than copied by fpu.dcp(), so e.g. the location data
+    tables can be shared by all the sims made from them. To change a frozen array,
+    replace it rather than modifying it in place.
+
+    **Example**::
+
+        pars = fpu.freeze(dict(rates=np.arange(5.0)))
+        pars['rates'] = pars['rates']*2 # Not pars['rates'] *= 2
+    '''
+    for arr in _find_arrays(obj):
+        if arr.dtype != object:
+            arr.flags.writeable = False
+    return obj
+
+
+def dcp(obj, die=True, share=None):
+    '''
+    Deep copy an object, as sc.dcp(), except that read-only arrays (see freeze()) are
+    shared by the copy rather than copied, as are any other objects listed in share.
+    '''
+    memo = {id(arr):arr for arr in _find_arrays(obj) if not arr.flags.writeable}
+    memo.update({id(item):item for item in sc.tolist(share)})
+    return sc.dcp(obj, die=die, memo=memo)
+
+
+def _find_arrays(obj):
+    ''' Find all the arrays in an object, including in dicts, lists, and the attributes of FPsim objects '''
+    arrays = []
+    seen = set()
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (str, int, float, bool, type(None))) or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, np.ndarray):
+            arrays.append(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set)):
+            stack.extend(obj)
+        elif type(obj).__module__.startswith('fpsim') and hasattr(obj, '__dict__'): # Sims, people, modules, etc
+            stack.extend(obj.__dict__.values())
+    return arrays
+
+
 def sample(dist='uniform', par1=0, par2=1, size=1, **kwargs):
     '''
     Draw a sample from the distribution specified by the input. The available
@@ -255,6 +368,35 @@ def sample(dist='uniform', par1=0, par2=1, size=1, **kwargs):
     return samples
 
 
+def sample_quantiles(u, dist='uniform', par1=0, par2=1):
+    '''
+    Transform uniform draws into samples from a distribution by inverting its CDF,
+    for the distributions used for durations of contraceptive use. Used instead of
+    ``sample()`` when draws come from counter-based random streams (see fpsim.rng),
+    so that each agent's value depends only on her own uniform draw.
+
+    Args:
+        u (array): uniform draws on [0, 1)
+        dist (str): the distribution, as in ``sample()``
+        par1 (float/array): the "main" distribution parameter
+        par2 (float/array): the "secondary" distribution parameter
+
+    **Example**::
+
+        durs = fpu.sample_quantiles(np.random.random(10), dist='gamma', par1=2, par2=3)
+    '''
+    if   dist in ['unif', 'uniform']: samples = par1 + u*(par2 - par1)
+    elif dist == 'lognormal_sps':     samples = sps.lognorm.ppf(u, s=par2, scale=par1, loc=0)
+    elif dist == 'gamma':             samples = sps.gamma.ppf(u, a=par1, scale=par2)
+    elif dist == 'llogis':            samples = sps.fisk.ppf(u, c=par1, scale=par2)
+    elif dist == 'weibull':           samples = sps.weibull_min.ppf(u, c=par1, scale=par2)
+    elif dist == 'exponential':       samples = sps.expon.ppf(u, scale=par1)
+    else:
+        errormsg = f'The distribution "{dist}" cannot be sampled from quantiles'
+        raise NotImplementedError(errormsg)
+    return samples
+
+
 def piecewise_linear(x, x0, y0, m1, m2):
     '''
     Compute a two-part piecewise linear function at given x values.
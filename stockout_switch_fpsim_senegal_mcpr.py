@@ -9,11 +9,6 @@ from fpsim.sim import Sim
 from fpsim.methods import StandardChoice, make_methods
 from stockout_switch_fpsim import StockoutSwitchFPsimIntervention
 
-# ✅ Make sure 'method' is tracked over time
-import fpsim.defaults as fpd
-if 'method' not in fpd.longitude_keys:
-    fpd.longitude_keys.append('method')
-
 # --- Helper to save agent-level data ---
 def save_agent_data(sim, filename, year=None):
     people = sim.people
@@ -39,24 +34,14 @@ def save_agent_data(sim, filename, year=None):
     df.to_csv(filename, index=False)
     print(f"Saved: {filename}")
 
-# --- Safe debug function using longitudinal history ---
+# --- Debug function using the method history of every agent ---
 def print_stocked_out_users(sim, label, years=range(2025, 2031)):
     print(f"\n[DEBUG] Checking for method 3/7 use during stockout years in: {label}")
-
-    try:
-        method_log = sim.people.longitude['method']
-    except KeyError:
-        print("  ❌ 'method' not found in longitude. Did you add it to fpd.longitude_keys before sim.run()?")
-        return
+    hist = sim.get_analyzer('history_recorder')
 
     for y in years:
         ti_index = int((y - sim['start_year']) * sim['tiperyear'])
-
-        if method_log.ndim != 2 or method_log.shape[1] <= ti_index:
-            print(f"  ⚠️ 'method' history not available at year {y} (ti_index={ti_index})")
-            continue
-
-        methods = method_log[:, ti_index]
+        _, methods = hist.state_at(ti_index, 'method')
         count_3 = np.sum(methods == 3)
         count_7 = np.sum(methods == 7)
         print(f"  Year {y}: {count_3} agents on method 3, {count_7} on method 7")
@@ -69,7 +54,8 @@ n_agents = 1000
 stockout_years = range(2025, 2031)
 
 def setup_sim(label, intervention=None):
-    sim = Sim(location=location, start_year=start_year, end_year=end_year, n_agents=n_agents, label=label)
+    sim = Sim(location=location, start_year=start_year, end_year=end_year, n_agents=n_agents, label=label,
+              analyzers=[fp.history_recorder(keys='method')])
     sim.pars['method_choice'] = StandardChoice(location=location)
     if intervention:
         sim['interventions'] = [intervention]
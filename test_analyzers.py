@@ -0,0 +1,143 @@
+# Run with: python -m unittest test_analyzers.py
+
+import os
+import pickle
+import unittest
+import tempfile
+import numpy as np
+import fpsim as fp
+
+
+class record_states(fp.Analyzer):
+    ''' Copy the states every timestep, as a reference '''
+    def __init__(self, keys):
+        super().__init__()
+        self.keys = keys
+        self.data = {}
+
+    def apply(self, sim):
+        self.data[sim.ti] = {key: sim.people[key].copy() for key in ['uid'] + self.keys}
+
+
+class TestHistoryRecorder(unittest.TestCase):
+    def test_matches_copies(self):
+        keys = ['method', 'pregnant']
+        for retire_age in [None, 55]: # Also with agents removed from the arrays
+            hist, ref = fp.history_recorder(keys=keys), record_states(keys)
+            fp.Sim(location='senegal', n_agents=500, start_year=2000, end_year=2010, retire_age=retire_age,
+                   analyzers=[hist, ref], verbose=0).run()
+            for ti, data in ref.data.items():
+                for key in keys:
+                    _, vals = hist.state_at(ti, key, uids=data['uid'])
+                    self.assertTrue(np.array_equal(vals, data[key]), (ti, key))
+            uid = ref.data[60]['uid'][3]
+            traj = hist.trajectory(uid, 'method')
+            for ti, data in ref.data.items():
+                if uid in data['uid']:
+                    self.assertEqual(traj[ti], data['method'][np.searchsorted(data['uid'], uid)])
+            self.assertLess(hist.n_changes['method'], 0.1*sum(len(data['uid']) for data in ref.data.values()))
+
+
+class count_states(fp.Analyzer):
+    ''' Count agents by scanning the whole population, as the analyzers used to '''
+    def __init__(self):
+        super().__init__()
+        self.data = {}
+
+    def apply(self, sim):
+        ppl = sim.people
+        women = ppl.alive & (ppl.sex == 0)
+        self.data[sim.ti] = dict(
+            cpr_1820 = np.count_nonzero(women & fp.utils.match_ages(ppl.age, 18, 20) & (ppl.method != 0)) / np.count_nonzero(women & fp.utils.match_ages(ppl.age, 18, 20)),
+            mix = np.bincount(ppl.method[women], minlength=len(sim.contraception_module.methods)),
+            pyramid = np.histogram(ppl.age[ppl.alive], np.arange(0, sim['max_age']+2))[0],
+            urban = np.count_nonzero(women & (ppl.age >= 15) & (ppl.age < 49) & ppl.urban),
+        )
+
+
+class TestGroupCounts(unittest.TestCase):
+    def test_matches_scans(self):
+        ref = count_states()
+        analyzers = [fp.cpr_by_age(), fp.method_mix_over_time(), fp.age_pyramids(), fp.state_tracker('urban', min_age=15, max_age=49), fp.method_mix_by_age(), ref]
+        sim = fp.Sim(location='senegal', n_agents=1000, start_year=2000, end_year=2010, analyzers=analyzers, verbose=0).run()
+        cpr, mix, pyramids, urban = [sim.get_analyzer(label) for label in ['cpr_by_age', 'method_mix_over_time', 'age_pyramids', 'state_tracker']]
+        for ti, data in ref.data.items():
+            self.assertEqual(cpr.results['18-20'][ti], data['cpr_1820'])
+            self.assertEqual([mix.results[m][ti] for m in mix.methods], list(data['mix']))
+            self.assertTrue(np.array_equal(pyramids._raw[ti], data['pyramid']))
+            self.assertEqual(urban.data_num[ti], data['urban'])
+        with self.assertRaises(ValueError):
+            sim.get_counts(age=(15.5, 20))
+
+        # method_mix_by_age counts at finalize, after the agents have aged since the last apply
+        ppl = sim.people
+        for key, (age_low, age_high) in fp.method_age_map.items():
+            women = ppl.alive & (ppl.sex == 0) & fp.utils.match_ages(ppl.age, age_low, age_high)
+            counts = np.bincount(ppl.method[women], minlength=len(sim.contraception_module.methods))
+            self.assertTrue(np.array_equal(sim.get_analyzer('method_mix_by_age').results[key], counts/counts.sum()), key)
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_selected(self):
+        women = lambda ppl: ppl.is_female & ppl.alive & (ppl.age >= 15) & (ppl.age < 50)
+        full = fp.snapshot(timesteps=[24, 60], label='full')
+        sel = fp.snapshot(timesteps=[24, 60], keys=['method', 'parity'], rows=women, label='sel')
+        fp.Sim(location='senegal', n_agents=500, start_year=2000, end_year=2010, analyzers=[full, sel], verbose=0).run()
+        for t in ['24', '60']:
+            ppl, snap = full.snapshots[t], sel.snapshots[t]
+            inds = np.nonzero(women(ppl))[0]
+            self.assertEqual(list(snap.keys()), ['uid', 'method', 'parity'])
+            for key in snap.keys():
+                self.assertTrue(np.array_equal(snap[key], ppl[key][inds]), (t, key))
+        with self.assertRaises(ValueError):
+            fp.snapshot(timesteps=[12], rows=women)
+
+
+class TestTrajectoryStore(unittest.TestCase):
+    def check_store(self, path):
+        store = fp.TrajectoryStore(['x', 'y', 'x'], path=path, chunk=2)
+        for ti in range(5): # Agents added over time, as in a sim
+            store.append(ti, dict(x=np.arange(ti+1) + 10*ti, y=np.ones(ti+1)))
+        self.assertEqual(store.keys, ['x', 'y'])
+        dense = np.array(store['x'])
+        self.assertEqual(dense.shape, (5, 5))
+        self.assertEqual(len(store.chunks), 3)
+        for ti in range(5):
+            self.assertTrue(np.array_equal(dense[ti, :ti+1], np.arange(ti+1) + 10*ti))
+            self.assertTrue(np.isnan(dense[ti, ti+1:]).all())
+        self.assertTrue(np.array_equal(store['x'][:, 2], dense[:, 2], equal_nan=True))
+        self.assertTrue(np.array_equal(store['x'][[1, 4], 1:], dense[[1, 4], 1:], equal_nan=True))
+        self.assertEqual(store['x'][-1, 3], 43)
+        with self.assertRaises(KeyError):
+            store['z']
+        return store
+
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.check_store(path)
+            self.assertEqual(len(os.listdir(path)), 1)
+
+    def test_in_memory(self):
+        ''' Without a path nothing is written to disk, and the recording is saved with the store '''
+        store = self.check_store(None)
+        self.assertIsNone(store.folder)
+        loaded = pickle.loads(pickle.dumps(store))
+        self.assertTrue(np.array_equal(np.array(loaded['x']), np.array(store['x']), equal_nan=True))
+
+    def test_lifeof_recorder(self):
+        keys = ['method', 'age', 'parity']
+        with tempfile.TemporaryDirectory() as path:
+            for rec_path in [None, path]:
+                rec, ref = fp.lifeof_recorder(path=rec_path, chunk=5), record_states(keys + ['sex'])
+                fp.Sim(location='senegal', n_agents=300, start_year=2000, end_year=2005, analyzers=[rec, ref], verbose=0).run()
+                self.assertEqual(list(rec.time), list(ref.data.keys()))
+                for key in keys:
+                    traj = np.array(rec.trajectories[key])
+                    for i, data in enumerate(ref.data.values()):
+                        vals = data[key][data['sex'] == 0]
+                        self.assertTrue(np.array_equal(traj[i, :len(vals)], vals), (rec_path, i, key))
+                        self.assertTrue(np.isnan(traj[i, len(vals):]).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
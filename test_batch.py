@@ -0,0 +1,67 @@
+# Run with: python -m unittest test_batch.py
+
+import unittest
+import sciris as sc
+import numpy as np
+import fpsim as fp
+
+kw = dict(location='senegal', n_agents=500, start_year=2000, end_year=2006, verbose=0)
+
+
+class TestBatchSim(unittest.TestCase):
+    def test_replicates(self):
+        bsim = fp.BatchSim(n_reps=10, seed=1, **kw).run()
+        self.assertEqual(len(bsim.sims), 10)
+        self.assertEqual(len(bsim.people), bsim.people.rep.size)
+        self.assertTrue(np.all(np.bincount(bsim.people.rep) > kw['n_agents'])) # Each replicate has grown
+        births = np.array([sim.results['births'] for sim in bsim.sims])
+        self.assertGreater(len(np.unique(births.sum(axis=1))), 1) # Replicates differ
+        self.assertTrue(np.allclose(bsim.results['births'], births.mean(axis=0)))
+
+        # Reproducible
+        again = fp.BatchSim(n_reps=10, seed=1, **kw).run()
+        self.assertTrue(np.array_equal(births, [sim.results['births'] for sim in again.sims]))
+
+        # Can be analyzed as a MultiSim
+        msim = bsim.to_multisim()
+        self.assertEqual(len(msim), 10)
+        self.assertIn('mcpr', msim.results)
+
+    def test_matches_separate_sims(self):
+        # Replicates should agree statistically with separate sims
+        bsim = fp.BatchSim(n_reps=20, seed=1, **kw).run()
+        sims = [fp.Sim(seed=i, **kw).run() for i in range(20)]
+        for key in ['pop_size', 'mcpr', 'births', 'pregnancies', 'deaths']:
+            batch = np.array([sim.results[key].sum() for sim in bsim.sims])
+            separate = np.array([sim.results[key].sum() for sim in sims])
+            sem = np.sqrt(batch.var()/len(batch) + separate.var()/len(separate))
+            self.assertLess(abs(batch.mean() - separate.mean()), 4*sem + 1e-9, key)
+
+    def test_independent_of_n_reps(self):
+        # Replicate k gives the same results however many replicates are run alongside it
+        two  = fp.BatchSim(n_reps=2, seed=1, **kw).run()
+        four = fp.BatchSim(n_reps=4, seed=1, **kw).run()
+        for k in range(2):
+            for key in ['pop_size', 'births', 'pregnancies', 'deaths', 'mcpr']:
+                self.assertTrue(np.array_equal(two.sims[k].results[key], four.sims[k].results[key]), f'Replicate {k}, {key}')
+
+    def test_timing(self):
+        # Record the speedup of a BatchSim over a loop of separate sims
+        n_reps = 10
+        T = sc.timer()
+        fp.BatchSim(n_reps=n_reps, seed=1, **kw).run()
+        t_batch = T.tt(output=True)
+        T = sc.timer()
+        for i in range(n_reps):
+            fp.Sim(seed=i, **kw).run()
+        t_loop = T.tt(output=True)
+        print(f'BatchSim: {t_batch:.2f} s; {n_reps} sims: {t_loop:.2f} s; speedup: {t_loop/t_batch:.1f}x')
+        self.assertLess(t_batch, t_loop)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            fp.BatchSim(n_reps=2, step_mode='compiled', **kw)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# Run with: python -m unittest test_cache.py
+
+import os
+import operator
+import tempfile
+import unittest
+import numpy as np
+import fpsim as fp
+
+
+def make_sim(**kwargs):
+    return fp.Sim(location='senegal', n_agents=500, start_year=2000, end_year=2005, verbose=0, **kwargs)
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = fp.ResultCache(self.folder.name)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_hash(self):
+        key = fp.hash_sim(make_sim(seed=1))
+        self.assertEqual(key, fp.hash_sim(make_sim(seed=1, label='other')))
+        self.assertNotEqual(key, fp.hash_sim(make_sim(seed=2)))
+        intv = fp.change_par(par='exposure_factor', years=2003, vals=0.0)
+        self.assertNotEqual(key, fp.hash_sim(make_sim(seed=1, interventions=intv)))
+
+    def test_functions(self):
+        def factory(val):
+            def set_exposure(sim):
+                if sim.y >= 2003:
+                    sim['exposure_factor'] = val
+            return set_exposure
+        keys = [fp.hash_sim(make_sim(seed=1, interventions=factory(val))) for val in [0.1, 5.0, 0.1]]
+        self.assertNotEqual(keys[0], keys[1]) # Captured values are part of the hash
+        self.assertEqual(keys[0], keys[2])
+        low, high = [make_sim(seed=1, interventions=factory(val)).run(cache=self.cache) for val in [0.1, 5.0]]
+        self.assertEqual(len(self.cache.files()), 2) # The second sim was run, not loaded
+        self.assertFalse(np.array_equal(low.results['births'], high.results['births']))
+
+        # Defaults and globals are too; callables that cannot be inspected are not cached
+        self.assertNotEqual(*[fp.hash_sim(make_sim(interventions=lambda sim, v=val: v)) for val in [1, 2]])
+        global threshold
+        keys = []
+        for threshold in [1, 2]:
+            keys.append(fp.hash_sim(make_sim(interventions=lambda sim: threshold)))
+        self.assertNotEqual(*keys)
+        rngs = [fp.hash_sim(make_sim(interventions=np.random.default_rng(seed).random)) for seed in [1, 2]]
+        self.assertNotEqual(*rngs) # Random number generators by their state
+        sim = make_sim(interventions=operator.itemgetter(0))
+        with self.assertRaises(TypeError):
+            fp.hash_sim(sim)
+        self.assertIsNone(fp.hash_sim(sim, die=False))
+
+    def test_hit(self):
+        ref = make_sim(seed=1).run(cache=self.cache)
+        self.assertEqual(len(self.cache.files()), 1)
+        self.assertIsNotNone(ref.people) # The sim itself keeps its people
+        sim = make_sim(seed=1, label='again').run(cache=self.cache)
+        self.assertTrue(sim.already_run)
+        self.assertIsNone(sim.people)
+        self.assertEqual(sim.label, 'again')
+        for key in ['births', 'mcpr', 'pop_size']:
+            self.assertTrue(np.array_equal(ref.results[key], sim.results[key]))
+
+        # MultiSims share the cache
+        msim = fp.MultiSim([make_sim(seed=1), make_sim(seed=2)]).run(serial=True, cache=self.cache)
+        self.assertEqual(len(self.cache.files()), 2)
+        self.assertTrue(np.array_equal(ref.results['births'], msim.sims[0].results['births']))
+
+    def test_evict(self):
+        for seed in range(3):
+            make_sim(seed=seed).run(cache=self.cache)
+        first = self.cache.path(fp.hash_sim(make_sim(seed=0)))
+        make_sim(seed=0).run(cache=self.cache) # Now the most recently used
+        self.cache.max_size = self.cache.size - 1
+        self.cache.evict()
+        self.assertEqual(len(self.cache.files()), 2)
+        self.assertTrue(os.path.exists(first))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# Run with: python -m unittest test_checkpoint.py
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import fpsim as fp
+
+keys = ['births', 'deaths', 'pregnancies', 'mcpr', 'pop_size', 'tfr_rates']
+
+
+def make_sim(**kwargs):
+    return fp.Sim(location='senegal', n_agents=1000, start_year=2000, end_year=2010, seed=3, verbose=0, **kwargs)
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'burnin.ckpt')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_continue_matches_uninterrupted(self):
+        for rng in ['global', 'streams']:
+            ref = make_sim(rng=rng).run()
+            make_sim(rng=rng).save_checkpoint(self.path, at_year=2005)
+            np.random.random(10) # Should not affect the continued sim
+            sim = fp.Sim.from_checkpoint(self.path).run()
+            for key in keys:
+                self.assertTrue(np.array_equal(ref.results[key], sim.results[key]), f"Results for '{key}' differ ({rng})")
+
+    def test_run_until(self):
+        ref = make_sim().run()
+        sim = make_sim().run(until=2004)
+        self.assertFalse(sim.already_run)
+        sim.run()
+        self.assertTrue(np.array_equal(ref.results['births'], sim.results['births']))
+        with self.assertRaises(RuntimeError):
+            sim.save_checkpoint(self.path)
+
+    def test_continuations(self):
+        make_sim().save_checkpoint(self.path, at_year=2005)
+        intv = fp.change_par(par='exposure_factor', years=2006, vals=0.0)
+        sims = [fp.Sim.from_checkpoint(self.path, end_year=2012, interventions=intv, seed=i).run() for i in range(2)]
+        for sim in sims:
+            self.assertEqual(len(sim.results['births']), sim.npts)
+            self.assertEqual(sim.results['tfr_years'][-1], 2011)
+        self.assertTrue(np.array_equal(sims[0].results['births'][:60], sims[1].results['births'][:60])) # Shared burn-in
+        self.assertFalse(np.array_equal(sims[0].results['births'], sims[1].results['births'])) # Different seeds
+        self.assertEqual(sims[0].results['births'][-12:].sum(), 0) # No exposure after the intervention
+        with self.assertRaises(ValueError):
+            fp.Sim.from_checkpoint(self.path, end_year=2004)
+
+
+class TestFork(unittest.TestCase):
+    def test_branches_match_separate_runs(self):
+        intv = lambda: fp.change_par(par='exposure_factor', years=2006, vals=0.0)
+        refs = [make_sim().run(), make_sim(interventions=intv()).run()]
+        sim = make_sim()
+        sims = sim.fork(dict(baseline=None, no_exposure=intv()), year=2005)
+        self.assertEqual([s.label for s in sims], ['baseline', 'no_exposure'])
+        self.assertIs(sims[0]['age_mortality'], sims[1]['age_mortality']) # Location data are shared
+        self.assertFalse(np.shares_memory(sims[0].people.age, sims[1].people.age)) # The people are not
+        msim = fp.parallel(sims, serial=True) # Processes could deadlock after the threaded step mode in other tests
+        for ref, branch in zip(refs, msim.sims):
+            for key in keys:
+                self.assertTrue(np.array_equal(ref.results[key], branch.results[key]), f"Results for '{key}' differ ({branch.label})")
+
+        # The original sim can still be continued, or forked again into replicates
+        replicates = sim.fork(2)
+        self.assertEqual([s['seed'] for s in replicates], [4, 5])
+        sim.run()
+        self.assertTrue(np.array_equal(refs[0].results['births'], sim.results['births']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+# Run with: python -m unittest test_cohort.py
+
+import unittest
+import numpy as np
+import fpsim as fp
+
+kw = dict(location='senegal', start_year=2020, end_year=2030, verbose=0)
+
+
+class TestCohortModel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cohort = fp.CohortModel(fp.Sim(n_agents=3000, **kw))
+
+    def test_matches_sims(self):
+        res = self.cohort.run()
+        self.assertTrue(np.allclose(res.method_mix.sum(axis=1), 1))
+        sims = [fp.Sim(n_agents=2000, seed=i, **kw).run() for i in range(3)]
+        mcpr = np.mean([sim.results['mcpr'] for sim in sims], axis=0)
+        self.assertLess(np.abs(res.mcpr - mcpr).max(), 0.05)
+
+    def test_stockouts(self):
+        baseline = self.cohort.run()
+        stockouts = {2025: {3: 0.5}} # Injectables
+        stopped = self.cohort.run(stockouts=stockouts)
+        switched = self.cohort.run(stockouts=stockouts, switch=True)
+        ti = np.searchsorted(baseline.t, 2025.9)
+        self.assertTrue(np.allclose(baseline.mcpr[:60], stopped.mcpr[:60]))
+        self.assertLess(stopped.method_mix[ti, 3], baseline.method_mix[ti, 3]/4)
+        self.assertLess(stopped.mcpr[ti], switched.mcpr[ti])
+        self.assertLess(switched.mcpr[ti], baseline.mcpr[ti])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# Run with: python -m unittest test_data_cache.py
+
+import os
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+import sciris as sc
+import fpsim as fp
+from fpsim.locations import data_utils as fpld
+
+
+def assert_same(testcase, a, b, key=''):
+    """ Recursively compare two sets of parameters """
+    if isinstance(a, dict):
+        testcase.assertEqual(list(a.keys()), list(b.keys()), key)
+        for k in a.keys():
+            assert_same(testcase, a[k], b[k], f'{key}.{k}')
+    elif isinstance(a, np.ndarray):
+        testcase.assertTrue(np.array_equal(a, b, equal_nan=a.dtype.kind == 'f'), key)
+    elif isinstance(a, pd.DataFrame):
+        testcase.assertTrue(a.equals(b), key)
+    else:
+        testcase.assertEqual(a, b, key)
+
+
+class TestDataCache(unittest.TestCase):
+    def test_cached_matches_uncached(self):
+        with fp.options.context(data_cache=False):
+            ref = fp.pars(location='kenya')
+            ref_methods = fp.StandardChoice(location='kenya')
+        fpld.clear_bundles()
+        for i in range(2): # First from disk or newly processed, then from memory
+            pars = fp.pars(location='kenya')
+            methods = fp.StandardChoice(location='kenya')
+            assert_same(self, ref, pars)
+            assert_same(self, ref_methods.contra_use_pars, methods.contra_use_pars)
+            assert_same(self, ref_methods.method_choice_pars, methods.method_choice_pars)
+            for m1, m2 in zip(ref_methods.methods.values(), methods.methods.values()):
+                assert_same(self, m1.dur_use, m2.dur_use)
+
+    def test_copies_and_invalidation(self):
+        fpld.miscarriage()
+        folder = sc.path(fpld.sd_dir)
+
+        # The arrays are shared and read-only, but replacing them does not modify the cache
+        with self.assertRaises(ValueError):
+            fpld.miscarriage()[:] = -1
+        pars = fpld.age_mortality('kenya', data_year=1990)
+        pars['f'] = pars['f']*0 - 1
+        self.assertTrue(np.all(fpld.age_mortality('kenya', data_year=1990)['f'] >= 0))
+
+        # A file that has only been touched keeps the bundle; one whose contents have changed clears it
+        bundle = fpld.get_bundle(folder)
+        path = list(bundle.files.keys())[0]
+        mtime, size, sha = bundle.files[path]
+        bundle.files[path] = (mtime - 1, size, sha)
+        bundle.checked = 0 # Otherwise only checked once a second
+        self.assertTrue(len(fpld.get_bundle(folder).data))
+        bundle.files[path] = (mtime - 1, size, 'changed')
+        bundle.checked = 0
+        self.assertFalse(len(fpld.get_bundle(folder).data))
+
+    def test_bundle_header(self):
+        fpld.miscarriage() # Make sure the bundle file exists
+        path = sc.path(fpld.sd_dir) / fpld.bundle_filename
+        with open(path, 'rb') as f:
+            header, data = f.readline(), f.read()
+        self.assertEqual(header, fpld.bundle_header())
+
+        # A bundle file from another version is discarded, and replaced on next use
+        for stale in [header.replace(b'fpsim-bundle 1', b'fpsim-bundle 0'), b'']:
+            with open(path, 'wb') as f:
+                f.write(stale + data)
+            fpld.clear_bundles()
+            self.assertFalse(len(fpld.get_bundle(sc.path(fpld.sd_dir)).data))
+        fpld.miscarriage()
+        fpld.clear_bundles()
+        self.assertTrue(len(fpld.get_bundle(sc.path(fpld.sd_dir)).data))
+
+    def test_env_setting(self):
+        for val, expected in [('False', False), ('no', False), ('0', False), ('Yes', True), ('1', True), (None, True)]:
+            with mock.patch.dict(os.environ, {} if val is None else dict(FPSIM_DATA_CACHE=val)):
+                if val is None:
+                    os.environ.pop('FPSIM_DATA_CACHE', None)
+                self.assertIs(fp.settings.env_bool('FPSIM_DATA_CACHE', True), expected)
+        with mock.patch.dict(os.environ, dict(FPSIM_DATA_CACHE='maybe')):
+            with self.assertRaises(ValueError):
+                fp.settings.env_bool('FPSIM_DATA_CACHE', True)
+
+
+class TestSharedPars(unittest.TestCase):
+    def test_sims_share_location_data(self):
+        pars = fp.pars(location='senegal', n_agents=100)
+        sims = [fp.Sim(pars=pars, seed=i) for i in range(2)]
+        mort = [sim['age_mortality']['f'] for sim in sims]
+        self.assertIs(mort[0], mort[1])
+        self.assertIs(mort[0], pars['age_mortality']['f'])
+        with self.assertRaises(ValueError):
+            mort[0][0] = 1.0
+
+        # Replacing a table in one sim does not affect the others
+        sims[0]['age_mortality']['f'] = mort[0]*2
+        self.assertIs(sims[1]['age_mortality']['f'], mort[1])
+
+    def test_dcp(self):
+        obj = dict(shared=fp.utils.freeze(np.arange(3.0)), own=np.arange(3.0), nested=[dict(x=np.ones(2))])
+        fp.utils.freeze(obj['nested'])
+        copy = fp.utils.dcp(obj)
+        self.assertIs(copy['shared'], obj['shared'])
+        self.assertIs(copy['nested'][0]['x'], obj['nested'][0]['x'])
+        self.assertIsNot(copy['own'], obj['own'])
+        self.assertIsNot(copy['nested'][0], obj['nested'][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
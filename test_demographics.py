@@ -0,0 +1,59 @@
+# Run with: python -m unittest test_demographics.py
+
+import unittest
+import numpy as np
+import fpsim as fp
+from fpsim import demographics as fpdmg
+
+kw = dict(location='kenya', n_agents=3000, start_year=2000, end_year=2015, verbose=0)
+
+
+class TestAgeSexCounts(unittest.TestCase):
+    def test_ageing(self):
+        agg = fpdmg.AgeSexCounts(max_age=2)
+        agg.add([0, 1.99], sex=1, n=2)
+        self.assertEqual(agg.n, 4)
+        for i in range(24):
+            agg.step_age(1)
+        self.assertEqual(agg.n, 4) # No one is lost at the maximum age
+        self.assertEqual(agg.counts[1, -1], 4)
+
+
+class TestFemaleOnly(unittest.TestCase):
+    def test_matches_full(self):
+        full = [fp.Sim(seed=i, **kw).run() for i in range(3)]
+        female = [fp.Sim(seed=i, female_only=True, **kw).run() for i in range(3)]
+        for sim in female:
+            self.assertFalse(sim.people.is_male.any())
+            self.assertLess(len(sim.people), 0.6*len(full[0].people))
+        for key in ['pop_size', 'births']:
+            ref = np.mean([np.sum(sim.results[key]) for sim in full])
+            val = np.mean([np.sum(sim.results[key]) for sim in female])
+            self.assertLess(abs(val/ref - 1), 0.05, key)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            fp.Sim(female_only=True, track_children=True, **kw).initialize()
+        with self.assertRaises(ValueError):
+            fp.BatchSim(female_only=True, n_reps=2, **kw)
+
+
+class TestRetirement(unittest.TestCase):
+    def test_matches_full(self):
+        full = [fp.Sim(seed=i, **kw).run() for i in range(3)]
+        retired = [fp.Sim(seed=i, retire_age=55, **kw).run() for i in range(3)]
+        for sim in retired:
+            self.assertLess(sim.people.age[sim.people.alive].max(), 56)
+            self.assertGreater(sim.aggregate.n, 0)
+        for key in ['pop_size', 'deaths']:
+            ref = np.mean([np.sum(sim.results[key]) for sim in full])
+            val = np.mean([np.sum(sim.results[key]) for sim in retired])
+            self.assertLess(abs(val/ref - 1), 0.05, key)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            fp.Sim(retire_age=40, **kw).initialize()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+# Run with: python -m unittest test_events.py
+
+import unittest
+import numpy as np
+import fpsim as fp
+
+kw = dict(location='kenya', n_agents=2000, start_year=1990, end_year=2010, seed=2, verbose=0)
+
+
+class TestEventLog(unittest.TestCase):
+    def test_ages(self):
+        log = fp.EventLog(capacity=2)
+        log.append([5, 3], 'birth', [20, 25], ti=0)
+        log.append([5], 'abortion', [21], ti=12)
+        log.append([5, 7], 'birth', [22, 30], ti=24)
+        self.assertEqual(len(log), 5)
+        self.assertEqual(list(log.get(5).kind), ['birth', 'abortion', 'birth'])
+        ages = log.ages([7, 5, 4], 'birth', ncols=3)
+        self.assertTrue(np.array_equal(ages, [[30, np.nan, np.nan], [20, 22, np.nan], [np.nan]*3], equal_nan=True))
+
+    def test_matches_matrices(self):
+        ''' Results are unchanged, and the matrices can be rebuilt from the log '''
+        ref = fp.Sim(step_mode='compiled', **kw).run()
+        sim = fp.Sim(step_mode='compiled', event_log=True, **kw).run()
+        self.assertEqual(sim.people.birth_ages.shape[1], 0)
+        for key in ['births', 'short_intervals', 'miscarriages', 'abortions', 'mcpr']:
+            self.assertTrue(np.array_equal(ref.results[key], sim.results[key]), key)
+        for key in ['birth_ages', 'miscarriage_ages', 'abortion_ages']:
+            self.assertTrue(np.array_equal(ref.people[key], sim.people.event_ages(key), equal_nan=True), key)
+
+    def test_python_mode(self):
+        ''' Storing events in the log doesn't change the results of the python step either '''
+        ref = fp.Sim(step_mode='python', **kw).run()
+        sim = fp.Sim(step_mode='python', event_log=True, **kw).run()
+        for key in ['births', 'short_intervals', 'stillbirths', 'miscarriages', 'abortions', 'deaths', 'mcpr']:
+            self.assertTrue(np.array_equal(ref.results[key], sim.results[key]), key)
+        for key in ['birth_ages', 'miscarriage_ages', 'abortion_ages']:
+            self.assertTrue(np.array_equal(ref.people[key], sim.people.event_ages(key), equal_nan=True), key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# Run with: python -m unittest test_import_time.py
+
+import sys
+import subprocess
+import unittest
+import fpsim as fp
+
+slow_modules = ['starsim', 'optuna', 'seaborn', 'pylab', 'fpsim.calibration', 'fpsim.experiment', 'fpsim.scenarios']
+lazy_modules = ['fpsim.experiment', 'fpsim.calibration', 'fpsim.scenarios']
+max_import_time = 3.0 # Seconds; loose, since machines vary: about 1.6 s here, and 3.5 s before slow modules were loaded lazily
+
+script = f'''
+import sys
+import fpsim as fp
+sim = fp.Sim(location='senegal', n_agents=100)
+print(','.join(m for m in {slow_modules} if m in sys.modules))
+fp.Experiment, fp.Calibration, fp.scenarios
+print(','.join(m for m in {lazy_modules} if m in sys.modules))
+'''
+
+timing_script = '''
+import time
+start = time.perf_counter()
+import fpsim
+print(time.perf_counter() - start)
+'''
+
+
+class TestImportTime(unittest.TestCase):
+    def test_import_is_lazy(self):
+        # Run in a fresh interpreter, so nothing is already imported
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout.split('\n')
+        self.assertEqual(output[0], '', f'Modules should not be loaded by "import fpsim; fp.Sim()": {output[0]}')
+        self.assertEqual(output[1], ','.join(lazy_modules), 'Lazy modules should be loaded on first attribute access')
+
+    def test_import_time(self):
+        # Time the import in a fresh interpreter, taking the best of a few runs
+        times = []
+        for i in range(3):
+            output = subprocess.run([sys.executable, '-c', timing_script], capture_output=True, text=True, check=True).stdout
+            times.append(float(output))
+        print(f'\nimport fpsim: {min(times):.2f} s')
+        self.assertLess(min(times), max_import_time)
+
+    def test_lazy_names(self):
+        # Lazily loaded modules and the names they define are still available
+        self.assertIs(fp.Scenarios, fp.scenarios.Scenarios)
+        self.assertIs(fp.Calibration, fp.calibration.Calibration)
+        self.assertTrue(callable(fp.compute_gof))
+        self.assertIn('Experiment', dir(fp))
+        with self.assertRaises(AttributeError):
+            fp.not_a_real_attribute
+
+
+if __name__ == '__main__':
+    unittest.main()
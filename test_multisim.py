@@ -0,0 +1,78 @@
+# Run with: python -m unittest test_multisim.py
+
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+import fpsim as fp
+
+
+def make_sims(n=3, analyzer=False):
+    return [fp.Sim(location='senegal', n_agents=300, start_year=2000, end_year=2004, seed=i, verbose=0,
+                   analyzers=fp.snapshot(timesteps=[12]) if analyzer else None) for i in range(n)]
+
+
+class TestTransport(unittest.TestCase):
+    def test_keep_people(self):
+        full = fp.MultiSim(make_sims()).run(serial=True)
+        small = fp.MultiSim(make_sims()).run(serial=True, keep_people=False)
+        for s1, s2 in zip(full.sims, small.sims):
+            self.assertIsNotNone(s1.people)
+            self.assertIsNone(s2.people)
+            self.assertTrue(np.array_equal(s1.results['pop_size'], s2.results['pop_size']))
+        self.assertLess(len(pickle.dumps(small.sims)), len(pickle.dumps(full.sims))/5)
+        for key in ['mcpr', 'births']:
+            self.assertTrue(np.array_equal(full.results[key].best, small.results[key].best))
+
+    def test_keep_analyzers(self):
+        msim = fp.MultiSim(make_sims(analyzer=True)).run(serial=True, keep_people=False)
+        self.assertIsInstance(msim.sims[0]['analyzers'], fp.snapshot)
+        msim = fp.MultiSim(make_sims(analyzer=True)).run(serial=True, keep_people=False, keep_analyzers=['other'])
+        self.assertEqual(msim.sims[0]['analyzers'], [])
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as folder:
+            ref = fp.MultiSim(make_sims()).run(serial=True)
+            fp.MultiSim(make_sims()).run(serial=True, folder=folder, verbose=False)
+            files = sorted(os.listdir(folder))
+            self.assertEqual(len(files), 3)
+            os.remove(os.path.join(folder, files[1]))
+            mtime = os.path.getmtime(os.path.join(folder, files[0]))
+            msim = fp.MultiSim(make_sims()).run(serial=True, folder=folder, verbose=False)
+            self.assertEqual(os.path.getmtime(os.path.join(folder, files[0])), mtime) # Not rerun
+            for s1, s2 in zip(ref.sims, msim.sims):
+                self.assertTrue(np.array_equal(s1.results['births'], s2.results['births']))
+
+            # Changing the parameters of a sim reruns it, rather than loading the stale file
+            sims = make_sims()
+            sims[2]['n_agents'] = 400
+            msim = fp.MultiSim(sims).run(serial=True, folder=folder, verbose=False)
+            self.assertEqual(len(os.listdir(folder)), 4)
+            self.assertEqual(msim.sims[2]['n_agents'], 400)
+
+
+class TestStreamingStats(unittest.TestCase):
+    def test_matches_exact(self):
+        exact = fp.MultiSim(make_sims()).run(serial=True)
+        streamed = fp.MultiSim(make_sims()).run(serial=True, keep_sims=False)
+        self.assertEqual(len(streamed), 0)
+        for key in ['mcpr', 'births', 'pop_size', 'tfr_rates']:
+            for bound in ['best', 'low', 'high']:
+                self.assertTrue(np.allclose(exact.results[key][bound], streamed.results[key][bound]), f'{key}.{bound}')
+
+        exact.compute_stats(use_mean=True, bounds=2)
+        streamed = fp.MultiSim(make_sims()).run(serial=True, keep_sims=False, compute_stats=dict(use_mean=True, bounds=2))
+        for bound in ['best', 'low', 'high']:
+            self.assertTrue(np.allclose(exact.results['mcpr'][bound], streamed.results['mcpr'][bound]))
+
+    def test_quantile_estimates(self):
+        values = np.random.default_rng(1).normal(size=(2000, 20))
+        for q in [0.1, 0.5, 0.9]:
+            est = fp.P2Quantile(q)
+            for x in values:
+                est.add(x)
+            self.assertLess(np.abs(est.value - np.quantile(values, q, axis=0)).max(), 0.15)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# Run with: python -m unittest test_people_step.py
+
+import unittest
+import numba
+import numpy as np
+from fpsim.sim import Sim
+from fpsim.parameters import pars
+from fpsim.people import ActiveSets
+
+
+def run_mode(step_mode, seeds=(1, 2, 3), n_agents=5000):
+    """ Run one sim per seed in a given step mode and return the pooled totals """
+    keys = ['births', 'deaths', 'pregnancies', 'miscarriages', 'stillbirths']
+    totals = {key: 0.0 for key in keys + ['pop_size', 'mcpr']}
+    for seed in seeds:
+        p = pars(location="senegal", start_year=2000, end_year=2010, n_agents=n_agents, seed=seed, step_mode=step_mode)
+        sim = Sim(pars=p).run()
+        for key in keys:
+            totals[key] += np.sum(sim.results[key])
+        totals['pop_size'] += sim.results['pop_size'][-1]
+        totals['mcpr'] += np.mean(sim.results['mcpr'][-12:]) / len(seeds)
+    return sim, totals
+
+
+class TestActiveSets(unittest.TestCase):
+    def test_active_sets_match_full_scan(self):
+        # Step a small sim by hand and compare the maintained sets to a rebuild every month
+        p = pars(location="senegal", start_year=2000, end_year=2004, n_agents=1000, seed=1)
+        sim = Sim(pars=p)
+        sim.initialize()
+        for ti in range(sim.npts):
+            sim.ti = ti
+            sim.step()
+            ref = ActiveSets(sim.people)
+            for key in ActiveSets.keys:
+                self.assertTrue(np.array_equal(ref.inds(key), sim.people.active_inds(key)), f"Set '{key}' out of sync at ti={ti}")
+
+    def test_direct_writes(self):
+        # Ages and sexes written out of order, and agents removed, must keep the sets (and the ageing queue) in sync
+        p = pars(location="senegal", start_year=2000, end_year=2003, n_agents=1000, seed=1, retire_age=60)
+        sim = Sim(pars=p)
+        sim.initialize()
+        limit = sim['age_limit_fecundity']
+        for ti in range(sim.npts):
+            sim.ti = ti
+            sim.step()
+            ppl = sim.people.filter(sim.people.alive)
+            if ti % 6 == 0:
+                older = ppl.filter(ppl.age < 10)
+                older.age = limit - 0.01 + 0.005*np.arange(len(older)) % 0.02  # Just below or above the limit
+            elif ti % 6 == 3:
+                younger = ppl.filter(ppl.age > limit)
+                younger.age = 20.0
+                men = ppl.filter(ppl.sex == 1)
+                men.filter(men.age < 30).sex = 0
+            ref = ActiveSets(sim.people)
+            for key in ActiveSets.keys:
+                self.assertTrue(np.array_equal(ref.inds(key), sim.people.active_inds(key)), f"Set '{key}' out of sync at ti={ti}")
+
+
+class TestLongitudinalBuffer(unittest.TestCase):
+    def test_lags_match_copies(self):
+        # Step a sim by hand, keeping a copy of the method each month, and look it up at several lags
+        p = pars(location="senegal", start_year=2000, end_year=2004, n_agents=1000, seed=1, longitude={'method': 24})
+        sim = Sim(pars=p)
+        sim.initialize()
+        history = sim.people.longitude['method']
+        self.assertTrue(np.all(history.base == sim.people.method[0])) # History starts out as the first agent's value
+        copies = {}
+        for ti in range(sim.npts):
+            sim.ti = ti
+            sim.step()
+            copies[ti] = sim.people.method.copy()
+            for lag in [1, 6, 24]:
+                if ti - lag in copies:
+                    ref = copies[ti - lag]
+                    vals = sim.people.get_longitudinal_state('method', lag=lag)
+                    self.assertTrue(np.array_equal(vals[:len(ref)], ref), f'Lag {lag} wrong at ti={ti}')
+        self.assertEqual(list(sim.people.longitude.keys()), ['method'])
+
+
+class TestCompiledStep(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.ref_sim, cls.ref = run_mode('python')
+        cls.comp_sim, cls.comp = run_mode('compiled')
+
+    def test_totals_match_reference(self):
+        # Draws happen in a different order, so compare pooled totals within sampling noise
+        for key, rtol in dict(births=0.08, deaths=0.12, pregnancies=0.08, miscarriages=0.15, pop_size=0.02).items():
+            ref, comp = self.ref[key], self.comp[key]
+            self.assertLess(abs(comp - ref) / ref, rtol, f"{key}: compiled {comp} vs reference {ref}")
+        self.assertLess(abs(self.comp['mcpr'] - self.ref['mcpr']), 0.02)
+
+    def test_state_invariants(self):
+        ppl = self.comp_sim.people
+        self.assertFalse(np.any(ppl.pregnant & ~ppl.alive), "Dead agents should not be pregnant")
+        self.assertFalse(np.any(ppl.pregnant & (ppl.sex == 1)), "Male agents should not be pregnant")
+        self.assertFalse(np.any(ppl.pregnant & ppl.on_contra), "Pregnant agents should not be using contraception")
+        self.assertTrue(np.all(ppl.gestation[ppl.pregnant] <= ppl.preg_dur[ppl.pregnant]))
+        self.assertTrue(np.all(ppl.first_birth_age[ppl.parity > 0] >= 0), "Agents with live births should have an age at first birth")
+        for key in ActiveSets.keys:
+            self.assertTrue(np.array_equal(ActiveSets(ppl).inds(key), ppl.active_inds(key)))
+
+    def test_parallel_matches_compiled(self):
+        # Chunks and their random streams do not depend on the number of threads, so the results are identical
+        max_threads = numba.config.NUMBA_NUM_THREADS # At most this many threads can be used
+        orig_threads = numba.get_num_threads()
+        sims = []
+        try:
+            for step_mode, threads in [('compiled', max_threads), ('parallel', 1), ('parallel', max_threads)]:
+                numba.set_num_threads(threads)
+                p = pars(location="senegal", start_year=2000, end_year=2004, n_agents=20000, seed=4, step_mode=step_mode)
+                sims.append(Sim(pars=p).run())
+        finally:
+            numba.set_num_threads(orig_threads)
+        for sim in sims[1:]:
+            for key in ['births', 'deaths', 'pregnancies', 'pop_size', 'mcpr']:
+                self.assertTrue(np.array_equal(sims[0].results[key], sim.results[key]), f"Results for '{key}' differ")
+            self.assertTrue(np.array_equal(sims[0].people.method, sim.people.method))
+
+
+class TestStepMode(unittest.TestCase):
+    def test_invalid(self):
+        for kwargs in [dict(step_mode='complied'), dict(step_mode='compiled', rng='streams'), dict(step_mode='parallel', rng='streams')]:
+            with self.assertRaises(ValueError, msg=str(kwargs)):
+                Sim(pars=pars(location="senegal", n_agents=100, **kwargs)).initialize()
+
+
+if __name__ == '__main__':
+    unittest.main()
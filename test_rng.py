@@ -0,0 +1,74 @@
+# Run with: python -m unittest test_rng.py
+
+import time
+import unittest
+import numpy as np
+import fpsim as fp
+from fpsim.sim import Sim
+from fpsim.parameters import pars
+
+
+class global_draws(fp.Analyzer):
+    """ Analyzer that consumes draws from the global random state every timestep """
+    def apply(self, sim):
+        np.random.random(17)
+
+
+class TestStreams(unittest.TestCase):
+    def test_draws_keyed_by_uid(self):
+        streams = fp.Streams(seed=3)
+        u_all = streams.random('death', 5, np.arange(100))
+        u_some = streams.random('death', 5, np.array([7, 42, 99]))
+        self.assertTrue(np.array_equal(u_all[[7, 42, 99]], u_some))
+        self.assertFalse(np.array_equal(u_all, streams.random('death', 6, np.arange(100))))
+        self.assertFalse(np.array_equal(u_all, streams.random('conception', 5, np.arange(100))))
+        self.assertFalse(np.array_equal(u_all, fp.Streams(seed=4).random('death', 5, np.arange(100))))
+
+    def test_cost_independent_of_uids(self):
+        # Draws are hashed per uid, so large uids don't make a few draws expensive
+        streams = fp.Streams(seed=3)
+        u = streams.random('death', 5, np.array([7, 10**15]))
+        self.assertEqual(u[0], streams.random('death', 5, np.array([7]))[0])
+        self.assertTrue(((u >= 0) & (u < 1)).all())
+        u = streams.random('death', 5, np.arange(100_000))
+        self.assertAlmostEqual(u.mean(), 0.5, delta=0.01)
+
+    def test_bit_generators(self):
+        # Population-level generators are reproducible and differ by bit generator
+        draws = {}
+        for bit_generator in ['philox', 'pcg64']:
+            a, b = [fp.Streams(seed=3, bit_generator=bit_generator).generator('births', 5).random(10) for _ in range(2)]
+            self.assertTrue(np.array_equal(a, b))
+            draws[bit_generator] = a
+        self.assertFalse(np.array_equal(draws['philox'], draws['pcg64']))
+        with self.assertRaises(ValueError):
+            fp.Streams(bit_generator='mt19937')
+
+    def test_common_random_numbers(self):
+        # Extra draws from the global state should not change a sim that uses random streams
+        sims = []
+        for analyzers in [None, [global_draws()]]:
+            p = pars(location="senegal", start_year=2000, end_year=2004, n_agents=1000, seed=7, rng='streams')
+            sims.append(Sim(pars=p, analyzers=analyzers).run())
+        for key in ['births', 'deaths', 'pregnancies', 'mcpr', 'pop_size']:
+            self.assertTrue(np.array_equal(sims[0].results[key], sims[1].results[key]), f"Results for '{key}' differ")
+
+
+class TestSetSeed(unittest.TestCase):
+    def test_set_seed_is_cheap_and_reproducible(self):
+        fp.set_seed(1) # Load or compile once
+        start = time.perf_counter()
+        for seed in range(100):
+            fp.set_seed(seed)
+        self.assertLess(time.perf_counter() - start, 0.1, "set_seed should not recompile on each call")
+
+        draws = []
+        for _ in range(2):
+            fp.set_seed(5)
+            draws.append((np.random.random(3), fp.utils.n_multinomial(np.ones(4)/4, 10)))
+        self.assertTrue(np.array_equal(draws[0][0], draws[1][0]))
+        self.assertTrue(np.array_equal(draws[0][1], draws[1][1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
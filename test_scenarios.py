@@ -0,0 +1,50 @@
+# Run with: python -m unittest test_scenarios.py
+
+import unittest
+import numpy as np
+import fpsim as fp
+
+
+def make_scens():
+    baseline = fp.make_scen(label='Baseline')
+    low_exposure = fp.make_scen(label='Low exposure', par='exposure_factor', par_years=2002, par_vals=0.5)
+    return fp.Scenarios(location='senegal', n_agents=300, start_year=2000, end_year=2005, verbose=0, scens=[baseline, low_exposure])
+
+
+class TestAdaptive(unittest.TestCase):
+    def test_stops_at_precision(self):
+        contrasts = dict(births=('Baseline', 'Low exposure', 'births'))
+        scens = make_scens()
+        scens.run_adaptive(contrasts, precision=1e6, batch=3, max_repeats=12, serial=True, verbose=False)
+        self.assertEqual(scens.repeats, 3) # Precise enough after the first batch
+        self.assertEqual(len(scens.msim.sims), 6)
+        c = scens.contrasts.births
+        self.assertGreater(c.mean, 0) # Fewer births with less exposure
+        self.assertTrue(c.low < c.mean < c.high)
+
+        # Paired seeds: the same as the sims of a fixed number of repeats
+        scens.run_adaptive(contrasts, precision=0, batch=3, max_repeats=5, serial=True, verbose=False)
+        self.assertEqual(scens.repeats, 5)
+        self.assertEqual(scens.contrasts.births.n, 5)
+        fixed = make_scens()
+        fixed.repeats = 5
+        fixed.run(serial=True)
+        births = lambda s: [sim.results['births'].sum() for sim in s.msim.sims]
+        self.assertTrue(np.array_equal(births(scens), births(fixed)))
+
+    def test_bad_label(self):
+        with self.assertRaises(ValueError):
+            make_scens().run_adaptive(dict(x=('Baseline', 'Other', 'births')), precision=1, batch=1, max_repeats=1, serial=True, verbose=False)
+
+    def test_arguments(self):
+        contrasts = dict(births=('Baseline', 'Low exposure', 'births'), size=('Baseline', 'Low exposure', 'pop_size'))
+        for kwargs in [dict(precision=dict(births=1)), dict(precision=1, keep_sims=False)]:
+            with self.assertRaises(ValueError):
+                make_scens().run_adaptive(contrasts, batch=1, max_repeats=1, serial=True, verbose=False, **kwargs)
+        scens = make_scens()
+        scens.run_adaptive(contrasts, precision=1e9, batch=2, max_repeats=2, serial=True, verbose=False) # pop_size is one of the list results
+        self.assertTrue(np.isfinite(scens.contrasts.size.mean))
+
+
+if __name__ == '__main__':
+    unittest.main()